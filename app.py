@@ -3,8 +3,10 @@ from auth.auth import login_required, obtener_usuario_actual
 from controllers import (
     auth_controller, dashboard_controller, visitantes_controller, 
     acceso_controller, usuarios_controller, alertas_controller, 
-    reportes_controller, roles_controller
+    reportes_controller, roles_controller, sistema_controller
 )
+from models.database import liberar_conexiones
+from models import indice_credenciales, ocupacion
 import os
 from datetime import timedelta
 
@@ -19,14 +21,26 @@ except:
     print("⚠️  Config.py no encontrado, usando configuración por defecto")
 
 # Context processor para inyectar usuario actual en todas las plantillas
+# (se carga una sola vez por petición y se comparte con los decoradores)
 @app.context_processor
 def inject_user():
     return dict(usuario_actual=obtener_usuario_actual())
 
+# Devolver al pool las conexiones usadas durante la petición
+app.teardown_appcontext(liberar_conexiones)
+
+# Precargar el índice de credenciales activas y la ocupación actual de este worker
+indice_credenciales.precargar_en_segundo_plano()
+ocupacion.precargar_en_segundo_plano()
+
 # Middleware para manejar sesiones permanentes
 @app.before_request
 def make_session_permanent():
-    from flask import session
+    from flask import session, request
+    # Las APIs de dispositivos no usan sesión: no emitir cookie en cada respuesta
+    vista = app.view_functions.get(request.endpoint)
+    if getattr(vista, 'sin_sesion', False):
+        return
     session.permanent = True
 
 # ==================== RUTAS DE AUTENTICACIÓN ====================
@@ -42,10 +56,15 @@ app.add_url_rule('/visitantes', view_func=visitantes_controller.listar_visitante
 app.add_url_rule('/visitantes/agregar', view_func=visitantes_controller.agregar_visitante, methods=['GET', 'POST'])
 app.add_url_rule('/visitantes/editar/<int:id>', view_func=visitantes_controller.editar_visitante, methods=['GET', 'POST'])
 app.add_url_rule('/visitantes/estado/<int:id>', view_func=visitantes_controller.cambiar_estado_visitante)
+app.add_url_rule('/api/visitantes/buscar', view_func=visitantes_controller.buscar_visitantes_api)
 
 # ==================== RUTAS DE CONTROL DE ACCESO ====================
 app.add_url_rule('/control_acceso', view_func=acceso_controller.control_acceso, methods=['GET', 'POST'])
 app.add_url_rule('/accesos', view_func=acceso_controller.listar_accesos)
+app.add_url_rule('/api/accesos/lote', view_func=acceso_controller.registrar_lote, methods=['POST'])
+app.add_url_rule('/api/ocupacion', view_func=acceso_controller.ocupacion_actual)
+app.add_url_rule('/api/kiosco/acceso', view_func=acceso_controller.kiosco_acceso, methods=['POST'])
+app.add_url_rule('/api/ocupacion/total', view_func=acceso_controller.ocupacion_total)
 
 # ==================== RUTAS DE USUARIOS ====================
 app.add_url_rule('/usuarios', view_func=usuarios_controller.listar_usuarios)
@@ -64,14 +83,28 @@ app.add_url_rule('/roles/permisos/<int:id>', view_func=roles_controller.obtener_
 app.add_url_rule('/alertas', view_func=alertas_controller.listar_alertas)
 app.add_url_rule('/alertas/crear', view_func=alertas_controller.crear_alerta, methods=['GET', 'POST'])
 app.add_url_rule('/alertas/eliminar/<int:id>', view_func=alertas_controller.eliminar_alerta)
+app.add_url_rule('/alertas/eliminar', view_func=alertas_controller.eliminar_alertas, methods=['POST'])
+app.add_url_rule('/alertas/marcar_leidas', view_func=alertas_controller.marcar_alertas_leidas, methods=['POST'])
+app.add_url_rule('/api/alertas/no_leidas', view_func=alertas_controller.alertas_no_leidas)
 
 # ==================== RUTAS DE REPORTES ====================
 app.add_url_rule('/reportes', view_func=reportes_controller.generar_reporte, methods=['GET', 'POST'])
 app.add_url_rule('/reportes/ver', view_func=reportes_controller.ver_reporte)
 app.add_url_rule('/reportes/exportar/csv', view_func=reportes_controller.exportar_reporte_csv)
 app.add_url_rule('/reportes/exportar/pdf', view_func=reportes_controller.exportar_reporte_pdf)
+app.add_url_rule('/reportes/trabajos/<int:trabajo_id>', view_func=reportes_controller.ver_trabajo_reporte)
+app.add_url_rule('/reportes/trabajos/<int:trabajo_id>/descargar', view_func=reportes_controller.descargar_trabajo_reporte)
+app.add_url_rule('/api/reportes/trabajos/<int:trabajo_id>', view_func=reportes_controller.estado_trabajo_reporte)
 app.add_url_rule('/reportes/estadisticas', view_func=reportes_controller.reporte_estadisticas)
 
+# ==================== RUTAS DEL SISTEMA ====================
+app.add_url_rule('/sistema/pool', view_func=sistema_controller.estado_pool)
+app.add_url_rule('/sistema/credenciales', view_func=sistema_controller.estado_indice_credenciales)
+app.add_url_rule('/sistema/alertas', view_func=sistema_controller.estado_cola_alertas)
+app.add_url_rule('/sistema/dispositivos', view_func=sistema_controller.crear_dispositivo, methods=['POST'])
+app.add_url_rule('/sistema/visitas/reconciliar', view_func=sistema_controller.reconciliar_visitas, methods=['POST'])
+app.add_url_rule('/sistema/resumen_accesos/reconstruir', view_func=sistema_controller.reconstruir_resumen_accesos, methods=['POST'])
+
 # ==================== MANEJO DE ERRORES ====================
 @app.errorhandler(404)
 def pagina_no_encontrada(error):
@@ -1,16 +1,52 @@
-from flask import session
+from flask import session, g
 from functools import wraps
-from models.database import tiene_permiso, obtener_usuario_actual
+from models.database import obtener_permisos_usuario, usuario_activo, obtener_usuario_actual, tiene_permiso
+from models import versiones, dispositivos
 import time
 
 # Diccionario para control de intentos de login
 login_attempts = {}
 
+def guardar_permisos_en_sesion(usuario_id):
+    """Guardar en la sesión firmada una copia de los permisos del usuario junto
+    con la versión 'permisos' vigente. Devuelve el frozenset guardado."""
+    # Leer la versión antes que los permisos: si cambian entremedio, la copia
+    # queda con la versión vieja y se refresca en la siguiente petición
+    version = versiones.obtener('permisos')
+    permisos = obtener_permisos_usuario(usuario_id) if usuario_activo(usuario_id) else None
+    if permisos is None:
+        session.pop('permisos', None)
+        session.pop('permisos_version', None)
+        return None
+    if version is not None:
+        session['permisos'] = permisos
+        session['permisos_version'] = version
+    return frozenset(permisos)
+
+def permisos_de_sesion():
+    """Permisos del usuario de la sesión, o None si no hay sesión válida.
+
+    Mientras la versión guardada coincide con el contador 'permisos' se confía en
+    la copia de la sesión sin tocar la base; si no, se recalcula y se guarda.
+    """
+    if 'usuario_id' not in session:
+        return None
+    if '_permisos_sesion' in g:
+        return g._permisos_sesion
+
+    version = versiones.obtener('permisos')
+    if version is not None and 'permisos' in session and session.get('permisos_version') == version:
+        permisos = frozenset(session['permisos'])
+    else:
+        permisos = guardar_permisos_en_sesion(session['usuario_id'])
+    g._permisos_sesion = permisos
+    return permisos
+
 def login_required(f):
     """Decorador para requerir autenticación"""
     @wraps(f)
     def decorated_function(*args, **kwargs):
-        if 'usuario_id' not in session:
+        if permisos_de_sesion() is None:
             from flask import redirect, url_for, flash
             flash('Debe iniciar sesión para acceder a esta página', 'warning')
             return redirect(url_for('login'))
@@ -22,12 +58,13 @@ def permiso_requerido(permiso):
     def decorator(f):
         @wraps(f)
         def decorated_function(*args, **kwargs):
-            if 'usuario_id' not in session:
+            permisos = permisos_de_sesion()
+            if permisos is None:
                 from flask import redirect, url_for, flash
                 flash('Debe iniciar sesión para acceder a esta página', 'warning')
                 return redirect(url_for('login'))
             
-            if not tiene_permiso(session['usuario_id'], permiso):
+            if permiso not in permisos:
                 from flask import redirect, url_for, flash
                 flash('No tiene permisos para acceder a esta funcionalidad', 'danger')
                 return redirect(url_for('dashboard'))
@@ -36,6 +73,31 @@ def permiso_requerido(permiso):
         return decorated_function
     return decorator
 
+def dispositivo_requerido(permiso):
+    """Decorador para APIs de dispositivos (kioscos): autenticación por token,
+    sin sesión. El dispositivo actúa con los permisos de su usuario asociado y
+    queda disponible en g.dispositivo."""
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            from flask import request, jsonify
+            encabezado = request.headers.get('Authorization', '')
+            if encabezado.startswith('Bearer '):
+                token = encabezado[7:].strip()
+            else:
+                token = request.headers.get('X-Dispositivo-Token')
+            dispositivo = dispositivos.autenticar(token) if token else None
+            if dispositivo is None:
+                return jsonify({'error': 'Dispositivo no autorizado'}), 401
+            if not tiene_permiso(dispositivo.usuario_id, permiso):
+                return jsonify({'error': 'El dispositivo no tiene permiso para esta acción'}), 403
+            g.dispositivo = dispositivo
+            return f(*args, **kwargs)
+        # Sin cookie de sesión: ver make_session_permanent en app.py
+        decorated_function.sin_sesion = True
+        return decorated_function
+    return decorator
+
 def limpiar_intentos_login():
     """Limpiar intentos de login antiguos"""
     global login_attempts
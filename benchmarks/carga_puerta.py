@@ -0,0 +1,427 @@
+#!/usr/bin/env python3
+"""
+Prueba de carga del control de acceso (escaneos por segundo en la puerta).
+
+Siembra visitantes y credenciales de prueba (identificación CARGA-*) en la base
+indicada con --dsn y lanza escaneos concurrentes -válidos, expirados, inválidos y
+fuera de horario- contra la aplicación: en proceso con el cliente de pruebas
+de Flask (por defecto) o contra un servidor ya levantado (--url). Informa
+escaneos por segundo, percentiles de latencia y consultas a la base por
+escaneo, para comparar cambios con los mismos parámetros.
+
+Uso (desde la raíz del proyecto):
+    python -m benchmarks.carga_puerta --dsn postgresql://postgres@localhost/control_acceso?sslmode=disable
+    python -m benchmarks.carga_puerta --dsn ... --escaneos 5000 --concurrencia 8
+    python -m benchmarks.carga_puerta --dsn ... --modo formulario
+    python -m benchmarks.carga_puerta --dsn ... --url http://127.0.0.1:8000 --concurrencia 16
+    python -m benchmarks.carga_puerta --dsn ... --limpiar
+
+Notas:
+- La herramienta escribe y borra datos: la base se indica siempre con --dsn
+  (nunca se toma DATABASE_URL ni la configuración por defecto) y debe ser
+  local (localhost, 127.0.0.1 o socket unix) salvo que se pase
+  --permitir-remoto. En proceso, la aplicación usa esa misma base; con --url,
+  el servidor debe estar configurado contra ella.
+- Todos los escaneos son entradas; las relecturas de un mismo código dentro de
+  ACCESO_VENTANA_REPETICION_SEG salen como 'repetido' (defina la variable en 0
+  para medir siempre el camino completo).
+- En proceso, las consultas se cuentan en el hilo de cada petición (no incluye
+  los hilos de alertas ni de notificaciones). Con --url se usa
+  pg_stat_statements si está instalada; si no, solo transacciones.
+"""
+import argparse
+import http.client
+import json
+import random
+import statistics
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+from urllib.parse import urlencode, urlparse
+
+import psycopg2.extensions
+import psycopg2.extras
+
+PREFIJO = 'CARGA-'
+EMPRESA = 'Carga S.A.'
+EMPRESA_FUERA_HORARIO = 'Carga Fuera de Horario'
+CATEGORIAS = ('valido', 'expirado', 'invalido', 'fuera_horario')
+HOSTS_LOCALES = ('localhost', '127.0.0.1', '::1')
+
+
+# ==================== SIEMBRA ====================
+
+def _host_local(dsn):
+    """True si el DSN apunta a esta máquina (sin host = socket unix)."""
+    hosts = psycopg2.extensions.parse_dsn(dsn).get('host') or ''
+    return all(not h or h.startswith('/') or h in HOSTS_LOCALES for h in hosts.split(','))
+
+
+def _conectar(dsn):
+    conn = psycopg2.connect(dsn)
+    conn.autocommit = False
+    return conn
+
+
+def limpiar(conn):
+    """Borrar todo lo sembrado por esta herramienta."""
+    with conn.cursor() as cursor:
+        cursor.execute("SELECT id FROM visitantes WHERE identificacion LIKE %s", (PREFIJO + '%',))
+        ids = [fila[0] for fila in cursor.fetchall()]
+        if ids:
+            cursor.execute("DELETE FROM alertas WHERE visitante_id = ANY(%s)", (ids,))
+            cursor.execute("DELETE FROM accesos WHERE visitante_id = ANY(%s)", (ids,))
+            cursor.execute("DELETE FROM visitantes WHERE id = ANY(%s)", (ids,))
+        cursor.execute("DELETE FROM alertas WHERE descripcion LIKE %s", ('%: ' + PREFIJO + '%',))
+        cursor.execute("DELETE FROM escaneos_recientes WHERE codigo LIKE %s", (PREFIJO + '%',))
+        cursor.execute("DELETE FROM horarios_acceso WHERE empresa = %s", (EMPRESA_FUERA_HORARIO,))
+        cursor.execute("DELETE FROM dispositivos WHERE nombre = %s", ('Prueba de carga',))
+    conn.commit()
+    return len(ids)
+
+
+def sembrar(conn, visitantes, proporciones):
+    """Crear visitantes y credenciales por categoría. Devuelve {categoria: [codigos]}."""
+    limpiar(conn)
+    ahora = datetime.now()
+    codigos = {categoria: [] for categoria in CATEGORIAS}
+
+    cantidades = {c: max(1, int(visitantes * proporciones[c])) for c in ('valido', 'expirado', 'fuera_horario')}
+    filas_visitantes = []
+    categorias = []
+    for categoria, cantidad in cantidades.items():
+        for _ in range(cantidad):
+            i = len(filas_visitantes)
+            empresa = EMPRESA_FUERA_HORARIO if categoria == 'fuera_horario' else EMPRESA
+            filas_visitantes.append((f'Visitante de carga {i}', f'{PREFIJO}{i:07d}', empresa, 'Prueba de carga', 'activo'))
+            categorias.append(categoria)
+
+    with conn.cursor() as cursor:
+        ids = psycopg2.extras.execute_values(cursor, """
+            INSERT INTO visitantes (nombre, identificacion, empresa, motivo, estado)
+            VALUES %s RETURNING id
+        """, filas_visitantes, page_size=1000, fetch=True)
+
+        filas_credenciales = []
+        for (visitante_id,), categoria in zip(ids, categorias):
+            codigo = f'{PREFIJO}{visitante_id}'
+            vence = ahora - timedelta(days=1) if categoria == 'expirado' else ahora + timedelta(days=1)
+            filas_credenciales.append((visitante_id, codigo, 'activa', vence))
+            codigos[categoria].append(codigo)
+        psycopg2.extras.execute_values(cursor, """
+            INSERT INTO credenciales (visitante_id, codigo, estado, fecha_expiracion)
+            VALUES %s
+        """, filas_credenciales, page_size=1000)
+
+        # Ventana de un minuto lejos de la hora actual para la empresa "fuera de horario"
+        inicio, fin = ('00:00', '00:01') if ahora.hour >= 12 else ('23:58', '23:59')
+        cursor.executemany("""
+            INSERT INTO horarios_acceso (dia_semana, hora_inicio, hora_fin, empresa)
+            VALUES (%s, %s, %s, %s)
+        """, [(dia, inicio, fin, EMPRESA_FUERA_HORARIO) for dia in range(7)])
+    conn.commit()
+
+    codigos['invalido'] = [f'{PREFIJO}X{i:06d}' for i in range(max(1, int(visitantes * proporciones['invalido'])))]
+    return codigos
+
+
+# ==================== CLIENTES ====================
+
+class ClientePrueba:
+    """Cliente de pruebas de Flask (en proceso)."""
+
+    def __init__(self, app, modo, token, correo, contrasena):
+        self.cliente = app.test_client()
+        self.modo = modo
+        self.token = token
+        if modo == 'formulario':
+            self.cliente.post('/login', data={'correo': correo, 'contrasena': contrasena})
+
+    def escanear(self, codigo):
+        if self.modo == 'kiosco':
+            respuesta = self.cliente.post('/api/kiosco/acceso', json={'codigo': codigo, 'tipo': 'entrada'},
+                                          headers={'Authorization': f'Bearer {self.token}'})
+            return respuesta.status_code, (respuesta.get_json() or {}).get('resultado')
+        respuesta = self.cliente.post('/control_acceso', data={'codigo': codigo, 'tipo': 'entrada'})
+        return respuesta.status_code, None
+
+
+class ClienteHttp:
+    """Cliente HTTP con una conexión keep-alive por hilo."""
+
+    def __init__(self, url, modo, token, correo, contrasena):
+        destino = urlparse(url)
+        self.conexion = http.client.HTTPConnection(destino.hostname, destino.port or 80, timeout=30)
+        self.modo = modo
+        self.token = token
+        self.cookie = None
+        if modo == 'formulario':
+            estado, _, cabeceras = self._post('/login', urlencode({'correo': correo, 'contrasena': contrasena}),
+                                              'application/x-www-form-urlencoded')
+            self.cookie = (cabeceras.get('Set-Cookie') or '').split(';')[0] or None
+
+    def _post(self, ruta, cuerpo, tipo_contenido, extra=None):
+        cabeceras = {'Content-Type': tipo_contenido}
+        if self.cookie:
+            cabeceras['Cookie'] = self.cookie
+        cabeceras.update(extra or {})
+        self.conexion.request('POST', ruta, body=cuerpo, headers=cabeceras)
+        respuesta = self.conexion.getresponse()
+        datos = respuesta.read()
+        return respuesta.status, datos, dict(respuesta.getheaders())
+
+    def escanear(self, codigo):
+        if self.modo == 'kiosco':
+            estado, datos, _ = self._post('/api/kiosco/acceso', json.dumps({'codigo': codigo, 'tipo': 'entrada'}),
+                                          'application/json', {'Authorization': f'Bearer {self.token}'})
+            try:
+                return estado, json.loads(datos).get('resultado')
+            except ValueError:
+                return estado, None
+        estado, _, _ = self._post('/control_acceso', urlencode({'codigo': codigo, 'tipo': 'entrada'}),
+                                  'application/x-www-form-urlencoded')
+        return estado, None
+
+
+# ==================== CONTEO DE CONSULTAS ====================
+
+_contador = threading.local()
+
+
+def instrumentar_consultas():
+    """Contar las consultas que ejecuta cada hilo a través del pool."""
+    from models.pool import ConexionPool
+
+    class CursorContado:
+        def __init__(self, cursor):
+            self._cursor = cursor
+
+        def execute(self, *args, **kwargs):
+            _contador.consultas = getattr(_contador, 'consultas', 0) + 1
+            return self._cursor.execute(*args, **kwargs)
+
+        def __enter__(self):
+            self._cursor.__enter__()
+            return self
+
+        def __exit__(self, *args):
+            return self._cursor.__exit__(*args)
+
+        def __iter__(self):
+            return iter(self._cursor)
+
+        def __getattr__(self, nombre):
+            return getattr(self._cursor, nombre)
+
+    original = ConexionPool.cursor
+
+    def cursor(self, *args, **kwargs):
+        return CursorContado(original(self, *args, **kwargs))
+
+    ConexionPool.cursor = cursor
+
+
+def contadores_servidor(conn):
+    """(transacciones, llamadas en pg_stat_statements o None) de la base actual."""
+    with conn.cursor() as cursor:
+        cursor.execute("SELECT xact_commit + xact_rollback FROM pg_stat_database WHERE datname = current_database()")
+        transacciones = cursor.fetchone()[0]
+        try:
+            cursor.execute("SELECT COALESCE(SUM(calls), 0) FROM pg_stat_statements WHERE dbid = "
+                           "(SELECT oid FROM pg_database WHERE datname = current_database())")
+            llamadas = cursor.fetchone()[0]
+        except psycopg2.Error:
+            conn.rollback()
+            llamadas = None
+    conn.commit()
+    return transacciones, llamadas
+
+
+# ==================== EJECUCIÓN ====================
+
+def ejecutar(crear_cliente, trabajo, concurrencia, contar_consultas):
+    """Repartir los escaneos entre hilos. Devuelve (mediciones, segundos)."""
+    mediciones = []
+    lock = threading.Lock()
+    indice = iter(range(len(trabajo)))
+    lock_indice = threading.Lock()
+    listos = threading.Barrier(concurrencia + 1)
+
+    def hilo():
+        cliente = crear_cliente()
+        propias = []
+        listos.wait()
+        while True:
+            with lock_indice:
+                i = next(indice, None)
+            if i is None:
+                break
+            categoria, codigo = trabajo[i]
+            _contador.consultas = 0
+            inicio = time.perf_counter()
+            try:
+                estado, resultado = cliente.escanear(codigo)
+            except Exception as e:
+                estado, resultado = 0, f'excepcion: {type(e).__name__}'
+            latencia = time.perf_counter() - inicio
+            consultas = _contador.consultas if contar_consultas else None
+            propias.append((categoria, estado, resultado, latencia, consultas))
+        with lock:
+            mediciones.extend(propias)
+
+    hilos = [threading.Thread(target=hilo, daemon=True) for _ in range(concurrencia)]
+    for h in hilos:
+        h.start()
+    listos.wait()
+    inicio = time.perf_counter()
+    for h in hilos:
+        h.join()
+    return mediciones, time.perf_counter() - inicio
+
+
+def _percentil(valores, p):
+    if len(valores) == 1:
+        return valores[0]
+    return statistics.quantiles(valores, n=100, method='inclusive')[p - 1]
+
+
+def informar(mediciones, segundos, servidor_antes=None, servidor_despues=None):
+    total = len(mediciones)
+    print(f"\nEscaneos: {total} en {segundos:.2f} s -> {total / segundos:.1f} escaneos/s")
+
+    def linea(nombre, filas):
+        latencias = [m[3] * 1000 for m in filas]
+        texto = (f"  {nombre:<14} n={len(filas):<6} p50={_percentil(latencias, 50):7.2f} ms  "
+                 f"p95={_percentil(latencias, 95):7.2f} ms  p99={_percentil(latencias, 99):7.2f} ms  "
+                 f"max={max(latencias):7.2f} ms")
+        consultas = [m[4] for m in filas if m[4] is not None]
+        if consultas:
+            texto += f"  consultas/escaneo={statistics.mean(consultas):.2f}"
+        print(texto)
+
+    print("\nLatencia por categoría:")
+    linea('total', mediciones)
+    for categoria in CATEGORIAS:
+        filas = [m for m in mediciones if m[0] == categoria]
+        if filas:
+            linea(categoria, filas)
+
+    print("\nRespuestas (categoría, estado HTTP, resultado):")
+    for (categoria, estado, resultado), cantidad in sorted(Counter((m[0], m[1], m[2]) for m in mediciones).items(),
+                                                           key=lambda x: -x[1]):
+        print(f"  {categoria:<14} {estado:<4} {str(resultado):<16} {cantidad}")
+
+    if servidor_antes and servidor_despues:
+        transacciones = servidor_despues[0] - servidor_antes[0]
+        print(f"\nServidor: {transacciones / total:.2f} transacciones/escaneo", end='')
+        if servidor_antes[1] is not None and servidor_despues[1] is not None:
+            print(f", {(servidor_despues[1] - servidor_antes[1]) / total:.2f} consultas/escaneo", end='')
+        print(" (incluye la actividad de fondo de todos los workers)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Prueba de carga del control de acceso')
+    parser.add_argument('--dsn', required=True,
+                        help='Base de pruebas (p. ej. postgresql://postgres@localhost/control_acceso?sslmode=disable)')
+    parser.add_argument('--permitir-remoto', action='store_true',
+                        help='Aceptar un --dsn que no sea localhost/127.0.0.1/socket unix')
+    parser.add_argument('--url', help='Servidor ya levantado (p. ej. http://127.0.0.1:8000); por defecto, en proceso')
+    parser.add_argument('--modo', choices=('kiosco', 'formulario'), default='kiosco',
+                        help='kiosco: POST /api/kiosco/acceso con token; formulario: POST /control_acceso con sesión')
+    parser.add_argument('--visitantes', type=int, default=2000, help='Visitantes a sembrar')
+    parser.add_argument('--escaneos', type=int, default=5000)
+    parser.add_argument('--concurrencia', type=int, default=8)
+    parser.add_argument('--mezcla', default='valido=70,expirado=10,invalido=10,fuera_horario=10',
+                        help='Porcentaje de escaneos por categoría')
+    parser.add_argument('--correo', default='admin@controlacceso.com')
+    parser.add_argument('--contrasena', default='admin123')
+    parser.add_argument('--semilla', type=int, default=1)
+    parser.add_argument('--sin-sembrar', action='store_true', help='Reutilizar los datos de una corrida anterior')
+    parser.add_argument('--limpiar', action='store_true', help='Borrar los datos sembrados y salir')
+    args = parser.parse_args()
+
+    mezcla = {}
+    for parte in args.mezcla.split(','):
+        nombre, _, valor = parte.partition('=')
+        mezcla[nombre.strip()] = float(valor)
+    if set(mezcla) - set(CATEGORIAS):
+        parser.error(f'Categorías válidas: {", ".join(CATEGORIAS)}')
+    suma = sum(mezcla.values())
+    proporciones = {c: mezcla.get(c, 0) / suma for c in CATEGORIAS}
+
+    try:
+        local = _host_local(args.dsn)
+    except psycopg2.ProgrammingError as e:
+        parser.error(f'--dsn inválido: {e}')
+    if not local and not args.permitir_remoto:
+        parser.error('--dsn apunta a un servidor remoto; esta herramienta siembra y borra datos. '
+                     'Use una base local o agregue --permitir-remoto')
+
+    # La aplicación (en proceso) y dispositivos.crear usan esta misma base,
+    # nunca DATABASE_URL ni la configuración por defecto
+    import config as app_config
+    app_config.DATABASE_URL = args.dsn
+
+    conn = _conectar(args.dsn)
+    if args.limpiar:
+        print(f"Visitantes de carga borrados: {limpiar(conn)}")
+        return
+
+    if args.sin_sembrar:
+        with conn.cursor() as cursor:
+            cursor.execute("""
+                SELECT c.codigo, v.empresa, c.fecha_expiracion < NOW()
+                FROM credenciales c JOIN visitantes v ON c.visitante_id = v.id
+                WHERE v.identificacion LIKE %s
+            """, (PREFIJO + '%',))
+            codigos = {categoria: [] for categoria in CATEGORIAS}
+            for codigo, empresa, vencida in cursor.fetchall():
+                categoria = 'expirado' if vencida else 'fuera_horario' if empresa == EMPRESA_FUERA_HORARIO else 'valido'
+                codigos[categoria].append(codigo)
+        codigos['invalido'] = [f'{PREFIJO}X{i:06d}' for i in range(100)]
+    else:
+        print(f"Sembrando {args.visitantes} visitantes de carga...")
+        codigos = sembrar(conn, args.visitantes, proporciones)
+
+    azar = random.Random(args.semilla)
+    categorias_con_codigos = [c for c in CATEGORIAS if codigos[c] and proporciones[c] > 0]
+    pesos = [proporciones[c] for c in categorias_con_codigos]
+    trabajo = []
+    for categoria in azar.choices(categorias_con_codigos, weights=pesos, k=args.escaneos):
+        trabajo.append((categoria, azar.choice(codigos[categoria])))
+
+    token = None
+    if args.modo == 'kiosco':
+        from models import dispositivos
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT id FROM usuarios WHERE correo = %s", (args.correo,))
+            fila = cursor.fetchone()
+        conn.commit()
+        if not fila:
+            parser.error(f'No existe el usuario {args.correo} para asociar el dispositivo de prueba')
+        _, token = dispositivos.crear('Prueba de carga', fila[0])
+
+    if args.url:
+        antes = contadores_servidor(conn)
+
+        def crear_cliente():
+            return ClienteHttp(args.url, args.modo, token, args.correo, args.contrasena)
+
+        mediciones, segundos = ejecutar(crear_cliente, trabajo, args.concurrencia, contar_consultas=False)
+        informar(mediciones, segundos, antes, contadores_servidor(conn))
+    else:
+        from app import app
+        instrumentar_consultas()
+
+        def crear_cliente():
+            return ClientePrueba(app, args.modo, token, args.correo, args.contrasena)
+
+        print(f"Ejecutando {args.escaneos} escaneos en proceso con {args.concurrencia} hilos ({args.modo})...")
+        mediciones, segundos = ejecutar(crear_cliente, trabajo, args.concurrencia, contar_consultas=True)
+        informar(mediciones, segundos)
+    conn.close()
+
+
+if __name__ == '__main__':
+    main()
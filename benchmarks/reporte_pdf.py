@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Prueba de rendimiento del PDF de reportes de accesos.
+
+Genera filas sintéticas (sin base de datos) y mide cuánto tarda
+utils.pdf_utils.generar_pdf_reporte en producir el PDF y el tamaño del
+archivo; con --memoria, también el pico de memoria Python (tracemalloc, que
+hace la corrida varias veces más lenta). Las filas se entregan con un
+generador, como las entrega el cursor del servidor en la exportación, y el
+PDF se escribe en un SpooledTemporaryFile igual que en el controlador.
+
+Con --comparar también se mide el método anterior (una sola Table con todas
+las filas, partida por SimpleDocTemplate) hasta --max-comparar filas: crece
+mucho peor que linealmente y no termina en tiempo razonable con 1M.
+
+Uso (desde la raíz del proyecto):
+    python -m benchmarks.reporte_pdf
+    python -m benchmarks.reporte_pdf --filas 10000 100000 1000000
+    python -m benchmarks.reporte_pdf --filas 10000 --comparar --memoria
+
+El PDF en sí sigue armándose en memoria dentro de reportlab (páginas ya
+comprimidas), así que el pico crece con el tamaño del archivo, no con las
+filas ni con su representación como tablas.
+"""
+import argparse
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+from io import BytesIO
+
+from reportlab.lib.pagesizes import A4
+from reportlab.platypus import SimpleDocTemplate, Table
+
+from utils.pdf_utils import (
+    generar_pdf_reporte, ENCABEZADO_ACCESOS, ANCHOS_ACCESOS, ESTILO_TABLA_ACCESOS, _fila_acceso
+)
+
+GUARDIAS = ('Guardia Norte', 'Guardia Sur', None)
+
+
+def filas_sinteticas(cantidad):
+    """Accesos ficticios, del más reciente al más antiguo."""
+    inicio = datetime(2024, 1, 1)
+    for i in range(cantidad):
+        yield {
+            'fecha_hora': inicio - timedelta(seconds=30 * i),
+            'visitante': f'Visitante de prueba {i % 5000}',
+            'tipo': 'entrada' if i % 2 == 0 else 'salida',
+            'autorizado': i % 17 != 0,
+            'guardia': GUARDIAS[i % len(GUARDIAS)],
+        }
+
+
+def pdf_tabla_unica(accesos):
+    """Método anterior: todas las filas en una Table que reportlab parte por páginas."""
+    buffer = BytesIO()
+    doc = SimpleDocTemplate(buffer, pagesize=A4, topMargin=30)
+    tabla = Table([ENCABEZADO_ACCESOS] + [_fila_acceso(acceso) for acceso in accesos],
+                  colWidths=ANCHOS_ACCESOS)
+    tabla.setStyle(ESTILO_TABLA_ACCESOS)
+    doc.build([tabla])
+    return len(buffer.getvalue())
+
+
+def pdf_paginado(accesos, total):
+    with tempfile.SpooledTemporaryFile(max_size=8 * 1024 * 1024) as archivo:
+        generar_pdf_reporte(accesos, 'mensual', '2023-01-01', '2024-01-01',
+                            'Reporte de Accesos - Prueba', total=total, destino=archivo)
+        return archivo.tell()
+
+
+def medir(funcion, args, memoria=False):
+    if memoria:
+        tracemalloc.start()
+    inicio = time.perf_counter()
+    tamano = funcion(*args)
+    segundos = time.perf_counter() - inicio
+    pico = None
+    if memoria:
+        _, pico = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    return segundos, pico, tamano
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Rendimiento del PDF de reportes de accesos')
+    parser.add_argument('--filas', type=int, nargs='+', default=[10000, 100000, 1000000])
+    parser.add_argument('--comparar', action='store_true', help='Medir también el método de una sola tabla')
+    parser.add_argument('--max-comparar', type=int, default=20000,
+                        help='Filas máximas para el método anterior')
+    parser.add_argument('--memoria', action='store_true', help='Medir el pico de memoria con tracemalloc')
+    args = parser.parse_args()
+
+    print(f"{'método':<12} {'filas':>9} {'segundos':>9} {'filas/s':>9} {'pico MB':>9} {'PDF MB':>8}")
+    for cantidad in args.filas:
+        casos = [('paginado', pdf_paginado, (filas_sinteticas(cantidad), cantidad))]
+        if args.comparar and cantidad <= args.max_comparar:
+            casos.append(('tabla única', pdf_tabla_unica, (list(filas_sinteticas(cantidad)),)))
+        for nombre, funcion, parametros in casos:
+            segundos, pico, tamano = medir(funcion, parametros, args.memoria)
+            pico = f"{pico / 2**20:.1f}" if pico is not None else '-'
+            print(f"{nombre:<12} {cantidad:>9} {segundos:>9.2f} {cantidad / segundos:>9.0f} "
+                  f"{pico:>9} {tamano / 2**20:>8.1f}")
+
+
+if __name__ == '__main__':
+    main()
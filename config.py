@@ -59,6 +59,25 @@ def get_database_url():
     # escape básica (no muy robusta) - en sistemas reales usar urllib.parse
     return f"postgresql://{user}:{password}@{host}:{port}/{dbname}"
 
+# Configuración del pool de conexiones (uno por proceso/worker de gunicorn)
+POOL_MIN_CONEXIONES = int(os.getenv('POOL_MIN_CONEXIONES', '1'))
+POOL_MAX_CONEXIONES = int(os.getenv('POOL_MAX_CONEXIONES', '10'))
+POOL_TIMEOUT_ESPERA = float(os.getenv('POOL_TIMEOUT_ESPERA', '10'))  # segundos esperando una conexión libre
+POOL_VERIFICAR_INACTIVA_SEG = float(os.getenv('POOL_VERIFICAR_INACTIVA_SEG', '30'))  # ping si estuvo inactiva más de esto
+
+# Caché de permisos por rol (se invalida con NOTIFY; el TTL es la red de seguridad)
+CACHE_PERMISOS_TTL = int(os.getenv('CACHE_PERMISOS_TTL', '300'))  # segundos
+
+# Contadores de versión (tabla versiones); se refrescan por NOTIFY o tras este TTL
+VERSIONES_TTL = int(os.getenv('VERSIONES_TTL', '30'))  # segundos
+
+# Escritura de alertas en segundo plano (cola acotada + inserción por lotes)
+ALERTAS_COLA_MAX = int(os.getenv('ALERTAS_COLA_MAX', '5000'))
+ALERTAS_LOTE = int(os.getenv('ALERTAS_LOTE', '200'))  # alertas por INSERT
+ALERTAS_INTERVALO_MS = int(os.getenv('ALERTAS_INTERVALO_MS', '500'))  # vaciar al menos cada tanto
+ALERTAS_ESPERA_MS = int(os.getenv('ALERTAS_ESPERA_MS', '50'))  # espera máxima con la cola llena
+ALERTAS_SPOOL = os.getenv('ALERTAS_SPOOL', 'alertas_pendientes.jsonl')  # respaldo en disco
+
 # Configuración de la aplicación
 SECRET_KEY = os.getenv('SECRET_KEY', 'clave_secreta_super_segura_mejorada_2024')
 DEBUG = os.getenv('FLASK_DEBUG', '1') != '0'
@@ -75,6 +94,45 @@ HORARIOS_ACCESO = {
     'hora_fin': os.getenv('HORA_FIN', '18:00')
 }
 
+# Escaneos del mismo código y tipo dentro de esta ventana se ignoran (0 = desactivado)
+ACCESO_VENTANA_REPETICION_SEG = int(os.getenv('ACCESO_VENTANA_REPETICION_SEG', '10'))
+
+# Filas por página en el historial de accesos (paginación por cursor)
+ACCESOS_POR_PAGINA = int(os.getenv('ACCESOS_POR_PAGINA', '50'))
+
+# Bandeja de alertas: filas por página y tope del contador de no leídas
+# (por encima se muestra "N+" sin seguir contando)
+ALERTAS_POR_PAGINA = int(os.getenv('ALERTAS_POR_PAGINA', '50'))
+ALERTAS_NO_LEIDAS_TOPE = int(os.getenv('ALERTAS_NO_LEIDAS_TOPE', '999'))
+
+# Listados completos en flujo: filas por viaje del cursor del lado del servidor
+FLUJO_FILAS_POR_LOTE = int(os.getenv('FLUJO_FILAS_POR_LOTE', '500'))
+
+# Comprimir con gzip las exportaciones CSV si el navegador lo acepta
+EXPORTAR_CSV_GZIP = os.getenv('EXPORTAR_CSV_GZIP', 'true').lower() == 'true'
+
+# PDF de reportes: hasta este tamaño se arma en memoria; si lo supera pasa a
+# un archivo temporal en disco
+PDF_SPOOL_MAX_MEMORIA = int(os.getenv('PDF_SPOOL_MAX_MEMORIA', str(8 * 1024 * 1024)))  # bytes
+
+# Exportaciones PDF/CSV en segundo plano (trabajador_reportes.py). Desactivado
+# por omisión: con false se generan dentro de la petición, como antes. Activarlo
+# solo con el trabajador en marcha y REPORTES_DIRECTORIO en un disco que vean
+# tanto la web como el trabajador
+REPORTES_EN_SEGUNDO_PLANO = os.getenv('REPORTES_EN_SEGUNDO_PLANO', 'false').lower() == 'true'
+REPORTES_PROCESOS = int(os.getenv('REPORTES_PROCESOS', '2'))
+REPORTES_DIRECTORIO = os.getenv('REPORTES_DIRECTORIO', 'reportes_generados')
+REPORTES_TTL_HORAS = int(os.getenv('REPORTES_TTL_HORAS', '24'))  # vigencia de los archivos generados
+REPORTES_TIMEOUT_SEG = int(os.getenv('REPORTES_TIMEOUT_SEG', '1800'))  # trabajo 'procesando' abandonado
+
+# Rango máximo de un reporte mensual. Los totales salen del resumen por hora
+# (accesos_por_hora); el detalle en pantalla se corta en REPORTE_DETALLE_MAX
+# filas (las exportaciones traen todas). Los visitantes únicos recorren
+# accesos, así que solo se calculan en periodos de hasta REPORTE_UNICOS_MAX_DIAS
+REPORTES_MAX_DIAS = int(os.getenv('REPORTES_MAX_DIAS', '366'))
+REPORTE_DETALLE_MAX = int(os.getenv('REPORTE_DETALLE_MAX', '1000'))
+REPORTE_UNICOS_MAX_DIAS = int(os.getenv('REPORTE_UNICOS_MAX_DIAS', '31'))
+
 # Configuración de credenciales
 DURACION_CREDENCIAL_HORAS = int(os.getenv('DURACION_CREDENCIAL_HORAS', '8'))
 
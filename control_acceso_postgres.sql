@@ -79,9 +79,14 @@ CREATE TABLE IF NOT EXISTS accesos (
     fecha_hora TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     autorizado BOOLEAN DEFAULT TRUE,
     observaciones TEXT,
+    empresa VARCHAR(100),
     fecha_creacion TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
 
+-- Empresa del visitante al momento del acceso (la fija trg_accesos_empresa);
+-- para instalaciones anteriores a la columna
+ALTER TABLE accesos ADD COLUMN IF NOT EXISTS empresa VARCHAR(100);
+
 -- Tabla de alertas
 CREATE TABLE IF NOT EXISTS alertas (
     id SERIAL PRIMARY KEY,
@@ -94,6 +99,109 @@ CREATE TABLE IF NOT EXISTS alertas (
     fecha_creacion TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
 
+-- Tabla de versiones (contadores que se incrementan cuando cambian ciertos datos)
+CREATE TABLE IF NOT EXISTS versiones (
+    clave VARCHAR(50) PRIMARY KEY,
+    valor BIGINT NOT NULL DEFAULT 0,
+    fecha_actualizacion TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Tabla de horarios de acceso (dia_semana: 0 = lunes ... 6 = domingo).
+-- Sin visitante_id ni empresa es el horario general; con alguno de ellos
+-- reemplaza al general para ese visitante o empresa
+CREATE TABLE IF NOT EXISTS horarios_acceso (
+    id SERIAL PRIMARY KEY,
+    dia_semana SMALLINT NOT NULL CHECK (dia_semana BETWEEN 0 AND 6),
+    hora_inicio TIME NOT NULL,
+    hora_fin TIME NOT NULL,
+    visitante_id INTEGER REFERENCES visitantes(id) ON DELETE CASCADE,
+    empresa VARCHAR(100),
+    activo BOOLEAN DEFAULT TRUE,
+    CHECK (hora_inicio <= hora_fin)
+);
+
+-- Tabla de ocupación actual: visitantes dentro de las instalaciones
+-- (la mantiene el trigger de accesos; reconstruir_ocupacion() la rehace)
+CREATE TABLE IF NOT EXISTS ocupacion_actual (
+    visitante_id INTEGER PRIMARY KEY REFERENCES visitantes(id) ON DELETE CASCADE,
+    acceso_id INTEGER REFERENCES accesos(id) ON DELETE SET NULL,
+    fecha_entrada TIMESTAMP NOT NULL
+);
+
+-- Contadores de visitas por visitante (entradas registradas y la última).
+-- Los mantiene el trigger de accesos; reconstruir_visitas() los rehace
+CREATE TABLE IF NOT EXISTS visitas_visitante (
+    visitante_id INTEGER PRIMARY KEY REFERENCES visitantes(id) ON DELETE CASCADE,
+    total_visitas INTEGER NOT NULL DEFAULT 0,
+    ultima_visita TIMESTAMP
+);
+
+-- Resumen de accesos por hora, por tipo, autorizado y empresa del acceso ('' si
+-- no tiene). Lo mantiene el trigger de accesos; los totales por día y por mes
+-- se agrupan desde aquí al consultar. reconstruir_resumen_accesos() lo rehace.
+-- Los reportes de periodos largos leen de aquí en lugar de accesos
+CREATE TABLE IF NOT EXISTS accesos_por_hora (
+    hora TIMESTAMP NOT NULL,
+    tipo VARCHAR(20) NOT NULL,
+    autorizado BOOLEAN NOT NULL,
+    empresa VARCHAR(100) NOT NULL DEFAULT '',
+    total INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (hora, tipo, autorizado, empresa)
+);
+
+-- Último escaneo por código, para descartar lecturas repetidas en la puerta.
+-- UNLOGGED: es estado de corta vida, no necesita WAL ni sobrevivir a una caída.
+-- Solo guarda códigos de credenciales existentes; limpiar_escaneos_recientes()
+-- borra lo que ya salió de la ventana de repetición
+CREATE UNLOGGED TABLE IF NOT EXISTS escaneos_recientes (
+    codigo TEXT PRIMARY KEY,
+    tipo VARCHAR(20) NOT NULL,
+    fecha TIMESTAMP NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS idx_escaneos_recientes_fecha ON escaneos_recientes(fecha);
+
+-- Tabla de dispositivos (kioscos de escaneo autenticados por token).
+-- Se guarda el SHA-256 del token; el dispositivo actúa como usuario_id
+CREATE TABLE IF NOT EXISTS dispositivos (
+    id SERIAL PRIMARY KEY,
+    nombre VARCHAR(100) NOT NULL,
+    token_hash VARCHAR(64) NOT NULL UNIQUE,
+    usuario_id INTEGER NOT NULL REFERENCES usuarios(id) ON DELETE CASCADE,
+    activo BOOLEAN DEFAULT TRUE,
+    fecha_creacion TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Tabla de días feriados (sin acceso con el horario general)
+CREATE TABLE IF NOT EXISTS dias_feriados (
+    fecha DATE PRIMARY KEY,
+    descripcion VARCHAR(255)
+);
+
+-- Trabajos de exportación de reportes (PDF/CSV) que genera en segundo plano
+-- trabajador_reportes.py. clave identifica los parámetros para no repetir
+-- un trabajo igual pendiente o ya terminado; archivo es relativo a
+-- REPORTES_DIRECTORIO y se borra (con la fila) al pasar la fecha expira
+CREATE TABLE IF NOT EXISTS trabajos_reporte (
+    id SERIAL PRIMARY KEY,
+    clave VARCHAR(64) NOT NULL,
+    tipo VARCHAR(20) NOT NULL CHECK (tipo IN ('diario', 'mensual')),
+    formato VARCHAR(10) NOT NULL CHECK (formato IN ('pdf', 'csv')),
+    fecha_inicio DATE NOT NULL,
+    fecha_fin DATE NOT NULL,
+    estado VARCHAR(20) NOT NULL DEFAULT 'pendiente'
+        CHECK (estado IN ('pendiente', 'procesando', 'terminado', 'error')),
+    progreso SMALLINT NOT NULL DEFAULT 0,
+    total_filas INTEGER,
+    archivo VARCHAR(255),
+    error TEXT,
+    usuario_id INTEGER REFERENCES usuarios(id) ON DELETE SET NULL,
+    fecha_creacion TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    fecha_inicio_proceso TIMESTAMP,
+    fecha_fin_proceso TIMESTAMP,
+    expira TIMESTAMP
+);
+
 -- ==========================================================
 -- INSERTS BASE (CORREGIDOS PARA POSTGRESQL)
 -- ==========================================================
@@ -197,6 +305,22 @@ BEGIN
     ON CONFLICT (rol_id, permiso_id) DO NOTHING;
 END $$;
 
+-- Versiones iniciales
+INSERT INTO versiones (clave, valor) VALUES
+('permisos', 0),
+('visitantes', 0),
+('usuarios', 0),
+('roles', 0),
+('accesos', 0),
+('alertas', 0)
+ON CONFLICT (clave) DO NOTHING;
+
+-- Horario general por defecto: todos los días de 08:00 a 18:00
+INSERT INTO horarios_acceso (dia_semana, hora_inicio, hora_fin)
+SELECT dia, '08:00', '18:00'
+FROM generate_series(0, 6) AS dia
+WHERE NOT EXISTS (SELECT 1 FROM horarios_acceso WHERE visitante_id IS NULL AND empresa IS NULL);
+
 -- Insertar usuarios base (password hasheado con SHA256)
 INSERT INTO usuarios (nombre, correo, contrasena, rol_id, estado) VALUES
 ('Administrador Principal', 'admin@controlacceso.com', encode(digest('admin123', 'sha256'), 'hex'), 1, 'activo'),
@@ -267,16 +391,81 @@ CREATE INDEX IF NOT EXISTS idx_accesos_fecha_hora ON accesos(fecha_hora);
 CREATE INDEX IF NOT EXISTS idx_accesos_visitante_id ON accesos(visitante_id);
 CREATE INDEX IF NOT EXISTS idx_accesos_usuario_id ON accesos(usuario_id);
 CREATE INDEX IF NOT EXISTS idx_accesos_tipo ON accesos(tipo);
+CREATE INDEX IF NOT EXISTS idx_accesos_fecha_hora_id ON accesos(fecha_hora DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_accesos_tipo_fecha_hora_id ON accesos(tipo, fecha_hora DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_accesos_denegados_fecha_hora ON accesos(fecha_hora DESC) WHERE autorizado = FALSE;
+CREATE INDEX IF NOT EXISTS idx_accesos_visitante_fecha_autorizado ON accesos(visitante_id, fecha_hora DESC, id DESC) WHERE autorizado = TRUE;
 
 -- Índices para alertas
 CREATE INDEX IF NOT EXISTS idx_alertas_fecha ON alertas(fecha);
 CREATE INDEX IF NOT EXISTS idx_alertas_nivel ON alertas(nivel);
-CREATE INDEX IF NOT EXISTS idx_alertas_leida ON alertas(leida);
+CREATE INDEX IF NOT EXISTS idx_alertas_nivel_fecha ON alertas(nivel, fecha DESC);
+CREATE INDEX IF NOT EXISTS idx_alertas_fecha_id ON alertas(fecha DESC, id DESC);
+-- Solo las no leídas: contador y bandeja de pendientes sin recorrer el historial
+-- (reemplaza al índice completo sobre leida, que casi no filtra)
+DROP INDEX IF EXISTS idx_alertas_leida;
+CREATE INDEX IF NOT EXISTS idx_alertas_no_leidas ON alertas(fecha DESC, id DESC) WHERE leida = FALSE;
 
 -- Índices para rol_permisos
 CREATE INDEX IF NOT EXISTS idx_rol_permisos_rol_id ON rol_permisos(rol_id);
 CREATE INDEX IF NOT EXISTS idx_rol_permisos_permiso_id ON rol_permisos(permiso_id);
 
+-- Índices para horarios_acceso
+CREATE INDEX IF NOT EXISTS idx_horarios_acceso_visitante_id ON horarios_acceso(visitante_id);
+
+-- Índices para visitas_visitante (visitantes más frecuentes)
+CREATE INDEX IF NOT EXISTS idx_visitas_visitante_total ON visitas_visitante(total_visitas DESC);
+
+-- Índices para trabajos_reporte: un solo trabajo vigente por clave y la cola
+-- de pendientes en orden de llegada
+CREATE UNIQUE INDEX IF NOT EXISTS idx_trabajos_reporte_clave_vigente ON trabajos_reporte(clave)
+    WHERE estado IN ('pendiente', 'procesando', 'terminado');
+CREATE INDEX IF NOT EXISTS idx_trabajos_reporte_pendientes ON trabajos_reporte(id) WHERE estado = 'pendiente';
+
+-- ==========================================================
+-- BÚSQUEDA DE VISITANTES
+-- ==========================================================
+
+-- Texto en minúsculas y sin acentos (IMMUTABLE para poder indexarlo; no
+-- depende de la extensión unaccent)
+CREATE OR REPLACE FUNCTION normalizar_busqueda(p_texto TEXT)
+RETURNS TEXT AS $$
+    SELECT lower(translate(COALESCE(p_texto, ''),
+        'ÁÀÄÂÉÈËÊÍÌÏÎÓÒÖÔÚÙÜÛÑÇáàäâéèëêíìïîóòöôúùüûñç',
+        'AAAAEEEEIIIIOOOOUUUUNCaaaaeeeeiiiioooouuuunc'));
+$$ LANGUAGE sql IMMUTABLE PARALLEL SAFE;
+
+-- Texto buscable de un visitante (la misma expresión que usa el índice)
+CREATE OR REPLACE FUNCTION busqueda_visitante(p_nombre TEXT, p_identificacion TEXT, p_empresa TEXT)
+RETURNS TEXT AS $$
+    SELECT normalizar_busqueda(p_nombre || ' ' || p_identificacion || ' ' || COALESCE(p_empresa, ''));
+$$ LANGUAGE sql IMMUTABLE PARALLEL SAFE;
+
+-- Índice de trigramas si pg_trgm está disponible; si no, la búsqueda sigue
+-- funcionando sin índice
+DO $$
+BEGIN
+    CREATE EXTENSION IF NOT EXISTS pg_trgm;
+EXCEPTION WHEN OTHERS THEN
+    RAISE NOTICE 'pg_trgm no disponible, la búsqueda de visitantes no usará índice: %', SQLERRM;
+END $$;
+
+DO $$
+DECLARE
+    v_esquema TEXT;
+BEGIN
+    SELECT n.nspname INTO v_esquema
+    FROM pg_extension e JOIN pg_namespace n ON n.oid = e.extnamespace
+    WHERE e.extname = 'pg_trgm';
+    IF v_esquema IS NOT NULL THEN
+        EXECUTE format(
+            'CREATE INDEX IF NOT EXISTS idx_visitantes_busqueda_trgm ON visitantes '
+            'USING gin (busqueda_visitante(nombre, identificacion, empresa) %I.gin_trgm_ops)',
+            v_esquema
+        );
+    END IF;
+END $$;
+
 -- ==========================================================
 -- VISTAS ÚTILES
 -- ==========================================================
@@ -291,7 +480,8 @@ SELECT
     v.empresa,
     c.fecha_emision,
     c.fecha_expiracion,
-    c.estado
+    c.estado,
+    v.id as visitante_id
 FROM credenciales c
 JOIN visitantes v ON c.visitante_id = v.id
 WHERE c.estado = 'activa' AND v.estado = 'activo';
@@ -348,7 +538,233 @@ BEGIN
 END;
 $$ LANGUAGE plpgsql;
 
--- Función para generar reporte de accesos por fecha
+-- Función para verificar y registrar un acceso en una sola llamada:
+-- valida la credencial y el horario, registra el acceso, genera la alerta
+-- correspondiente y desactiva la credencial en la salida.
+-- Con p_registrar_alerta = FALSE la alerta no se inserta: se devuelve en
+-- alerta_descripcion/alerta_nivel para que la escriba la cola de alertas.
+-- p_en_horario permite que la aplicación evalúe el horario con su motor de
+-- horarios; si es NULL se usa la ventana p_hora_inicio - p_hora_fin.
+-- Con p_ventana_repeticion > 0, un escaneo de una credencial con el mismo
+-- código y tipo dentro de esos segundos devuelve 'repetido' sin escribir en
+-- accesos ni alertas (los códigos inválidos no se guardan). Una
+-- entrada de un visitante que sigue dentro (sin salida) se registra y se
+-- devuelve como 'antipassback' con su alerta.
+-- Borrar de escaneos_recientes lo que ya salió de la ventana de repetición.
+-- Se llama en cada escaneo: por el índice de fecha solo recorre lo vencido,
+-- como mucho p_limite filas, y salta las que otro escaneo tiene bloqueadas
+CREATE OR REPLACE FUNCTION limpiar_escaneos_recientes(p_ventana INTEGER, p_limite INTEGER DEFAULT 100)
+RETURNS INTEGER AS $$
+DECLARE
+    v_total INTEGER;
+BEGIN
+    DELETE FROM escaneos_recientes
+    WHERE codigo IN (
+        SELECT e.codigo FROM escaneos_recientes e
+        WHERE e.fecha < NOW() - make_interval(secs => p_ventana)
+        LIMIT p_limite
+        FOR UPDATE SKIP LOCKED
+    );
+    GET DIAGNOSTICS v_total = ROW_COUNT;
+    RETURN v_total;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP FUNCTION IF EXISTS registrar_acceso_credencial(VARCHAR, VARCHAR, INTEGER, TIME, TIME, TEXT);
+DROP FUNCTION IF EXISTS registrar_acceso_credencial(VARCHAR, VARCHAR, INTEGER, TIME, TIME, TEXT, BOOLEAN);
+DROP FUNCTION IF EXISTS registrar_acceso_credencial(VARCHAR, VARCHAR, INTEGER, TIME, TIME, TEXT, BOOLEAN, BOOLEAN);
+CREATE OR REPLACE FUNCTION registrar_acceso_credencial(
+    p_codigo VARCHAR,
+    p_tipo VARCHAR,
+    p_usuario_id INTEGER,
+    p_hora_inicio TIME DEFAULT '08:00',
+    p_hora_fin TIME DEFAULT '18:00',
+    p_observaciones TEXT DEFAULT NULL,
+    p_registrar_alerta BOOLEAN DEFAULT TRUE,
+    p_en_horario BOOLEAN DEFAULT NULL,
+    p_ventana_repeticion INTEGER DEFAULT 0
+)
+RETURNS TABLE(
+    resultado VARCHAR,
+    visitante_id INTEGER,
+    visitante_nombre VARCHAR,
+    acceso_id INTEGER,
+    mensaje VARCHAR,
+    alerta_descripcion VARCHAR,
+    alerta_nivel VARCHAR
+) AS $$
+#variable_conflict use_column
+DECLARE
+    v_credencial_id INTEGER;
+    v_hora TIME := LOCALTIME;
+    v_visitante_id INTEGER;
+    v_dentro BOOLEAN;
+BEGIN
+    IF p_ventana_repeticion > 0 THEN
+        PERFORM limpiar_escaneos_recientes(p_ventana_repeticion);
+    END IF;
+
+    SELECT c.id, v.id, v.nombre
+    INTO v_credencial_id, visitante_id, visitante_nombre
+    FROM credenciales c
+    JOIN visitantes v ON c.visitante_id = v.id
+    WHERE c.codigo = p_codigo AND c.estado = 'activa'
+    AND (c.fecha_expiracion IS NULL OR c.fecha_expiracion > NOW())
+    AND v.estado = 'activo'
+    FOR UPDATE OF c;
+
+    IF v_credencial_id IS NULL THEN
+        alerta_descripcion := LEFT('Intento de acceso con código inválido: ' || p_codigo, 255);
+        alerta_nivel := 'alto';
+        IF p_registrar_alerta THEN
+            INSERT INTO alertas (descripcion, nivel, usuario_id)
+            VALUES (alerta_descripcion, alerta_nivel, p_usuario_id);
+        END IF;
+        resultado := 'invalido';
+        mensaje := 'Código inválido, expirado o visitante inactivo';
+        RETURN NEXT;
+        RETURN;
+    END IF;
+
+    IF p_ventana_repeticion > 0 THEN
+        -- El bloqueo de la credencial (FOR UPDATE) ordena dos lecturas
+        -- simultáneas del mismo código: la segunda ve el escaneo de la primera
+        INSERT INTO escaneos_recientes (codigo, tipo, fecha)
+        VALUES (p_codigo, p_tipo, NOW())
+        ON CONFLICT (codigo) DO UPDATE
+        SET tipo = EXCLUDED.tipo, fecha = EXCLUDED.fecha
+        WHERE escaneos_recientes.tipo <> EXCLUDED.tipo
+           OR escaneos_recientes.fecha <= EXCLUDED.fecha - make_interval(secs => p_ventana_repeticion);
+        IF NOT FOUND THEN
+            visitante_id := NULL;
+            visitante_nombre := NULL;
+            resultado := 'repetido';
+            mensaje := 'Escaneo repetido ignorado';
+            RETURN NEXT;
+            RETURN;
+        END IF;
+    END IF;
+
+    IF NOT COALESCE(p_en_horario, v_hora BETWEEN p_hora_inicio AND p_hora_fin) THEN
+        INSERT INTO accesos (usuario_id, visitante_id, tipo, autorizado, observaciones)
+        VALUES (p_usuario_id, visitante_id, p_tipo, FALSE, p_observaciones)
+        RETURNING id INTO acceso_id;
+        alerta_descripcion := 'Intento de acceso fuera de horario: ' || visitante_nombre;
+        alerta_nivel := 'medio';
+        IF p_registrar_alerta THEN
+            INSERT INTO alertas (descripcion, nivel, usuario_id, visitante_id)
+            VALUES (alerta_descripcion, alerta_nivel, p_usuario_id, visitante_id);
+        END IF;
+        resultado := 'fuera_horario';
+        mensaje := 'Fuera del horario permitido';
+        RETURN NEXT;
+        RETURN;
+    END IF;
+
+    IF p_tipo = 'entrada' THEN
+        -- Variable local: dentro de la consulta visitante_id sería la columna
+        v_visitante_id := visitante_id;
+        SELECT EXISTS (SELECT 1 FROM ocupacion_actual o WHERE o.visitante_id = v_visitante_id)
+        INTO v_dentro;
+    END IF;
+
+    INSERT INTO accesos (usuario_id, visitante_id, tipo, autorizado, observaciones)
+    VALUES (p_usuario_id, visitante_id, p_tipo, TRUE, p_observaciones)
+    RETURNING id INTO acceso_id;
+
+    IF p_tipo = 'salida' THEN
+        UPDATE credenciales SET estado = 'inactiva' WHERE id = v_credencial_id;
+    END IF;
+
+    IF v_dentro THEN
+        alerta_descripcion := 'Anti-passback: entrada sin salida previa de ' || visitante_nombre;
+        alerta_nivel := 'medio';
+        IF p_registrar_alerta THEN
+            INSERT INTO alertas (descripcion, nivel, usuario_id, visitante_id)
+            VALUES (alerta_descripcion, alerta_nivel, p_usuario_id, visitante_id);
+        END IF;
+        resultado := 'antipassback';
+        mensaje := 'Acceso registrado con alerta de anti-passback';
+        RETURN NEXT;
+        RETURN;
+    END IF;
+
+    resultado := 'autorizado';
+    mensaje := 'Acceso registrado';
+    RETURN NEXT;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Función para reconstruir ocupacion_actual desde el historial de accesos:
+-- un visitante está dentro si su último acceso autorizado fue una entrada
+CREATE OR REPLACE FUNCTION reconstruir_ocupacion()
+RETURNS INTEGER AS $$
+DECLARE
+    v_total INTEGER;
+BEGIN
+    DELETE FROM ocupacion_actual;
+
+    INSERT INTO ocupacion_actual (visitante_id, acceso_id, fecha_entrada)
+    SELECT visitante_id, id, fecha_hora
+    FROM (
+        SELECT a.visitante_id, a.id, a.fecha_hora, a.tipo,
+               ROW_NUMBER() OVER (PARTITION BY a.visitante_id ORDER BY a.fecha_hora DESC, a.id DESC) AS orden
+        FROM accesos a
+        WHERE a.autorizado = TRUE AND a.visitante_id IS NOT NULL
+    ) ultimos
+    WHERE orden = 1 AND tipo = 'entrada';
+
+    GET DIAGNOSTICS v_total = ROW_COUNT;
+    PERFORM pg_notify('ocupacion_cambio', 'recargar');
+    RETURN v_total;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Función para reconstruir visitas_visitante desde el historial de accesos
+-- (carga inicial y conciliación si los contadores se desalinean)
+CREATE OR REPLACE FUNCTION reconstruir_visitas()
+RETURNS INTEGER AS $$
+DECLARE
+    v_total INTEGER;
+BEGIN
+    LOCK TABLE visitas_visitante IN EXCLUSIVE MODE;
+    DELETE FROM visitas_visitante;
+
+    INSERT INTO visitas_visitante (visitante_id, total_visitas, ultima_visita)
+    SELECT a.visitante_id, COUNT(*), MAX(a.fecha_hora)
+    FROM accesos a
+    WHERE a.tipo = 'entrada' AND a.visitante_id IS NOT NULL
+    GROUP BY a.visitante_id;
+
+    GET DIAGNOSTICS v_total = ROW_COUNT;
+    RETURN v_total;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Función para reconstruir el resumen de accesos por hora desde el historial
+-- (carga inicial y conciliación si los contadores se desalinean)
+CREATE OR REPLACE FUNCTION reconstruir_resumen_accesos()
+RETURNS INTEGER AS $$
+DECLARE
+    v_total INTEGER;
+BEGIN
+    LOCK TABLE accesos_por_hora IN EXCLUSIVE MODE;
+    DELETE FROM accesos_por_hora;
+
+    INSERT INTO accesos_por_hora (hora, tipo, autorizado, empresa, total)
+    SELECT DATE_TRUNC('hour', a.fecha_hora), a.tipo, COALESCE(a.autorizado, FALSE),
+           COALESCE(a.empresa, ''), COUNT(*)
+    FROM accesos a
+    WHERE a.fecha_hora IS NOT NULL
+    GROUP BY 1, 2, 3, 4;
+
+    GET DIAGNOSTICS v_total = ROW_COUNT;
+    RETURN v_total;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Función para generar reporte de accesos por fecha. Agrupa por día el resumen
+-- por hora (la resolución de los extremos del rango es de una hora)
 CREATE OR REPLACE FUNCTION generar_reporte_accesos(
     p_fecha_inicio TIMESTAMP,
     p_fecha_fin TIMESTAMP
@@ -363,22 +779,337 @@ RETURNS TABLE(
 BEGIN
     RETURN QUERY
     SELECT 
-        DATE_TRUNC('day', a.fecha_hora) as fecha,
-        a.tipo,
-        COUNT(*) as total,
-        COUNT(*) FILTER (WHERE a.autorizado = true) as autorizados,
-        COUNT(*) FILTER (WHERE a.autorizado = false) as no_autorizados
-    FROM accesos a
-    WHERE a.fecha_hora BETWEEN p_fecha_inicio AND p_fecha_fin
-    GROUP BY DATE_TRUNC('day', a.fecha_hora), a.tipo
-    ORDER BY fecha DESC, a.tipo;
+        DATE_TRUNC('day', h.hora) as fecha,
+        h.tipo,
+        SUM(h.total)::INTEGER as total,
+        COALESCE(SUM(h.total) FILTER (WHERE h.autorizado), 0)::INTEGER as autorizados,
+        COALESCE(SUM(h.total) FILTER (WHERE NOT h.autorizado), 0)::INTEGER as no_autorizados
+    FROM accesos_por_hora h
+    WHERE h.hora >= DATE_TRUNC('hour', p_fecha_inicio) AND h.hora <= p_fecha_fin
+    GROUP BY 1, 2
+    HAVING SUM(h.total) <> 0
+    ORDER BY 1 DESC, 2;
+END;
+$$ LANGUAGE plpgsql;
+
+-- ==========================================================
+-- TRIGGERS
+-- ==========================================================
+
+-- Notificar cambios de credenciales al índice en memoria de cada worker
+CREATE OR REPLACE FUNCTION notificar_cambio_credencial()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        PERFORM pg_notify('credenciales_cambio', 'credencial:' || OLD.codigo);
+        RETURN OLD;
+    END IF;
+    IF TG_OP = 'UPDATE' AND OLD.codigo <> NEW.codigo THEN
+        PERFORM pg_notify('credenciales_cambio', 'credencial:' || OLD.codigo);
+    END IF;
+    PERFORM pg_notify('credenciales_cambio', 'credencial:' || NEW.codigo);
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_credenciales_notificar ON credenciales;
+CREATE TRIGGER trg_credenciales_notificar
+AFTER INSERT OR UPDATE OR DELETE ON credenciales
+FOR EACH ROW EXECUTE FUNCTION notificar_cambio_credencial();
+
+-- Notificar cambios de visitantes que afectan a sus credenciales (nombre, empresa, estado)
+CREATE OR REPLACE FUNCTION notificar_cambio_visitante()
+RETURNS TRIGGER AS $$
+BEGIN
+    PERFORM pg_notify('credenciales_cambio', 'visitante:' || NEW.id);
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_visitantes_notificar ON visitantes;
+CREATE TRIGGER trg_visitantes_notificar
+AFTER UPDATE OF nombre, empresa, estado ON visitantes
+FOR EACH ROW
+WHEN (OLD.nombre IS DISTINCT FROM NEW.nombre
+      OR OLD.empresa IS DISTINCT FROM NEW.empresa
+      OR OLD.estado IS DISTINCT FROM NEW.estado)
+EXECUTE FUNCTION notificar_cambio_visitante();
+
+-- Mantener ocupacion_actual con cada acceso autorizado y avisar a los workers.
+-- Un acceso anterior al estado guardado (p. ej. un lote atrasado) no lo pisa
+CREATE OR REPLACE FUNCTION actualizar_ocupacion()
+RETURNS TRIGGER AS $$
+DECLARE
+    v_nombre VARCHAR;
+    v_empresa VARCHAR;
+BEGIN
+    IF NEW.tipo = 'entrada' THEN
+        INSERT INTO ocupacion_actual (visitante_id, acceso_id, fecha_entrada)
+        VALUES (NEW.visitante_id, NEW.id, NEW.fecha_hora)
+        ON CONFLICT (visitante_id) DO UPDATE
+        SET acceso_id = EXCLUDED.acceso_id, fecha_entrada = EXCLUDED.fecha_entrada
+        WHERE ocupacion_actual.fecha_entrada <= EXCLUDED.fecha_entrada;
+        IF NOT FOUND THEN
+            RETURN NULL;
+        END IF;
+        SELECT nombre, empresa INTO v_nombre, v_empresa FROM visitantes WHERE id = NEW.visitante_id;
+        PERFORM pg_notify('ocupacion_cambio', json_build_object(
+            'tipo', 'entrada', 'visitante_id', NEW.visitante_id, 'nombre', v_nombre,
+            'empresa', v_empresa, 'fecha_entrada', NEW.fecha_hora
+        )::text);
+    ELSE
+        DELETE FROM ocupacion_actual
+        WHERE visitante_id = NEW.visitante_id AND fecha_entrada <= NEW.fecha_hora;
+        IF FOUND THEN
+            PERFORM pg_notify('ocupacion_cambio', json_build_object(
+                'tipo', 'salida', 'visitante_id', NEW.visitante_id
+            )::text);
+        END IF;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_accesos_ocupacion ON accesos;
+CREATE TRIGGER trg_accesos_ocupacion
+AFTER INSERT ON accesos
+FOR EACH ROW
+WHEN (NEW.autorizado = TRUE AND NEW.visitante_id IS NOT NULL)
+EXECUTE FUNCTION actualizar_ocupacion();
+
+-- Sumar cada entrada a los contadores de visitas del visitante
+CREATE OR REPLACE FUNCTION contar_visita()
+RETURNS TRIGGER AS $$
+BEGIN
+    INSERT INTO visitas_visitante (visitante_id, total_visitas, ultima_visita)
+    VALUES (NEW.visitante_id, 1, NEW.fecha_hora)
+    ON CONFLICT (visitante_id) DO UPDATE
+    SET total_visitas = visitas_visitante.total_visitas + 1,
+        ultima_visita = GREATEST(visitas_visitante.ultima_visita, EXCLUDED.ultima_visita);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_accesos_visitas ON accesos;
+CREATE TRIGGER trg_accesos_visitas
+AFTER INSERT ON accesos
+FOR EACH ROW
+WHEN (NEW.tipo = 'entrada' AND NEW.visitante_id IS NOT NULL)
+EXECUTE FUNCTION contar_visita();
+
+-- Guardar en el acceso la empresa del visitante al registrarlo. El resumen
+-- suma y resta con la del acceso, así que un cambio posterior de empresa del
+-- visitante no deja restos en el grupo anterior
+CREATE OR REPLACE FUNCTION fijar_empresa_acceso()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF NEW.empresa IS NULL AND NEW.visitante_id IS NOT NULL THEN
+        SELECT v.empresa INTO NEW.empresa FROM visitantes v WHERE v.id = NEW.visitante_id;
+    END IF;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_accesos_empresa ON accesos;
+CREATE TRIGGER trg_accesos_empresa
+BEFORE INSERT ON accesos
+FOR EACH ROW EXECUTE FUNCTION fijar_empresa_acceso();
+
+-- Sumar (o restar) al resumen por hora los accesos de cada sentencia. Las
+-- filas se agrupan antes del upsert (un lote de registrar_lote es una fila
+-- por clave) y se ordenan para tomar los bloqueos siempre en el mismo orden
+CREATE OR REPLACE FUNCTION acumular_accesos_por_hora()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        INSERT INTO accesos_por_hora (hora, tipo, autorizado, empresa, total)
+        SELECT DATE_TRUNC('hour', a.fecha_hora), a.tipo, COALESCE(a.autorizado, FALSE),
+               COALESCE(a.empresa, ''), -COUNT(*)
+        FROM accesos_anteriores a
+        WHERE a.fecha_hora IS NOT NULL
+        GROUP BY 1, 2, 3, 4
+        ORDER BY 1, 2, 3, 4
+        ON CONFLICT (hora, tipo, autorizado, empresa) DO UPDATE
+        SET total = accesos_por_hora.total + EXCLUDED.total;
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        INSERT INTO accesos_por_hora (hora, tipo, autorizado, empresa, total)
+        SELECT DATE_TRUNC('hour', a.fecha_hora), a.tipo, COALESCE(a.autorizado, FALSE),
+               COALESCE(a.empresa, ''), COUNT(*)
+        FROM accesos_nuevos a
+        WHERE a.fecha_hora IS NOT NULL
+        GROUP BY 1, 2, 3, 4
+        ORDER BY 1, 2, 3, 4
+        ON CONFLICT (hora, tipo, autorizado, empresa) DO UPDATE
+        SET total = accesos_por_hora.total + EXCLUDED.total;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Las tablas de transición no admiten triggers de varios eventos: uno por evento
+DROP TRIGGER IF EXISTS trg_accesos_resumen_insert ON accesos;
+CREATE TRIGGER trg_accesos_resumen_insert
+AFTER INSERT ON accesos
+REFERENCING NEW TABLE AS accesos_nuevos
+FOR EACH STATEMENT EXECUTE FUNCTION acumular_accesos_por_hora();
+
+DROP TRIGGER IF EXISTS trg_accesos_resumen_update ON accesos;
+CREATE TRIGGER trg_accesos_resumen_update
+AFTER UPDATE ON accesos
+REFERENCING OLD TABLE AS accesos_anteriores NEW TABLE AS accesos_nuevos
+FOR EACH STATEMENT EXECUTE FUNCTION acumular_accesos_por_hora();
+
+DROP TRIGGER IF EXISTS trg_accesos_resumen_delete ON accesos;
+CREATE TRIGGER trg_accesos_resumen_delete
+AFTER DELETE ON accesos
+REFERENCING OLD TABLE AS accesos_anteriores
+FOR EACH STATEMENT EXECUTE FUNCTION acumular_accesos_por_hora();
+
+CREATE OR REPLACE FUNCTION vaciar_resumen_accesos()
+RETURNS TRIGGER AS $$
+BEGIN
+    TRUNCATE accesos_por_hora;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_accesos_resumen_truncate ON accesos;
+CREATE TRIGGER trg_accesos_resumen_truncate
+AFTER TRUNCATE ON accesos
+FOR EACH STATEMENT EXECUTE FUNCTION vaciar_resumen_accesos();
+
+-- Los totales por día y por mes ya no se guardan: se agrupan desde
+-- accesos_por_hora al consultar. Quitar lo de instalaciones anteriores
+DROP TRIGGER IF EXISTS trg_accesos_por_hora_propagar ON accesos_por_hora;
+DROP FUNCTION IF EXISTS propagar_accesos_por_hora();
+DROP TABLE IF EXISTS accesos_por_dia, accesos_por_mes;
+
+-- Notificar cambios de dispositivos para vaciar la caché de tokens
+CREATE OR REPLACE FUNCTION notificar_cambio_dispositivo()
+RETURNS TRIGGER AS $$
+BEGIN
+    PERFORM pg_notify('dispositivos_cambio', '*');
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_dispositivos_notificar ON dispositivos;
+CREATE TRIGGER trg_dispositivos_notificar
+AFTER UPDATE OR DELETE ON dispositivos
+FOR EACH STATEMENT EXECUTE FUNCTION notificar_cambio_dispositivo();
+
+-- Notificar cambios de horarios y feriados para recompilar el motor de horarios
+CREATE OR REPLACE FUNCTION notificar_cambio_horarios()
+RETURNS TRIGGER AS $$
+BEGIN
+    PERFORM pg_notify('horarios_cambio', TG_TABLE_NAME);
+    RETURN NULL;
 END;
 $$ LANGUAGE plpgsql;
 
+DROP TRIGGER IF EXISTS trg_horarios_acceso_notificar ON horarios_acceso;
+CREATE TRIGGER trg_horarios_acceso_notificar
+AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON horarios_acceso
+FOR EACH STATEMENT EXECUTE FUNCTION notificar_cambio_horarios();
+
+DROP TRIGGER IF EXISTS trg_dias_feriados_notificar ON dias_feriados;
+CREATE TRIGGER trg_dias_feriados_notificar
+AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON dias_feriados
+FOR EACH STATEMENT EXECUTE FUNCTION notificar_cambio_horarios();
+
+-- Versiones por tabla para las ETag de los listados (utils/etag.py).
+-- Triggers por sentencia: un UPDATE masivo incrementa una sola vez.
+-- Las inserciones en accesos y alertas no pasan por aquí (son el camino
+-- caliente de la puerta y una sola fila de versiones las serializaría); esas
+-- páginas leen el último id confirmado de la tabla (utils/etag.py)
+CREATE OR REPLACE FUNCTION incrementar_version()
+RETURNS TRIGGER AS $$
+BEGIN
+    INSERT INTO versiones (clave, valor, fecha_actualizacion)
+    VALUES (TG_ARGV[0], 1, NOW())
+    ON CONFLICT (clave) DO UPDATE
+    SET valor = versiones.valor + 1, fecha_actualizacion = NOW();
+    PERFORM pg_notify('versiones_cambio', TG_ARGV[0]);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_visitantes_version ON visitantes;
+CREATE TRIGGER trg_visitantes_version
+AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON visitantes
+FOR EACH STATEMENT EXECUTE FUNCTION incrementar_version('visitantes');
+
+-- Las actualizaciones de credenciales acompañan siempre a un cambio de
+-- visitantes o a un acceso (salida), que ya cambian la ETag del listado
+DROP TRIGGER IF EXISTS trg_credenciales_version ON credenciales;
+CREATE TRIGGER trg_credenciales_version
+AFTER INSERT OR DELETE OR TRUNCATE ON credenciales
+FOR EACH STATEMENT EXECUTE FUNCTION incrementar_version('visitantes');
+
+-- visitas_visitante se actualiza con cada entrada (cubierta por el último
+-- id de accesos); aquí solo cuentan los borrados de reconstruir_visitas()
+DROP TRIGGER IF EXISTS trg_visitas_visitante_version ON visitas_visitante;
+CREATE TRIGGER trg_visitas_visitante_version
+AFTER DELETE OR TRUNCATE ON visitas_visitante
+FOR EACH STATEMENT EXECUTE FUNCTION incrementar_version('visitantes');
+
+DROP TRIGGER IF EXISTS trg_usuarios_version ON usuarios;
+CREATE TRIGGER trg_usuarios_version
+AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON usuarios
+FOR EACH STATEMENT EXECUTE FUNCTION incrementar_version('usuarios');
+
+DROP TRIGGER IF EXISTS trg_roles_version ON roles;
+CREATE TRIGGER trg_roles_version
+AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON roles
+FOR EACH STATEMENT EXECUTE FUNCTION incrementar_version('roles');
+
+DROP TRIGGER IF EXISTS trg_rol_permisos_version ON rol_permisos;
+CREATE TRIGGER trg_rol_permisos_version
+AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON rol_permisos
+FOR EACH STATEMENT EXECUTE FUNCTION incrementar_version('roles');
+
+DROP TRIGGER IF EXISTS trg_permisos_version ON permisos;
+CREATE TRIGGER trg_permisos_version
+AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON permisos
+FOR EACH STATEMENT EXECUTE FUNCTION incrementar_version('roles');
+
+DROP TRIGGER IF EXISTS trg_accesos_version ON accesos;
+CREATE TRIGGER trg_accesos_version
+AFTER UPDATE OR DELETE OR TRUNCATE ON accesos
+FOR EACH STATEMENT EXECUTE FUNCTION incrementar_version('accesos');
+
+-- El resumen cambia con cada acceso (cubierto por el último id); aquí solo
+-- cuentan los borrados de reconstruir_resumen_accesos()
+DROP TRIGGER IF EXISTS trg_accesos_por_hora_version ON accesos_por_hora;
+CREATE TRIGGER trg_accesos_por_hora_version
+AFTER DELETE OR TRUNCATE ON accesos_por_hora
+FOR EACH STATEMENT EXECUTE FUNCTION incrementar_version('accesos');
+
+DROP TRIGGER IF EXISTS trg_alertas_version ON alertas;
+CREATE TRIGGER trg_alertas_version
+AFTER UPDATE OR DELETE OR TRUNCATE ON alertas
+FOR EACH STATEMENT EXECUTE FUNCTION incrementar_version('alertas');
+
 -- ==========================================================
 -- CONFIGURACIÓN FINAL
 -- ==========================================================
 
+-- Reconstruir la ocupación actual desde el historial de accesos
+SELECT reconstruir_ocupacion();
+
+-- Cargar los contadores de visitas desde el historial de accesos
+SELECT reconstruir_visitas();
+
+-- Completar la empresa de los accesos anteriores a la columna (con la actual
+-- del visitante) y cargar el resumen de accesos por hora
+UPDATE accesos a
+SET empresa = v.empresa
+FROM visitantes v
+WHERE a.visitante_id = v.id AND a.empresa IS NULL AND v.empresa IS NOT NULL;
+
+SELECT reconstruir_resumen_accesos();
+
 -- Establecer el search_path por defecto para el esquema
 ALTER DATABASE current SET search_path TO control_acceso, public;
 
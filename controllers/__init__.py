@@ -3,9 +3,9 @@ from .auth_controller import login, logout
 from .dashboard_controller import dashboard
 from .visitantes_controller import (
     listar_visitantes, agregar_visitante, editar_visitante, 
-    cambiar_estado_visitante
+    cambiar_estado_visitante, buscar_visitantes_api
 )
-from .acceso_controller import control_acceso, listar_accesos
+from .acceso_controller import control_acceso, registrar_lote, listar_accesos, ocupacion_actual, ocupacion_total, kiosco_acceso
 from .usuarios_controller import (
     listar_usuarios, agregar_usuario, editar_usuario, 
     cambiar_estado_usuario
@@ -16,19 +16,28 @@ from .roles_controller import (
 )
 from .alertas_controller import (
     listar_alertas, crear_alerta, eliminar_alerta, 
-    crear_alerta_automatica
+    crear_alerta_automatica, alertas_no_leidas, marcar_alertas_leidas, eliminar_alertas
 )
 from .reportes_controller import (
     generar_reporte, ver_reporte, exportar_reporte_csv, 
-    exportar_reporte_pdf, reporte_estadisticas
+    exportar_reporte_pdf, reporte_estadisticas, ver_trabajo_reporte,
+    estado_trabajo_reporte, descargar_trabajo_reporte
+)
+from .sistema_controller import (
+    estado_pool, estado_indice_credenciales, estado_cola_alertas, crear_dispositivo, reconciliar_visitas,
+    reconstruir_resumen_accesos
 )
 
 __all__ = [
     'login', 'logout', 'dashboard',
-    'listar_visitantes', 'agregar_visitante', 'editar_visitante', 'cambiar_estado_visitante',
-    'control_acceso', 'listar_accesos',
+    'listar_visitantes', 'agregar_visitante', 'editar_visitante', 'cambiar_estado_visitante', 'buscar_visitantes_api',
+    'control_acceso', 'registrar_lote', 'listar_accesos', 'ocupacion_actual', 'ocupacion_total', 'kiosco_acceso',
     'listar_usuarios', 'agregar_usuario', 'editar_usuario', 'cambiar_estado_usuario',
     'listar_roles', 'crear_rol', 'editar_rol', 'eliminar_rol', 'obtener_permisos_rol',
     'listar_alertas', 'crear_alerta', 'eliminar_alerta', 'crear_alerta_automatica',
-    'generar_reporte', 'ver_reporte', 'exportar_reporte_csv', 'exportar_reporte_pdf', 'reporte_estadisticas'
+    'alertas_no_leidas', 'marcar_alertas_leidas', 'eliminar_alertas',
+    'generar_reporte', 'ver_reporte', 'exportar_reporte_csv', 'exportar_reporte_pdf', 'reporte_estadisticas',
+    'ver_trabajo_reporte', 'estado_trabajo_reporte', 'descargar_trabajo_reporte',
+    'estado_pool', 'estado_indice_credenciales', 'estado_cola_alertas', 'crear_dispositivo',
+    'reconciliar_visitas', 'reconstruir_resumen_accesos'
 ]
\ No newline at end of file
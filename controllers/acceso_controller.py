@@ -1,8 +1,27 @@
-from flask import render_template, request, redirect, url_for, session, flash
+from flask import render_template, request, redirect, url_for, session, flash, jsonify, g
+import psycopg2.extras
 from models.database import Database
-from auth.auth import login_required, permiso_requerido
+from models import indice_credenciales, cola_alertas, horarios, ocupacion
+from models.filtros import Filtros
+from auth.auth import login_required, permiso_requerido, dispositivo_requerido
 from auth.permissions import *
-from datetime import datetime
+from config import ACCESO_VENTANA_REPETICION_SEG, ACCESOS_POR_PAGINA
+from utils.paginacion import decodificar_cursor, condicion_keyset, armar_pagina
+from utils.flujo import filas_en_flujo, render_en_flujo
+from datetime import datetime, timedelta
+import time
+
+# Máximo de eventos aceptados en un lote de torniquete
+LOTE_MAX_EVENTOS = 1000
+
+# Largo máximo de un código (ancho de credenciales.codigo)
+CODIGO_MAX = 50
+
+# Último escaneo aceptado por este worker: codigo -> (tipo, instante monotónico).
+# Evita ir a la base con las relecturas más comunes; la tabla
+# escaneos_recientes hace lo mismo entre workers
+_escaneos_recientes = {}
+ESCANEOS_RECIENTES_MAX = 10000
 
 @login_required
 @permiso_requerido(CONTROL_ACCESO)
@@ -12,82 +31,352 @@ def control_acceso():
         codigo = request.form['codigo']
         tipo = request.form['tipo']  # 'entrada' o 'salida'
         
-        db = Database()
-        conn = db.conectar()
-        if not conn:
-            flash('Error de conexión a la base de datos', 'danger')
-            return redirect(url_for('control_acceso'))
+        resultado = _registrar_escaneo(codigo, tipo, session['usuario_id'])
         
-        try:
-            cursor = conn.cursor(dictionary=True)
-            
-            # Verificar credencial
-            cursor.execute("""
-                SELECT v.*, c.id as credencial_id 
-                FROM credenciales c 
-                JOIN visitantes v ON c.visitante_id = v.id 
-                WHERE c.codigo = %s AND c.estado = 'activa' 
-                AND (c.fecha_expiracion IS NULL OR c.fecha_expiracion > NOW())
-                AND v.estado = 'activo'
-            """, (codigo,))
-            
-            credencial = cursor.fetchone()
-            
-            if credencial:
-                # Verificar horario (8:00 AM - 6:00 PM)
-                hora_actual = datetime.now().time()
-                hora_inicio = datetime.strptime('08:00', '%H:%M').time()
-                hora_fin = datetime.strptime('18:00', '%H:%M').time()
-                
-                if hora_actual < hora_inicio or hora_actual > hora_fin:
-                    # Registrar acceso no autorizado por horario
-                    cursor.execute("""
-                        INSERT INTO accesos (usuario_id, visitante_id, tipo, autorizado)
-                        VALUES (%s, %s, %s, %s)
-                    """, (session['usuario_id'], credencial['id'], tipo, 0))
-                    
-                    # Registrar alerta
-                    cursor.execute("""
-                        INSERT INTO alertas (descripcion, nivel, usuario_id, visitante_id)
-                        VALUES (%s, %s, %s, %s)
-                    """, (f'Intento de acceso fuera de horario: {credencial["nombre"]}', 'medio', session['usuario_id'], credencial['id']))
-                    
-                    conn.commit()
-                    flash(f'Acceso denegado: Fuera del horario permitido (8:00 AM - 6:00 PM)', 'warning')
-                else:
-                    # Registrar acceso autorizado
-                    cursor.execute("""
-                        INSERT INTO accesos (usuario_id, visitante_id, tipo, autorizado)
-                        VALUES (%s, %s, %s, %s)
-                    """, (session['usuario_id'], credencial['id'], tipo, 1))
-                    
-                    # Si es salida, desactivar credencial
-                    if tipo == 'salida':
-                        cursor.execute("UPDATE credenciales SET estado = 'inactiva' WHERE id = %s", (credencial['credencial_id'],))
-                    
-                    conn.commit()
-                    flash(f'Acceso registrado: {credencial["nombre"]} ({tipo})', 'success')
-            else:
-                # Registrar intento de acceso no autorizado
-                cursor.execute("""
-                    INSERT INTO alertas (descripcion, nivel, usuario_id)
-                    VALUES (%s, %s, %s)
-                """, (f'Intento de acceso con código inválido: {codigo}', 'alto', session['usuario_id']))
-                
-                conn.commit()
-                flash('Código inválido, expirado o visitante inactivo', 'danger')
-            
-            cursor.close()
-            conn.close()
-            return redirect(url_for('control_acceso'))
-            
-        except Exception as e:
-            conn.rollback()
-            print(f"Error en control de acceso: {e}")
-            flash('Error al procesar el acceso', 'danger')
-            return redirect(url_for('control_acceso'))
+        if resultado['resultado'] == 'autorizado':
+            flash(f'Acceso registrado: {resultado["visitante_nombre"]} ({tipo})', 'success')
+        elif resultado['resultado'] == 'antipassback':
+            flash(f'Acceso registrado: {resultado["visitante_nombre"]} ({tipo}). '
+                  'Atención: no tiene salida registrada desde su última entrada', 'warning')
+        elif resultado['resultado'] == 'repetido':
+            flash('Escaneo repetido ignorado', 'info')
+        elif resultado['resultado'] == 'fuera_horario':
+            flash(f'Acceso denegado: Fuera del horario permitido ({resultado["horario"]})', 'warning')
+        elif resultado['resultado'] == 'error':
+            flash(resultado['mensaje'], 'danger')
+        else:
+            flash('Código inválido, expirado o visitante inactivo', 'danger')
+        return redirect(url_for('control_acceso'))
+    
+    return render_template('acceso/control.html', horario=horarios.resumen_general())
+
+@dispositivo_requerido(CONTROL_ACCESO)
+def kiosco_acceso():
+    """API para kioscos de escaneo: un escaneo por petición, sin sesión ni plantillas
+
+    Recibe {codigo, tipo} y responde solo con la decisión y el nombre del visitante.
+    """
+    datos = request.get_json(silent=True) or request.form
+    codigo = str(datos.get('codigo') or '').strip().upper()
+    tipo = datos.get('tipo', 'entrada')
+    if not codigo or tipo not in ('entrada', 'salida'):
+        return jsonify({'error': "Se esperaba un código y tipo 'entrada' o 'salida'"}), 400
+
+    resultado = _registrar_escaneo(codigo, tipo, g.dispositivo.usuario_id)
+    if resultado['resultado'] == 'error':
+        return jsonify({'error': resultado['mensaje']}), 503
+    return jsonify({
+        'resultado': resultado['resultado'],
+        'autorizado': resultado['resultado'] in ('autorizado', 'antipassback'),
+        'visitante': resultado['visitante_nombre'],
+        'mensaje': resultado['mensaje']
+    })
+
+def _registrar_escaneo(codigo, tipo, usuario_id):
+    """Verificar y registrar un escaneo de puerta.
+
+    Devuelve un diccionario con resultado, visitante_id, visitante_nombre y
+    mensaje ('error' como resultado si no se pudo procesar).
+    """
+    if _escaneo_repetido(codigo, tipo):
+        return {'resultado': 'repetido', 'visitante_id': None, 'visitante_nombre': None,
+                'mensaje': 'Escaneo repetido ignorado'}
+    
+    if len(codigo) > CODIGO_MAX:
+        # No puede ser una credencial: se rechaza sin ir a la base
+        cola_alertas.encolar(f'Intento de acceso con código inválido: {codigo}', 'alto', usuario_id)
+        return {'resultado': 'invalido', 'visitante_id': None, 'visitante_nombre': None,
+                'mensaje': 'Código inválido, expirado o visitante inactivo'}
     
-    return render_template('acceso/control.html')
+    db = Database()
+    conn = db.conectar()
+    if not conn:
+        return {'resultado': 'error', 'visitante_id': None, 'visitante_nombre': None,
+                'mensaje': 'Error de conexión a la base de datos'}
+    
+    try:
+        # La función es atómica por sí sola: en autocommit no hay BEGIN/COMMIT
+        # aparte y el escaneo cuesta un único viaje a la base
+        conn.autocommit = True
+        
+        # El horario se evalúa con el motor de horarios (ventanas, feriados y
+        # excepciones) para el visitante/empresa de la credencial del índice;
+        # solo mientras el índice no terminó de cargarse se busca en la base,
+        # con esta misma conexión. Sin credencial vigente la función rechaza el
+        # código como inválido antes de mirar el horario, y se pasa FALSE para
+        # no caer nunca en su ventana fija
+        ahora = datetime.now()
+        credencial = indice_credenciales.buscar(codigo, conn)
+        en_horario = False
+        if credencial:
+            en_horario = horarios.permitido(ahora, credencial.visitante_id, credencial.empresa)
+        
+        cursor = conn.cursor(dictionary=True)
+        
+        # Verificar credencial y horario y registrar el acceso en una sola llamada;
+        # la alerta (si corresponde) se encola para escribirse en segundo plano
+        cursor.execute("""
+            SELECT resultado, visitante_id, visitante_nombre, acceso_id, mensaje,
+                   alerta_descripcion, alerta_nivel
+            FROM registrar_acceso_credencial(%s, %s, %s, p_registrar_alerta => FALSE,
+                                             p_en_horario => %s, p_ventana_repeticion => %s)
+        """, (codigo, tipo, usuario_id, en_horario, ACCESO_VENTANA_REPETICION_SEG))
+        resultado = dict(cursor.fetchone())
+        cursor.close()
+    except Exception as e:
+        conn.rollback()
+        print(f"Error en control de acceso: {e}")
+        return {'resultado': 'error', 'visitante_id': None, 'visitante_nombre': None,
+                'mensaje': 'Error al procesar el acceso'}
+    finally:
+        conn.close()
+    
+    if resultado['resultado'] not in ('repetido', 'invalido'):
+        _recordar_escaneo(codigo, tipo)
+    
+    if resultado['alerta_descripcion']:
+        cola_alertas.encolar(resultado['alerta_descripcion'], resultado['alerta_nivel'],
+                             usuario_id, resultado['visitante_id'])
+    
+    if resultado['resultado'] == 'autorizado' and tipo == 'salida':
+        indice_credenciales.descartar(codigo)
+    elif resultado['resultado'] == 'fuera_horario':
+        resultado['horario'] = horarios.descripcion(ahora, resultado['visitante_id'],
+                                                    credencial.empresa if credencial else None)
+    return resultado
+
+@login_required
+@permiso_requerido(CONTROL_ACCESO)
+def registrar_lote():
+    """API para torniquetes: registrar un lote de escaneos en una sola transacción
+
+    Recibe una lista JSON (o {"eventos": [...]}) de {codigo, tipo, timestamp, gate}
+    y devuelve el resultado de cada evento en el mismo orden.
+    """
+    datos = request.get_json(silent=True)
+    eventos = datos.get('eventos') if isinstance(datos, dict) else datos
+    if not isinstance(eventos, list):
+        return jsonify({'error': 'Se esperaba una lista de eventos'}), 400
+    if len(eventos) > LOTE_MAX_EVENTOS:
+        return jsonify({'error': f'El lote no puede tener más de {LOTE_MAX_EVENTOS} eventos'}), 413
+
+    resultados = [None] * len(eventos)
+    validos = []
+    for indice, evento in enumerate(eventos):
+        error, normalizado = _validar_evento(evento)
+        if error:
+            resultados[indice] = {'indice': indice, 'estado': 'rechazado', 'motivo': error}
+        else:
+            validos.append((indice, normalizado))
+
+    if not validos:
+        return jsonify({'procesados': 0, 'resultados': resultados})
+
+    db = Database()
+    conn = db.conectar()
+    if not conn:
+        return jsonify({'error': 'Error de conexión a la base de datos'}), 503
+
+    try:
+        cursor = conn.cursor()
+
+        # Todas las credenciales del lote en una sola consulta
+        codigos = list({evento['codigo'] for _, evento in validos})
+        cursor.execute("""
+            SELECT c.codigo, c.id, c.estado, c.fecha_expiracion,
+                   v.id, v.nombre, v.estado, v.empresa
+            FROM credenciales c
+            JOIN visitantes v ON c.visitante_id = v.id
+            WHERE c.codigo = ANY(%s)
+        """, (codigos,))
+        credenciales = {
+            fila[0]: {
+                'credencial_id': fila[1], 'activa': fila[2] == 'activa', 'fecha_expiracion': fila[3],
+                'visitante_id': fila[4], 'nombre': fila[5], 'visitante_activo': fila[6] == 'activo',
+                'empresa': fila[7]
+            }
+            for fila in cursor.fetchall()
+        }
+
+        # Repeticiones y anti-passback con el mismo estado que el escaneo
+        # individual (escaneos_recientes y ocupacion_actual), no con el de
+        # este worker: así deciden igual todos los workers
+        ultimos_escaneos = {}  # codigo -> (tipo, momento) del último escaneo
+        if ACCESO_VENTANA_REPETICION_SEG > 0:
+            cursor.execute("""
+                SELECT codigo, tipo, fecha FROM escaneos_recientes
+                WHERE codigo = ANY(%s)
+                FOR UPDATE
+            """, (codigos,))
+            ultimos_escaneos = {fila[0]: (fila[1], fila[2]) for fila in cursor.fetchall()}
+        cursor.execute("""
+            SELECT visitante_id FROM ocupacion_actual WHERE visitante_id = ANY(%s)
+        """, (list({c['visitante_id'] for c in credenciales.values()}),))
+        dentro = {fila[0]: True for fila in cursor.fetchall()}  # visitante_id -> está dentro
+
+        usuario_id = session['usuario_id']
+        filas_accesos = []
+        filas_alertas = []
+        credenciales_salida = []
+        escaneos_lote = {}  # codigo -> (tipo, momento) a guardar en escaneos_recientes
+        ventana_repeticion = timedelta(seconds=ACCESO_VENTANA_REPETICION_SEG)
+
+        # En orden cronológico, para que una salida invalide los escaneos posteriores
+        for indice, evento in sorted(validos, key=lambda item: item[1]['fecha_hora']):
+            codigo = evento['codigo']
+            momento = evento['fecha_hora']
+            observaciones = f"Puerta: {evento['gate']}" if evento['gate'] else None
+            credencial = credenciales.get(codigo)
+
+            # Los eventos pueden ser anteriores al último escaneo guardado
+            # (lote diferido): se compara la distancia en cualquier sentido
+            anterior = ultimos_escaneos.get(codigo)
+            if (ACCESO_VENTANA_REPETICION_SEG > 0 and anterior is not None and anterior[0] == evento['tipo']
+                    and abs(momento - anterior[1]) < ventana_repeticion):
+                resultados[indice] = {'indice': indice, 'codigo': codigo, 'estado': 'repetido',
+                                      'motivo': 'Escaneo repetido ignorado'}
+                continue
+
+            vigente = (
+                credencial is not None and credencial['activa'] and credencial['visitante_activo']
+                and (credencial['fecha_expiracion'] is None or credencial['fecha_expiracion'] > momento)
+            )
+            if not vigente:
+                # Los códigos inválidos no se guardan en escaneos_recientes
+                filas_alertas.append((f'Intento de acceso con código inválido: {codigo}', 'alto', usuario_id, None, momento))
+                resultados[indice] = {'indice': indice, 'codigo': codigo, 'estado': 'invalido',
+                                      'motivo': 'Código inválido, expirado o visitante inactivo'}
+                continue
+            if anterior is None or momento >= anterior[1]:
+                ultimos_escaneos[codigo] = escaneos_lote[codigo] = (evento['tipo'], momento)
+
+            if not horarios.permitido(momento, credencial['visitante_id'], credencial['empresa']):
+                filas_accesos.append((usuario_id, credencial['visitante_id'], evento['tipo'], momento, False, observaciones))
+                filas_alertas.append((f'Intento de acceso fuera de horario: {credencial["nombre"]}', 'medio',
+                                      usuario_id, credencial['visitante_id'], momento))
+                resultados[indice] = {'indice': indice, 'codigo': codigo, 'estado': 'denegado',
+                                      'motivo': 'Fuera del horario permitido', 'visitante': credencial['nombre']}
+                continue
+
+            filas_accesos.append((usuario_id, credencial['visitante_id'], evento['tipo'], momento, True, observaciones))
+            if evento['tipo'] == 'salida':
+                credencial['activa'] = False
+                credenciales_salida.append(credencial['credencial_id'])
+            resultados[indice] = {'indice': indice, 'codigo': codigo, 'estado': 'autorizado',
+                                  'visitante': credencial['nombre']}
+
+            visitante_id = credencial['visitante_id']
+            if evento['tipo'] == 'entrada' and dentro.get(visitante_id, False):
+                filas_alertas.append((f'Anti-passback: entrada sin salida previa de {credencial["nombre"]}', 'medio',
+                                      usuario_id, visitante_id, momento))
+                resultados[indice]['estado'] = 'antipassback'
+            dentro[visitante_id] = evento['tipo'] == 'entrada'
+
+        if filas_accesos:
+            psycopg2.extras.execute_values(cursor, """
+                INSERT INTO accesos (usuario_id, visitante_id, tipo, fecha_hora, autorizado, observaciones)
+                VALUES %s
+            """, filas_accesos, page_size=500)
+        if filas_alertas:
+            psycopg2.extras.execute_values(cursor, """
+                INSERT INTO alertas (descripcion, nivel, usuario_id, visitante_id, fecha)
+                VALUES %s
+            """, [(fila[0][:cola_alertas.DESCRIPCION_MAX],) + fila[1:] for fila in filas_alertas], page_size=500)
+        if escaneos_lote and ACCESO_VENTANA_REPETICION_SEG > 0:
+            psycopg2.extras.execute_values(cursor, """
+                INSERT INTO escaneos_recientes (codigo, tipo, fecha)
+                VALUES %s
+                ON CONFLICT (codigo) DO UPDATE
+                SET tipo = EXCLUDED.tipo, fecha = EXCLUDED.fecha
+                WHERE escaneos_recientes.fecha <= EXCLUDED.fecha
+            """, [(codigo, tipo, momento) for codigo, (tipo, momento) in sorted(escaneos_lote.items())],
+                page_size=500)
+        if ACCESO_VENTANA_REPETICION_SEG > 0:
+            cursor.execute("SELECT limpiar_escaneos_recientes(%s, %s)",
+                           (ACCESO_VENTANA_REPETICION_SEG, LOTE_MAX_EVENTOS))
+        if credenciales_salida:
+            cursor.execute("UPDATE credenciales SET estado = 'inactiva' WHERE id = ANY(%s)", (credenciales_salida,))
+
+        conn.commit()
+        cursor.close()
+        conn.close()
+
+        for codigo, credencial in credenciales.items():
+            if credencial['credencial_id'] in credenciales_salida:
+                indice_credenciales.descartar(codigo)
+
+        return jsonify({'procesados': len(validos), 'resultados': resultados})
+
+    except Exception as e:
+        conn.rollback()
+        print(f"Error al registrar lote de accesos: {e}")
+        return jsonify({'error': 'Error al procesar el lote'}), 500
+
+@login_required
+@permiso_requerido(VER_REGISTRO_ACCESOS)
+def ocupacion_total():
+    """API con la cantidad de visitantes dentro en este momento"""
+    return jsonify({'total': ocupacion.total()})
+
+@login_required
+@permiso_requerido(VER_REGISTRO_ACCESOS)
+def ocupacion_actual():
+    """API con los visitantes dentro en este momento (pase de lista de evacuación)"""
+    ocupantes = ocupacion.listar()
+    return jsonify({
+        'total': len(ocupantes),
+        'generado': datetime.now().isoformat(timespec='seconds'),
+        'visitantes': [
+            {
+                'visitante_id': o.visitante_id,
+                'nombre': o.nombre,
+                'empresa': o.empresa,
+                'fecha_entrada': o.fecha_entrada.isoformat(timespec='seconds') if o.fecha_entrada else None
+            }
+            for o in ocupantes
+        ]
+    })
+
+def _escaneo_repetido(codigo, tipo):
+    """True si este worker ya aceptó el mismo código y tipo dentro de la ventana"""
+    anterior = _escaneos_recientes.get(codigo)
+    return (
+        ACCESO_VENTANA_REPETICION_SEG > 0 and anterior is not None and anterior[0] == tipo
+        and time.monotonic() - anterior[1] < ACCESO_VENTANA_REPETICION_SEG
+    )
+
+def _recordar_escaneo(codigo, tipo):
+    if len(_escaneos_recientes) >= ESCANEOS_RECIENTES_MAX:
+        limite = time.monotonic() - ACCESO_VENTANA_REPETICION_SEG
+        for clave, (_, instante) in list(_escaneos_recientes.items()):
+            if instante < limite:
+                _escaneos_recientes.pop(clave, None)
+        if len(_escaneos_recientes) >= ESCANEOS_RECIENTES_MAX:
+            _escaneos_recientes.clear()
+    _escaneos_recientes[codigo] = (tipo, time.monotonic())
+
+def _validar_evento(evento):
+    """Normalizar un evento del lote. Devuelve (error, evento_normalizado)."""
+    if not isinstance(evento, dict):
+        return 'El evento debe ser un objeto', None
+    codigo = str(evento.get('codigo') or '').strip().upper()
+    if not codigo:
+        return 'Falta el código', None
+    if len(codigo) > CODIGO_MAX:
+        return f'El código no puede tener más de {CODIGO_MAX} caracteres', None
+    tipo = evento.get('tipo')
+    if tipo not in ('entrada', 'salida'):
+        return "El tipo debe ser 'entrada' o 'salida'", None
+    try:
+        fecha_hora = datetime.fromisoformat(str(evento.get('timestamp')))
+    except ValueError:
+        return 'Timestamp inválido (se espera ISO 8601)', None
+    if fecha_hora.tzinfo is not None:
+        # Las columnas son TIMESTAMP sin zona: convertir a hora local
+        fecha_hora = fecha_hora.astimezone().replace(tzinfo=None)
+    gate = evento.get('gate')
+    return None, {'codigo': codigo, 'tipo': tipo, 'fecha_hora': fecha_hora,
+                  'gate': str(gate) if gate is not None else None}
 
 @login_required
 @permiso_requerido(VER_REGISTRO_ACCESOS)
@@ -107,48 +396,63 @@ def listar_accesos():
         fecha_hasta = request.args.get('fecha_hasta', '')
         tipo = request.args.get('tipo', '')
         autorizado = request.args.get('autorizado', '')
+        completo = request.args.get('completo') == '1'
+        
+        # Paginación por cursor sobre (fecha_hora, id)
+        despues = decodificar_cursor(request.args.get('despues'))
+        antes = decodificar_cursor(request.args.get('antes'))
+        por_pagina = min(max(request.args.get('por_pagina', ACCESOS_POR_PAGINA, type=int), 1), 200)
         
         # Construir consulta base
         query = """
-            SELECT a.*, v.nombre as visitante_nombre, u.nombre as usuario_nombre
+            SELECT a.id, a.fecha_hora, a.tipo, a.autorizado, a.observaciones,
+                   v.nombre as visitante_nombre, u.nombre as usuario_nombre
             FROM accesos a
             LEFT JOIN visitantes v ON a.visitante_id = v.id
             LEFT JOIN usuarios u ON a.usuario_id = u.id
             WHERE a.tipo IN ('entrada', 'salida')
         """
-        params = []
         
-        # Aplicar filtros
-        if fecha_desde:
-            query += " AND DATE(a.fecha_hora) >= %s"
-            params.append(fecha_desde)
+        # Aplicar filtros (rangos de fecha que usan los índices)
+        filtros = (Filtros()
+                   .rango_dias('a.fecha_hora', fecha_desde, fecha_hasta)
+                   .igual('a.tipo', tipo)
+                   .si_no('a.autorizado', autorizado))
+        query += filtros.sql()
+        params = filtros.params
         
-        if fecha_hasta:
-            query += " AND DATE(a.fecha_hora) <= %s"
-            params.append(fecha_hasta)
+        # Filtros actuales para armar los enlaces de página
+        filtros_enlace = {clave: valor for clave, valor in request.args.items()
+                   if clave not in ('despues', 'antes', 'completo') and valor}
+        contexto = dict(fecha_desde=fecha_desde,
+                        fecha_hasta=fecha_hasta,
+                        tipo_seleccionado=tipo,
+                        autorizado_seleccionado=autorizado,
+                        filtros_enlace=filtros_enlace)
         
-        if tipo:
-            query += " AND a.tipo = %s"
-            params.append(tipo)
-        
-        if autorizado:
-            query += " AND a.autorizado = %s"
-            params.append(1 if autorizado == 'si' else 0)
+        if completo:
+            # Todo el rango sin paginar: filas desde un cursor del servidor y
+            # HTML enviado a medida que se genera
+            cursor.close()
+            accesos = filas_en_flujo(conn, query + " ORDER BY a.fecha_hora DESC, a.id DESC",
+                                     params, 'historial_accesos')
+            return render_en_flujo('acceso/listar.html', accesos=accesos, completo=True, **contexto)
         
-        query += " ORDER BY a.fecha_hora DESC"
+        condicion, params_cursor, orden = condicion_keyset('a.fecha_hora', 'a.id', despues, antes)
+        query += condicion + orden + " LIMIT %s"
+        params += params_cursor + [por_pagina + 1]
         
         cursor.execute(query, params)
-        accesos = cursor.fetchall()
+        accesos, cursor_anterior, cursor_siguiente = armar_pagina(cursor.fetchall(), por_pagina, despues, antes)
         
         cursor.close()
         conn.close()
         
         return render_template('acceso/listar.html', 
                              accesos=accesos,
-                             fecha_desde=fecha_desde,
-                             fecha_hasta=fecha_hasta,
-                             tipo_seleccionado=tipo,
-                             autorizado_seleccionado=autorizado)
+                             cursor_anterior=cursor_anterior,
+                             cursor_siguiente=cursor_siguiente,
+                             **contexto)
         
     except Exception as e:
         print(f"Error al listar accesos: {e}")
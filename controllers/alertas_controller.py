@@ -1,13 +1,18 @@
-from flask import render_template, request, redirect, url_for, session, flash
+from flask import render_template, request, redirect, url_for, session, flash, jsonify
 from models.database import Database
+from models import cola_alertas
+from models.filtros import Filtros
 from auth.auth import login_required, permiso_requerido
 from auth.permissions import VER_ALERTAS, CREAR_ALERTAS, EDITAR_ALERTAS, ELIMINAR_ALERTAS
+from config import ALERTAS_POR_PAGINA, ALERTAS_NO_LEIDAS_TOPE
+from utils.paginacion import decodificar_cursor, condicion_keyset, armar_pagina
+from utils.flujo import filas_en_flujo, render_en_flujo
 from datetime import datetime
 
 @login_required
 @permiso_requerido(VER_ALERTAS)
 def listar_alertas():
-    """Listar todas las alertas del sistema"""
+    """Bandeja de alertas, de la más reciente a la más antigua, paginada por cursor"""
     db = Database()
     conn = db.conectar()
     if not conn:
@@ -21,56 +26,80 @@ def listar_alertas():
         nivel = request.args.get('nivel', '')
         fecha_desde = request.args.get('fecha_desde', '')
         fecha_hasta = request.args.get('fecha_hasta', '')
+        leida = request.args.get('leida', '')
+        completo = request.args.get('completo') == '1'
+        
+        # Paginación por cursor sobre (fecha, id)
+        despues = decodificar_cursor(request.args.get('despues'))
+        antes = decodificar_cursor(request.args.get('antes'))
+        por_pagina = min(max(request.args.get('por_pagina', ALERTAS_POR_PAGINA, type=int), 1), 200)
         
         # Construir consulta base
         query = """
-            SELECT a.*, u.nombre as usuario_nombre, v.nombre as visitante_nombre
+            SELECT a.id, a.descripcion, a.fecha, a.nivel, a.leida,
+                   u.nombre as usuario_nombre, v.nombre as visitante_nombre
             FROM alertas a
             LEFT JOIN usuarios u ON a.usuario_id = u.id
             LEFT JOIN visitantes v ON a.visitante_id = v.id
-            WHERE 1=1
+            WHERE a.fecha IS NOT NULL
         """
-        params = []
-        
-        # Aplicar filtros
-        if nivel:
-            query += " AND a.nivel = %s"
-            params.append(nivel)
-        
-        if fecha_desde:
-            query += " AND DATE(a.fecha) >= %s"
-            params.append(fecha_desde)
-        
-        if fecha_hasta:
-            query += " AND DATE(a.fecha) <= %s"
-            params.append(fecha_hasta)
         
-        query += " ORDER BY a.fecha DESC"
-        
-        cursor.execute(query, params)
-        alertas = cursor.fetchall()
+        # Aplicar filtros (rangos de fecha que usan los índices)
+        filtros = (Filtros()
+                   .igual('a.nivel', nivel)
+                   .rango_dias('a.fecha', fecha_desde, fecha_hasta)
+                   .si_no('a.leida', leida))
+        query += filtros.sql()
+        params = filtros.params
         
         # Obtener estadísticas de alertas
-        cursor.execute("""
+        hoy = Filtros().hoy('fecha')
+        cursor.execute(f"""
             SELECT 
                 COUNT(*) as total,
-                SUM(CASE WHEN nivel = 'alto' THEN 1 ELSE 0 END) as altas,
-                SUM(CASE WHEN nivel = 'medio' THEN 1 ELSE 0 END) as medias,
-                SUM(CASE WHEN nivel = 'bajo' THEN 1 ELSE 0 END) as bajas
+                COUNT(*) FILTER (WHERE nivel = 'alto') as altas,
+                COUNT(*) FILTER (WHERE nivel = 'medio') as medias,
+                COUNT(*) FILTER (WHERE nivel = 'bajo') as bajas
             FROM alertas 
-            WHERE DATE(fecha) = CURRENT_DATE
-        """)
+            {hoy.where()}
+        """, hoy.params)
         estadisticas = cursor.fetchone()
+        estadisticas['no_leidas'] = _contar_no_leidas(cursor)
+        
+        # Filtros actuales para armar los enlaces de página
+        filtros_enlace = {clave: valor for clave, valor in request.args.items()
+                   if clave not in ('despues', 'antes', 'completo') and valor}
+        contexto = dict(estadisticas=estadisticas,
+                        nivel_seleccionado=nivel,
+                        fecha_desde=fecha_desde,
+                        fecha_hasta=fecha_hasta,
+                        leida_seleccionada=leida,
+                        tope_no_leidas=ALERTAS_NO_LEIDAS_TOPE,
+                        filtros_enlace=filtros_enlace)
+        
+        if completo:
+            # Todo el rango sin paginar, en flujo desde un cursor del servidor
+            cursor.close()
+            alertas = filas_en_flujo(conn, query + " ORDER BY a.fecha DESC, a.id DESC",
+                                     params, 'bandeja_alertas')
+            return render_en_flujo('alertas/listar.html', alertas=alertas, completo=True, **contexto)
+        
+        condicion, params_cursor, orden = condicion_keyset('a.fecha', 'a.id', despues, antes)
+        query += condicion + orden + " LIMIT %s"
+        params += params_cursor + [por_pagina + 1]
+        
+        cursor.execute(query, params)
+        alertas, cursor_anterior, cursor_siguiente = armar_pagina(
+            cursor.fetchall(), por_pagina, despues, antes, columna_fecha='fecha')
         
         cursor.close()
         conn.close()
         
         return render_template('alertas/listar.html', 
                              alertas=alertas,
-                             estadisticas=estadisticas,
-                             nivel_seleccionado=nivel,
-                             fecha_desde=fecha_desde,
-                             fecha_hasta=fecha_hasta)
+                             cursor_anterior=cursor_anterior,
+                             cursor_siguiente=cursor_siguiente,
+                             **contexto)
         
     except Exception as e:
         print(f"Error al listar alertas: {e}")
@@ -160,27 +189,107 @@ def eliminar_alerta(id):
     
     return redirect(url_for('listar_alertas'))
 
-def crear_alerta_automatica(descripcion, nivel='medio', usuario_id=None, visitante_id=None):
-    """Función para crear alertas automáticamente desde otros módulos"""
+def _contar_no_leidas(cursor):
+    """Alertas sin leer, contadas sobre el índice parcial idx_alertas_no_leidas.
+    Se deja de contar al pasar ALERTAS_NO_LEIDAS_TOPE (la bandeja muestra "N+")"""
+    cursor.execute("""
+        SELECT COUNT(*) as total
+        FROM (SELECT 1 FROM alertas WHERE leida = FALSE LIMIT %s) pendientes
+    """, (ALERTAS_NO_LEIDAS_TOPE + 1,))
+    fila = cursor.fetchone()
+    return fila['total'] if isinstance(fila, dict) else fila[0]
+
+def _ids_seleccionados():
+    return [int(i) for i in request.form.getlist('ids') if i.isdigit()]
+
+@login_required
+@permiso_requerido(VER_ALERTAS)
+def alertas_no_leidas():
+    """API con el número de alertas sin leer (para el indicador del menú)"""
+    db = Database()
+    conn = db.conectar()
+    if not conn:
+        return jsonify({'error': 'Error de conexión a la base de datos'}), 503
+    
+    try:
+        cursor = conn.cursor(dictionary=True)
+        total = _contar_no_leidas(cursor)
+        cursor.close()
+        return jsonify({'no_leidas': min(total, ALERTAS_NO_LEIDAS_TOPE),
+                        'mas': total > ALERTAS_NO_LEIDAS_TOPE})
+    except Exception as e:
+        print(f"Error al contar alertas no leídas: {e}")
+        return jsonify({'error': 'Error al contar alertas'}), 500
+    finally:
+        conn.close()
+
+@login_required
+@permiso_requerido(EDITAR_ALERTAS)
+def marcar_alertas_leidas():
+    """Marcar como leídas las alertas seleccionadas, o todas si se pide 'todas'"""
+    todas = request.form.get('todas') == '1'
+    ids = _ids_seleccionados()
+    if not todas and not ids:
+        flash('No se seleccionó ninguna alerta', 'warning')
+        return redirect(url_for('listar_alertas'))
+    
     db = Database()
     conn = db.conectar()
     if not conn:
-        print("Error: No se pudo conectar a la base de datos para crear alerta")
-        return False
+        flash('Error de conexión a la base de datos', 'danger')
+        return redirect(url_for('listar_alertas'))
     
     try:
         cursor = conn.cursor()
-        cursor.execute("""
-            INSERT INTO alertas (descripcion, nivel, usuario_id, visitante_id)
-            VALUES (%s, %s, %s, %s)
-        """, (descripcion, nivel, usuario_id, visitante_id))
-        
+        if todas:
+            cursor.execute("UPDATE alertas SET leida = TRUE WHERE leida = FALSE")
+        else:
+            cursor.execute("UPDATE alertas SET leida = TRUE WHERE id = ANY(%s) AND leida = FALSE", (ids,))
+        total = cursor.rowcount
         conn.commit()
-        return True
+        cursor.close()
+        flash(f'{total} alerta(s) marcada(s) como leída(s)', 'success')
     except Exception as e:
-        print(f"Error creando alerta automática: {e}")
         conn.rollback()
-        return False
+        flash(f'Error al marcar alertas: {str(e)}', 'danger')
     finally:
+        conn.close()
+    
+    return redirect(url_for('listar_alertas'))
+
+@login_required
+@permiso_requerido(ELIMINAR_ALERTAS)
+def eliminar_alertas():
+    """Eliminar en una sola sentencia las alertas seleccionadas"""
+    ids = _ids_seleccionados()
+    if not ids:
+        flash('No se seleccionó ninguna alerta', 'warning')
+        return redirect(url_for('listar_alertas'))
+    
+    db = Database()
+    conn = db.conectar()
+    if not conn:
+        flash('Error de conexión a la base de datos', 'danger')
+        return redirect(url_for('listar_alertas'))
+    
+    try:
+        cursor = conn.cursor()
+        cursor.execute("DELETE FROM alertas WHERE id = ANY(%s)", (ids,))
+        total = cursor.rowcount
+        conn.commit()
         cursor.close()
+        flash(f'{total} alerta(s) eliminada(s)', 'success')
+    except Exception as e:
+        conn.rollback()
+        flash(f'Error al eliminar alertas: {str(e)}', 'danger')
+    finally:
         conn.close()
+    
+    return redirect(url_for('listar_alertas'))
+
+def crear_alerta_automatica(descripcion, nivel='medio', usuario_id=None, visitante_id=None):
+    """Función para crear alertas automáticamente desde otros módulos
+
+    La alerta se encola y se escribe en segundo plano (ver models/cola_alertas.py).
+    """
+    return cola_alertas.encolar(descripcion, nivel, usuario_id, visitante_id)
@@ -1,7 +1,7 @@
 import psycopg2.extras
 from flask import render_template, request, redirect, url_for, session, flash
 from models.database import Database
-from auth.auth import registrar_intento_login, esta_bloqueado, resetear_intentos_login
+from auth.auth import registrar_intento_login, esta_bloqueado, resetear_intentos_login, guardar_permisos_en_sesion
 import hashlib
 
 def login():
@@ -42,6 +42,7 @@ def login():
                 session['usuario_nombre'] = usuario['nombre']
                 session['usuario_rol_id'] = usuario['rol_id']
                 session['usuario_rol'] = usuario['rol_nombre']
+                guardar_permisos_en_sesion(usuario['id'])
                 if recordar:
                     session.permanent = True
                 # Registrar login exitoso
@@ -1,11 +1,18 @@
-from flask import render_template, request, redirect, url_for, session, flash, send_file
+from flask import render_template, request, redirect, url_for, session, flash, jsonify, send_file
 from models.database import Database
 from auth.auth import login_required, permiso_requerido
+from utils.etag import condicional
 from auth.permissions import VER_REPORTES, GENERAR_REPORTES, EXPORTAR_REPORTES
-import csv
-import io
 from datetime import datetime, timedelta
 from utils.pdf_utils import generar_pdf_reporte
+from utils.flujo import filas_en_flujo, csv_en_flujo, archivo_en_flujo
+from config import (EXPORTAR_CSV_GZIP, PDF_SPOOL_MAX_MEMORIA, REPORTES_EN_SEGUNDO_PLANO,
+                    REPORTES_MAX_DIAS, REPORTE_DETALLE_MAX, REPORTE_UNICOS_MAX_DIAS)
+import os
+import tempfile
+from models import reportes, trabajos_reporte
+from models.filtros import Filtros
+from models.reportes import filtro_periodo
 
 @login_required
 @permiso_requerido(GENERAR_REPORTES)
@@ -26,10 +33,10 @@ def generar_reporte():
                     flash('La fecha fin no puede ser anterior a la fecha inicio', 'danger')
                     return redirect(url_for('generar_reporte'))
                 
-                # Validar que el rango no sea mayor a 31 días
+                # Validar que el rango no sea mayor a REPORTES_MAX_DIAS
                 dias_diferencia = (fecha_fin_dt - fecha_inicio_dt).days
-                if dias_diferencia > 31:
-                    flash('El rango de fechas no puede ser mayor a 31 días', 'danger')
+                if dias_diferencia > REPORTES_MAX_DIAS:
+                    flash(f'El rango de fechas no puede ser mayor a {REPORTES_MAX_DIAS} días', 'danger')
                     return redirect(url_for('generar_reporte'))
         except ValueError:
             flash('Formato de fecha inválido', 'danger')
@@ -56,7 +63,16 @@ def generar_reporte():
     
     return render_template('reportes/generar.html', 
                          hoy=hoy, 
-                         primer_dia_mes=primer_dia_mes)
+                         primer_dia_mes=primer_dia_mes,
+                         max_dias=REPORTES_MAX_DIAS)
+
+def _encolar_exportacion(formato, tipo, fecha_inicio, fecha_fin):
+    """Dejar la exportación al trabajador de reportes y llevar a la página del trabajo"""
+    trabajo_id = trabajos_reporte.encolar(tipo, formato, fecha_inicio, fecha_fin, session['usuario_id'])
+    if trabajo_id is None:
+        flash('Error al programar la exportación del reporte', 'danger')
+        return redirect(url_for('generar_reporte'))
+    return redirect(url_for('ver_trabajo_reporte', trabajo_id=trabajo_id))
 
 @login_required
 @permiso_requerido(VER_REPORTES)
@@ -80,64 +96,44 @@ def ver_reporte():
     try:
         cursor = conn.cursor(dictionary=True)
         
-        if tipo == 'diario':
-            # Reporte diario
-            cursor.execute("""
-                SELECT 
-                    a.*, 
-                    v.nombre as visitante, 
-                    u.nombre as guardia,
-                    v.empresa as empresa_visitante
-                FROM accesos a 
-                LEFT JOIN visitantes v ON a.visitante_id = v.id 
-                LEFT JOIN usuarios u ON a.usuario_id = u.id 
-                WHERE DATE(a.fecha_hora) = %s
-                ORDER BY a.fecha_hora DESC
-            """, (fecha_inicio,))
-        else:
-            # Reporte mensual
-            cursor.execute("""
-                SELECT 
-                    a.*, 
-                    v.nombre as visitante, 
-                    u.nombre as guardia,
-                    v.empresa as empresa_visitante
-                FROM accesos a 
-                LEFT JOIN visitantes v ON a.visitante_id = v.id 
-                LEFT JOIN usuarios u ON a.usuario_id = u.id 
-                WHERE DATE(a.fecha_hora) BETWEEN %s AND %s
-                ORDER BY a.fecha_hora DESC
-            """, (fecha_inicio, fecha_fin))
+        # Detalle: los REPORTE_DETALLE_MAX accesos más recientes del periodo
+        filtros = filtro_periodo('a.fecha_hora', tipo, fecha_inicio, fecha_fin)
+        cursor.execute(f"""
+            SELECT 
+                a.*, 
+                v.nombre as visitante, 
+                u.nombre as guardia,
+                v.empresa as empresa_visitante
+            FROM accesos a 
+            LEFT JOIN visitantes v ON a.visitante_id = v.id 
+            LEFT JOIN usuarios u ON a.usuario_id = u.id 
+            {filtros.where()}
+            ORDER BY a.fecha_hora DESC
+            LIMIT %s
+        """, filtros.params + [REPORTE_DETALLE_MAX])
         
         accesos = cursor.fetchall()
         
-        # Estadísticas detalladas
-        if tipo == 'diario':
-            cursor.execute("""
-                SELECT 
-                    COUNT(*) as total_accesos,
-                    SUM(CASE WHEN autorizado = 1 THEN 1 ELSE 0 END) as accesos_autorizados,
-                    SUM(CASE WHEN autorizado = 0 THEN 1 ELSE 0 END) as accesos_denegados,
-                    COUNT(DISTINCT visitante_id) as visitantes_unicos,
-                    SUM(CASE WHEN tipo = 'entrada' THEN 1 ELSE 0 END) as total_entradas,
-                    SUM(CASE WHEN tipo = 'salida' THEN 1 ELSE 0 END) as total_salidas
-                FROM accesos 
-                WHERE DATE(fecha_hora) = %s
-            """, (fecha_inicio,))
-        else:
-            cursor.execute("""
-                SELECT 
-                    COUNT(*) as total_accesos,
-                    SUM(CASE WHEN autorizado = 1 THEN 1 ELSE 0 END) as accesos_autorizados,
-                    SUM(CASE WHEN autorizado = 0 THEN 1 ELSE 0 END) as accesos_denegados,
-                    COUNT(DISTINCT visitante_id) as visitantes_unicos,
-                    SUM(CASE WHEN tipo = 'entrada' THEN 1 ELSE 0 END) as total_entradas,
-                    SUM(CASE WHEN tipo = 'salida' THEN 1 ELSE 0 END) as total_salidas
+        # Estadísticas detalladas desde el resumen por hora
+        estadisticas = dict(reportes.resumen_periodo(cursor, tipo, fecha_inicio, fecha_fin))
+        
+        # Visitantes únicos no se puede sumar entre horas ni días: sale de
+        # accesos, y solo en periodos cortos (en los largos se muestra "—")
+        desde, hasta = reportes.dias_periodo(tipo, fecha_inicio, fecha_fin)
+        estadisticas['visitantes_unicos'] = None
+        if (hasta - desde).days < REPORTE_UNICOS_MAX_DIAS:
+            filtros = filtro_periodo('fecha_hora', tipo, fecha_inicio, fecha_fin)
+            cursor.execute(f"""
+                SELECT COUNT(DISTINCT visitante_id) as visitantes_unicos
                 FROM accesos 
-                WHERE DATE(fecha_hora) BETWEEN %s AND %s
-            """, (fecha_inicio, fecha_fin))
+                {filtros.where()}
+            """, filtros.params)
+            estadisticas['visitantes_unicos'] = cursor.fetchone()['visitantes_unicos']
         
-        estadisticas = cursor.fetchone()
+        # Desglose por día (solo para el reporte mensual)
+        accesos_dia = []
+        if tipo == 'mensual':
+            accesos_dia = reportes.accesos_por_dia(cursor, desde, hasta)
         
         cursor.close()
         conn.close()
@@ -145,9 +141,11 @@ def ver_reporte():
         return render_template('reportes/ver.html', 
                              accesos=accesos, 
                              estadisticas=estadisticas,
+                             accesos_dia=accesos_dia,
                              tipo=tipo,
                              fecha_inicio=fecha_inicio,
                              fecha_fin=fecha_fin,
+                             unicos_max_dias=REPORTE_UNICOS_MAX_DIAS,
                              now=datetime.now())
         
     except Exception as e:
@@ -168,6 +166,9 @@ def exportar_reporte_csv():
     fecha_inicio = params['fecha_inicio']
     fecha_fin = params['fecha_fin']
     
+    if REPORTES_EN_SEGUNDO_PLANO:
+        return _encolar_exportacion('csv', tipo, fecha_inicio, fecha_fin)
+    
     db = Database()
     conn = db.conectar()
     if not conn:
@@ -175,80 +176,16 @@ def exportar_reporte_csv():
         return redirect(url_for('generar_reporte'))
     
     try:
-        cursor = conn.cursor(dictionary=True)
-        
-        if tipo == 'diario':
-            cursor.execute("""
-                SELECT 
-                    a.fecha_hora,
-                    v.nombre as visitante,
-                    v.identificacion,
-                    v.empresa,
-                    a.tipo,
-                    CASE WHEN a.autorizado THEN 'Sí' ELSE 'No' END as autorizado,
-                    u.nombre as guardia 
-                FROM accesos a 
-                LEFT JOIN visitantes v ON a.visitante_id = v.id 
-                LEFT JOIN usuarios u ON a.usuario_id = u.id 
-                WHERE DATE(a.fecha_hora) = %s
-                ORDER BY a.fecha_hora DESC
-            """, (fecha_inicio,))
-        else:
-            cursor.execute("""
-                SELECT 
-                    a.fecha_hora,
-                    v.nombre as visitante,
-                    v.identificacion,
-                    v.empresa,
-                    a.tipo,
-                    CASE WHEN a.autorizado THEN 'Sí' ELSE 'No' END as autorizado,
-                    u.nombre as guardia 
-                FROM accesos a 
-                LEFT JOIN visitantes v ON a.visitante_id = v.id 
-                LEFT JOIN usuarios u ON a.usuario_id = u.id 
-                WHERE DATE(a.fecha_hora) BETWEEN %s AND %s
-                ORDER BY a.fecha_hora DESC
-            """, (fecha_inicio, fecha_fin))
+        # Las filas salen de un cursor del servidor y el CSV se envía por
+        # partes, sin cargar el periodo completo en memoria
+        query, query_params = reportes.consulta_csv(tipo, fecha_inicio, fecha_fin)
+        accesos = filas_en_flujo(conn, query, query_params, 'exportar_csv')
         
-        accesos = cursor.fetchall()
-        cursor.close()
-        conn.close()
-        
-        # Crear CSV en memoria
-        output = io.StringIO()
-        writer = csv.writer(output)
-        
-        # Escribir encabezados
-        writer.writerow([
-            'Fecha/Hora', 'Visitante', 'Identificación', 'Empresa', 
-            'Tipo', 'Autorizado', 'Guardia'
-        ])
-        
-        # Escribir datos
-        for acceso in accesos:
-            writer.writerow([
-                acceso['fecha_hora'].strftime('%Y-%m-%d %H:%M'),
-                acceso['visitante'] or 'N/A',
-                acceso['identificacion'] or 'N/A',
-                acceso['empresa'] or 'N/A',
-                acceso['tipo'].capitalize(),
-                acceso['autorizado'],
-                acceso['guardia'] or 'Sistema'
-            ])
-        
-        output.seek(0)
-        
-        # Crear nombre de archivo
-        nombre_archivo = f"reporte_accesos_{tipo}_{fecha_inicio}"
-        if tipo == 'mensual':
-            nombre_archivo += f"_{fecha_fin}"
-        nombre_archivo += ".csv"
-        
-        return send_file(
-            io.BytesIO(output.getvalue().encode('utf-8-sig')),
-            download_name=nombre_archivo,
-            as_attachment=True,
-            mimetype='text/csv'
+        return csv_en_flujo(
+            (reportes.fila_csv(acceso) for acceso in accesos),
+            reportes.ENCABEZADO_CSV,
+            reportes.nombre_archivo(tipo, fecha_inicio, fecha_fin, 'csv'),
+            comprimir=EXPORTAR_CSV_GZIP and request.accept_encodings['gzip'] > 0
         )
         
     except Exception as e:
@@ -269,6 +206,9 @@ def exportar_reporte_pdf():
     fecha_inicio = params['fecha_inicio']
     fecha_fin = params['fecha_fin']
     
+    if REPORTES_EN_SEGUNDO_PLANO:
+        return _encolar_exportacion('pdf', tipo, fecha_inicio, fecha_fin)
+    
     db = Database()
     conn = db.conectar()
     if not conn:
@@ -277,70 +217,89 @@ def exportar_reporte_pdf():
     
     try:
         cursor = conn.cursor(dictionary=True)
-        
-        if tipo == 'diario':
-            cursor.execute("""
-                SELECT 
-                    a.fecha_hora,
-                    v.nombre as visitante,
-                    a.tipo,
-                    a.autorizado,
-                    u.nombre as guardia 
-                FROM accesos a 
-                LEFT JOIN visitantes v ON a.visitante_id = v.id 
-                LEFT JOIN usuarios u ON a.usuario_id = u.id 
-                WHERE DATE(a.fecha_hora) = %s
-                ORDER BY a.fecha_hora DESC
-            """, (fecha_inicio,))
-        else:
-            cursor.execute("""
-                SELECT 
-                    a.fecha_hora,
-                    v.nombre as visitante,
-                    a.tipo,
-                    a.autorizado,
-                    u.nombre as guardia 
-                FROM accesos a 
-                LEFT JOIN visitantes v ON a.visitante_id = v.id 
-                LEFT JOIN usuarios u ON a.usuario_id = u.id 
-                WHERE DATE(a.fecha_hora) BETWEEN %s AND %s
-                ORDER BY a.fecha_hora DESC
-            """, (fecha_inicio, fecha_fin))
-        
-        accesos = cursor.fetchall()
+        total = reportes.contar_accesos(cursor, tipo, fecha_inicio, fecha_fin)
         cursor.close()
-        conn.close()
         
-        # Generar PDF
-        titulo = f"Reporte de Accesos - {tipo.capitalize()}"
-        pdf_content = generar_pdf_reporte(
-            accesos, 
-            tipo, 
-            fecha_inicio, 
-            fecha_fin, 
-            titulo
-        )
+        # Las filas se leen por lotes desde un cursor del servidor mientras se
+        # dibujan las páginas
+        query, query_params = reportes.consulta_pdf(tipo, fecha_inicio, fecha_fin)
+        accesos = filas_en_flujo(conn, query, query_params, 'exportar_pdf')
         
-        # Crear nombre de archivo
-        nombre_archivo = f"reporte_accesos_{tipo}_{fecha_inicio}"
-        if tipo == 'mensual':
-            nombre_archivo += f"_{fecha_fin}"
-        nombre_archivo += ".pdf"
+        # Generar PDF en un archivo temporal (en memoria hasta
+        # PDF_SPOOL_MAX_MEMORIA, luego en disco)
+        titulo = f"Reporte de Accesos - {tipo.capitalize()}"
+        archivo = tempfile.SpooledTemporaryFile(max_size=PDF_SPOOL_MAX_MEMORIA)
+        try:
+            generar_pdf_reporte(
+                accesos, 
+                tipo, 
+                fecha_inicio, 
+                fecha_fin, 
+                titulo,
+                total=total,
+                destino=archivo
+            )
+        except Exception:
+            archivo.close()
+            raise
+        finally:
+            accesos.close()
         
-        return send_file(
-            io.BytesIO(pdf_content),
-            download_name=nombre_archivo,
-            as_attachment=True,
-            mimetype='application/pdf'
-        )
+        return archivo_en_flujo(archivo, reportes.nombre_archivo(tipo, fecha_inicio, fecha_fin, 'pdf'),
+                                'application/pdf')
         
     except Exception as e:
         print(f"Error al exportar PDF: {e}")
         flash('Error al exportar el reporte PDF', 'danger')
         return redirect(url_for('generar_reporte'))
 
+@login_required
+@permiso_requerido(EXPORTAR_REPORTES)
+def ver_trabajo_reporte(trabajo_id):
+    """Página de espera de una exportación en segundo plano"""
+    trabajo = trabajos_reporte.obtener(trabajo_id)
+    if not trabajo:
+        flash('El reporte solicitado no existe o ya venció', 'warning')
+        return redirect(url_for('generar_reporte'))
+    return render_template('reportes/trabajo.html', trabajo=trabajo)
+
+@login_required
+@permiso_requerido(EXPORTAR_REPORTES)
+def estado_trabajo_reporte(trabajo_id):
+    """API: estado y avance de una exportación en segundo plano"""
+    trabajo = trabajos_reporte.obtener(trabajo_id)
+    if not trabajo:
+        return jsonify({'error': 'Trabajo no encontrado'}), 404
+    return jsonify({
+        'id': trabajo['id'],
+        'estado': trabajo['estado'],
+        'progreso': trabajo['progreso'],
+        'total_filas': trabajo['total_filas'],
+        'error': trabajo['error'],
+        'descarga': url_for('descargar_trabajo_reporte', trabajo_id=trabajo['id'])
+                    if trabajo['estado'] == 'terminado' else None
+    })
+
+@login_required
+@permiso_requerido(EXPORTAR_REPORTES)
+def descargar_trabajo_reporte(trabajo_id):
+    """Descargar el archivo de una exportación terminada"""
+    trabajo = trabajos_reporte.obtener(trabajo_id)
+    if not trabajo or trabajo['estado'] != 'terminado':
+        flash('El reporte todavía no está listo para descargar', 'warning')
+        return redirect(url_for('ver_trabajo_reporte', trabajo_id=trabajo_id))
+    ruta = os.path.abspath(trabajos_reporte.ruta(trabajo['archivo']))
+    if not os.path.exists(ruta):
+        flash('El archivo del reporte ya no está disponible; genérelo de nuevo', 'warning')
+        return redirect(url_for('generar_reporte'))
+    mimetype = 'application/pdf' if trabajo['formato'] == 'pdf' else 'text/csv'
+    return send_file(ruta, mimetype=mimetype, as_attachment=True,
+                     download_name=reportes.nombre_archivo(trabajo['tipo'], trabajo['fecha_inicio'],
+                                                           trabajo['fecha_fin'], trabajo['formato']))
+
 @login_required
 @permiso_requerido(VER_REPORTES)
+@condicional('visitantes', 'accesos', 'alertas', tablas=('accesos', 'alertas'), diario=True)
 def reporte_estadisticas():
     """Reporte de estadísticas generales"""
     db = Database()
@@ -352,43 +311,62 @@ def reporte_estadisticas():
     try:
         cursor = conn.cursor(dictionary=True)
         
-        # Estadísticas generales
-        cursor.execute("""
+        # Estadísticas generales (los accesos, del resumen por hora)
+        alertas_hoy = Filtros().hoy('fecha')
+        cursor.execute(f"""
             SELECT 
                 (SELECT COUNT(*) FROM visitantes WHERE estado = 'activo') as visitantes_activos,
                 (SELECT COUNT(*) FROM usuarios WHERE estado = 'activo') as usuarios_activos,
-                (SELECT COUNT(*) FROM accesos WHERE DATE(fecha_hora) = CURRENT_DATE) as accesos_hoy,
-                (SELECT COUNT(*) FROM alertas WHERE DATE(fecha) = CURRENT_DATE) as alertas_hoy,
+                (SELECT COALESCE(SUM(total), 0) FROM accesos_por_hora
+                 WHERE hora >= CURRENT_DATE AND hora < CURRENT_DATE + 1) as accesos_hoy,
+                (SELECT COUNT(*) FROM alertas {alertas_hoy.where()}) as alertas_hoy,
                 (SELECT COUNT(*) FROM credenciales WHERE estado = 'activa') as credenciales_activas
         """)
         estadisticas = cursor.fetchone()
         
-        # Accesos por día (últimos 7 días)
+        # Accesos por día (últimos 7 días), agrupando el resumen por hora
         cursor.execute("""
             SELECT 
-                DATE(fecha_hora) as fecha,
-                COUNT(*) as total,
-                SUM(CASE WHEN tipo = 'entrada' THEN 1 ELSE 0 END) as entradas,
-                SUM(CASE WHEN tipo = 'salida' THEN 1 ELSE 0 END) as salidas,
-                SUM(CASE WHEN autorizado = 0 THEN 1 ELSE 0 END) as denegados
-            FROM accesos 
-            WHERE fecha_hora >= CURRENT_DATE - INTERVAL '7 days'
-            GROUP BY DATE(fecha_hora)
-            ORDER BY fecha DESC
+                hora::DATE as fecha,
+                SUM(total) as total,
+                COALESCE(SUM(total) FILTER (WHERE tipo = 'entrada'), 0) as entradas,
+                COALESCE(SUM(total) FILTER (WHERE tipo = 'salida'), 0) as salidas,
+                COALESCE(SUM(total) FILTER (WHERE NOT autorizado), 0) as denegados
+            FROM accesos_por_hora 
+            WHERE hora >= CURRENT_DATE - 7
+            GROUP BY 1
+            HAVING SUM(total) <> 0
+            ORDER BY 1 DESC
         """)
         accesos_7_dias = cursor.fetchall()
         
+        # Accesos por mes (últimos 12 meses, incluido el actual)
+        cursor.execute("""
+            SELECT 
+                DATE_TRUNC('month', hora)::DATE as mes,
+                SUM(total) as total,
+                COALESCE(SUM(total) FILTER (WHERE tipo = 'entrada'), 0) as entradas,
+                COALESCE(SUM(total) FILTER (WHERE tipo = 'salida'), 0) as salidas,
+                COALESCE(SUM(total) FILTER (WHERE NOT autorizado), 0) as denegados
+            FROM accesos_por_hora 
+            WHERE hora >= DATE_TRUNC('month', CURRENT_DATE) - INTERVAL '11 months'
+            GROUP BY 1
+            HAVING SUM(total) <> 0
+            ORDER BY 1 DESC
+        """)
+        accesos_12_meses = cursor.fetchall()
+        
         # Visitantes más frecuentes
         cursor.execute("""
             SELECT 
                 v.nombre,
                 v.empresa,
-                COUNT(*) as total_visitas
-            FROM accesos a
-            JOIN visitantes v ON a.visitante_id = v.id
-            WHERE a.tipo = 'entrada'
-            GROUP BY v.id, v.nombre, v.empresa
-            ORDER BY total_visitas DESC
+                vv.total_visitas,
+                vv.ultima_visita
+            FROM visitas_visitante vv
+            JOIN visitantes v ON vv.visitante_id = v.id
+            WHERE vv.total_visitas > 0
+            ORDER BY vv.total_visitas DESC
             LIMIT 10
         """)
         visitantes_frecuentes = cursor.fetchall()
@@ -399,6 +377,7 @@ def reporte_estadisticas():
         return render_template('reportes/estadisticas.html',
                              estadisticas=estadisticas,
                              accesos_7_dias=accesos_7_dias,
+                             accesos_12_meses=accesos_12_meses,
                              visitantes_frecuentes=visitantes_frecuentes)
         
     except Exception as e:
@@ -1,10 +1,13 @@
 from flask import render_template, request, redirect, url_for, session, flash, jsonify
 from models.database import Database
+from models import cache_permisos
 from auth.auth import login_required, permiso_requerido
+from utils.etag import condicional
 from auth.permissions import GESTIONAR_ROLES, GESTIONAR_PERMISOS
 
 @login_required
 @permiso_requerido(GESTIONAR_ROLES)
+@condicional('roles', 'usuarios')
 def listar_roles():
     """Listar todos los roles del sistema"""
     db = Database()
@@ -16,16 +19,27 @@ def listar_roles():
     try:
         cursor = conn.cursor(dictionary=True)
         
-        # Obtener roles con conteo de usuarios
+        # Roles con usuarios activos y permisos asignados en una sola consulta.
+        # Usuarios y permisos se agregan por separado antes de unirlos, para
+        # que un conteo no multiplique al otro
         cursor.execute("""
             SELECT 
                 r.*, 
-                COUNT(u.id) as total_usuarios,
-                COUNT(rp.permiso_id) as total_permisos
+                COALESCE(u.total, 0) as total_usuarios,
+                COALESCE(cardinality(rp.permisos), 0) as total_permisos,
+                COALESCE(rp.permisos, '{}') as permisos_asignados
             FROM roles r
-            LEFT JOIN usuarios u ON r.id = u.rol_id AND u.estado = 'activo'
-            LEFT JOIN rol_permisos rp ON r.id = rp.rol_id
-            GROUP BY r.id
+            LEFT JOIN (
+                SELECT rol_id, COUNT(*) as total
+                FROM usuarios
+                WHERE estado = 'activo'
+                GROUP BY rol_id
+            ) u ON u.rol_id = r.id
+            LEFT JOIN (
+                SELECT rol_id, array_agg(permiso_id ORDER BY permiso_id) as permisos
+                FROM rol_permisos
+                GROUP BY rol_id
+            ) rp ON rp.rol_id = r.id
             ORDER BY r.nombre
         """)
         
@@ -33,23 +47,12 @@ def listar_roles():
         
         # Obtener todos los permisos disponibles
         cursor.execute("""
-            SELECT p.*, m.nombre as modulo_nombre
+            SELECT p.*, p.modulo as modulo_nombre
             FROM permisos p
             ORDER BY p.modulo, p.nombre
         """)
         permisos = cursor.fetchall()
         
-        # Para cada rol, obtener sus permisos asignados
-        for rol in roles:
-            cursor.execute("""
-                SELECT p.id, p.nombre, p.modulo, p.descripcion
-                FROM permisos p
-                JOIN rol_permisos rp ON p.id = rp.permiso_id
-                WHERE rp.rol_id = %s
-                ORDER BY p.modulo, p.nombre
-            """, (rol['id'],))
-            rol['permisos_asignados'] = [p['id'] for p in cursor.fetchall()]
-        
         cursor.close()
         conn.close()
         
@@ -84,9 +87,10 @@ def crear_rol():
             cursor.execute("""
                 INSERT INTO roles (nombre, descripcion)
                 VALUES (%s, %s)
+                RETURNING id
             """, (nombre, descripcion))
             
-            rol_id = cursor.lastrowid
+            rol_id = cursor.fetchone()[0]
             
             # Asignar permisos seleccionados
             for permiso_id in permisos:
@@ -95,6 +99,7 @@ def crear_rol():
                     VALUES (%s, %s)
                 """, (rol_id, permiso_id))
             
+            cache_permisos.invalidar(cursor, f'rol:{rol_id}')
             conn.commit()
             flash('Rol creado exitosamente', 'success')
             
@@ -161,6 +166,7 @@ def editar_rol(id):
                         VALUES (%s, %s)
                     """, (id, permiso_id))
                 
+                cache_permisos.invalidar(cursor, f'rol:{id}')
                 conn.commit()
                 flash('Rol actualizado exitosamente', 'success')
                 
@@ -237,6 +243,7 @@ def eliminar_rol(id):
         # Eliminar el rol
         cursor.execute("DELETE FROM roles WHERE id = %s", (id,))
         
+        cache_permisos.invalidar(cursor, f'rol:{id}')
         conn.commit()
         flash('Rol eliminado exitosamente', 'success')
         
@@ -0,0 +1,80 @@
+from flask import jsonify, request
+from models.database import Database, obtener_pool
+from models import indice_credenciales, cola_alertas, dispositivos
+from auth.auth import login_required, permiso_requerido
+from auth.permissions import CONFIGURAR_SISTEMA
+
+@login_required
+@permiso_requerido(CONFIGURAR_SISTEMA)
+def estado_pool():
+    """API con las estadísticas del pool de conexiones de este worker"""
+    return jsonify(obtener_pool().estadisticas())
+
+@login_required
+@permiso_requerido(CONFIGURAR_SISTEMA)
+def estado_indice_credenciales():
+    """API con el estado del índice de credenciales de este worker"""
+    return jsonify(indice_credenciales.estadisticas())
+
+@login_required
+@permiso_requerido(CONFIGURAR_SISTEMA)
+def estado_cola_alertas():
+    """API con el estado de la cola de alertas de este worker"""
+    return jsonify(cola_alertas.estadisticas())
+
+@login_required
+@permiso_requerido(CONFIGURAR_SISTEMA)
+def crear_dispositivo():
+    """API para registrar un kiosco de escaneo. El token solo se devuelve aquí"""
+    datos = request.get_json(silent=True) or request.form
+    nombre = (datos.get('nombre') or '').strip()
+    usuario_id = datos.get('usuario_id')
+    if not nombre or not str(usuario_id or '').isdigit():
+        return jsonify({'error': 'Se requieren nombre y usuario_id'}), 400
+
+    dispositivo_id, token = dispositivos.crear(nombre, int(usuario_id))
+    if dispositivo_id is None:
+        return jsonify({'error': 'No se pudo registrar el dispositivo'}), 500
+    return jsonify({'id': dispositivo_id, 'nombre': nombre, 'token': token}), 201
+
+@login_required
+@permiso_requerido(CONFIGURAR_SISTEMA)
+def reconciliar_visitas():
+    """API para recalcular los contadores de visitas desde el historial de accesos"""
+    conn = Database().conectar()
+    if not conn:
+        return jsonify({'error': 'Error de conexión a la base de datos'}), 503
+    try:
+        cursor = conn.cursor()
+        cursor.execute("SELECT reconstruir_visitas()")
+        total = cursor.fetchone()[0]
+        conn.commit()
+        cursor.close()
+        return jsonify({'visitantes': total})
+    except Exception as e:
+        print(f"Error al reconciliar visitas: {e}")
+        conn.rollback()
+        return jsonify({'error': 'No se pudieron recalcular las visitas'}), 500
+    finally:
+        conn.close()
+
+@login_required
+@permiso_requerido(CONFIGURAR_SISTEMA)
+def reconstruir_resumen_accesos():
+    """API para recalcular el resumen de accesos por hora desde el historial"""
+    conn = Database().conectar()
+    if not conn:
+        return jsonify({'error': 'Error de conexión a la base de datos'}), 503
+    try:
+        cursor = conn.cursor()
+        cursor.execute("SELECT reconstruir_resumen_accesos()")
+        total = cursor.fetchone()[0]
+        conn.commit()
+        cursor.close()
+        return jsonify({'horas': total})
+    except Exception as e:
+        print(f"Error al reconstruir el resumen de accesos: {e}")
+        conn.rollback()
+        return jsonify({'error': 'No se pudo recalcular el resumen de accesos'}), 500
+    finally:
+        conn.close()
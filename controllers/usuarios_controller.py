@@ -1,10 +1,13 @@
 from flask import render_template, request, redirect, url_for, session, flash
 from models.database import Database
+from models import cache_permisos
 from auth.auth import login_required, permiso_requerido
+from utils.etag import condicional
 from auth.permissions import *
 
 @login_required
 @permiso_requerido(VER_USUARIOS)
+@condicional('usuarios', 'roles')
 def listar_usuarios():
     """Listar todos los usuarios del sistema"""
     db = Database()
@@ -139,6 +142,7 @@ def editar_usuario(id):
                         WHERE id=%s
                     """, (nombre, correo, rol_id, estado, id))
                 
+                cache_permisos.invalidar(cursor, f'usuario:{id}')
                 conn.commit()
                 flash('Usuario actualizado exitosamente', 'success')
                 return redirect(url_for('listar_usuarios'))
@@ -190,6 +194,7 @@ def cambiar_estado_usuario(id):
         nuevo_estado = 'inactivo' if usuario['estado'] == 'activo' else 'activo'
         
         cursor.execute("UPDATE usuarios SET estado = %s WHERE id = %s", (nuevo_estado, id))
+        cache_permisos.invalidar(cursor, f'usuario:{id}')
         conn.commit()
         
         accion = "desactivado" if nuevo_estado == 'inactivo' else "activado"
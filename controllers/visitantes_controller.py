@@ -1,12 +1,15 @@
-from flask import render_template, request, redirect, url_for, session, flash
+from flask import render_template, request, redirect, url_for, session, flash, jsonify
 from models.database import Database
+from models import busqueda
 from auth.auth import login_required, permiso_requerido
+from utils.etag import condicional
 from auth.permissions import *
 import uuid
 from datetime import datetime, timedelta
 
 @login_required
 @permiso_requerido(VER_VISITANTES)
+@condicional('visitantes', 'accesos', tablas=('accesos',))
 def listar_visitantes():
     """Listar todos los visitantes"""
     db = Database()
@@ -27,9 +30,11 @@ def listar_visitantes():
             SELECT v.*, 
                    c.codigo,
                    c.estado as credencial_estado,
-                   (SELECT COUNT(*) FROM accesos WHERE visitante_id = v.id AND tipo = 'entrada') as total_visitas
+                   COALESCE(vv.total_visitas, 0) as total_visitas,
+                   vv.ultima_visita
             FROM visitantes v
             LEFT JOIN credenciales c ON v.id = c.visitante_id AND c.estado = 'activa'
+            LEFT JOIN visitas_visitante vv ON vv.visitante_id = v.id
             WHERE 1=1
         """
         params = []
@@ -39,11 +44,13 @@ def listar_visitantes():
             query += " AND v.estado = %s"
             params.append(estado)
         
-        if buscar:
-            query += " AND (v.nombre LIKE %s OR v.identificacion LIKE %s OR v.empresa LIKE %s)"
-            params.extend([f'%{buscar}%', f'%{buscar}%', f'%{buscar}%'])
-        
-        query += " ORDER BY v.fecha_registro DESC"
+        if buscar.strip():
+            # Sin distinguir mayúsculas ni acentos, ordenado por relevancia
+            condicion, params_busqueda, orden, params_orden = busqueda.condicion_visitantes(cursor, buscar)
+            query += f" AND {condicion} ORDER BY {orden}"
+            params.extend(params_busqueda + params_orden)
+        else:
+            query += " ORDER BY v.fecha_registro DESC"
         
         cursor.execute(query, params)
         visitantes = cursor.fetchall()
@@ -61,6 +68,39 @@ def listar_visitantes():
         flash('Error al cargar la lista de visitantes', 'danger')
         return render_template('visitantes/listar.html', visitantes=[])
 
+@login_required
+@permiso_requerido(VER_VISITANTES)
+def buscar_visitantes_api():
+    """API de autocompletado: visitantes que coinciden con q, los más relevantes primero"""
+    texto = request.args.get('q', '').strip()
+    limite = min(max(request.args.get('limite', 10, type=int) or 10, 1), 20)
+    if len(texto) < 2:
+        return jsonify({'visitantes': []})
+
+    db = Database()
+    conn = db.conectar()
+    if not conn:
+        return jsonify({'error': 'Error de conexión a la base de datos'}), 503
+
+    try:
+        cursor = conn.cursor(dictionary=True)
+        condicion, params, orden, params_orden = busqueda.condicion_visitantes(cursor, texto)
+        cursor.execute(f"""
+            SELECT v.id, v.nombre, v.identificacion, v.empresa, v.estado
+            FROM visitantes v
+            WHERE {condicion}
+            ORDER BY {orden}
+            LIMIT %s
+        """, params + params_orden + [limite])
+        visitantes = cursor.fetchall()
+        cursor.close()
+        return jsonify({'visitantes': visitantes})
+    except Exception as e:
+        print(f"Error al buscar visitantes: {e}")
+        return jsonify({'error': 'Error al buscar visitantes'}), 500
+    finally:
+        conn.close()
+
 @login_required
 @permiso_requerido(CREAR_VISITANTES)
 def agregar_visitante():
@@ -7,11 +7,59 @@ Notas:
 - Algunos servicios no permiten crear la base de datos desde el usuario proporcionado; en tal caso importa el SQL directamente desde el panel de la base de datos o solicita permisos.
 """
 import os
+import re
 import psycopg2
 from psycopg2 import sql
 from config import DATABASE_URL, get_db_config
 
 
+def dividir_sentencias(sql_script):
+    """Separar un script por ';' respetando comentarios '--', cadenas '...' y
+    cuerpos $$...$$ de funciones plpgsql (que contienen ';' propios)."""
+    sentencias = []
+    actual = []
+    i = 0
+    n = len(sql_script)
+    while i < n:
+        c = sql_script[i]
+        if c == '-' and sql_script.startswith('--', i):
+            fin = sql_script.find('\n', i)
+            fin = n if fin == -1 else fin
+            actual.append(sql_script[i:fin])
+            i = fin
+        elif c == "'":
+            fin = i + 1
+            while fin < n:
+                if sql_script[fin] == "'" and sql_script.startswith("''", fin):
+                    fin += 2
+                    continue
+                if sql_script[fin] == "'":
+                    break
+                fin += 1
+            actual.append(sql_script[i:fin + 1])
+            i = fin + 1
+        elif c == '$':
+            match = re.match(r'\$[A-Za-z_]*\$', sql_script[i:])
+            if match:
+                etiqueta = match.group(0)
+                fin = sql_script.find(etiqueta, i + len(etiqueta))
+                fin = n if fin == -1 else fin + len(etiqueta)
+                actual.append(sql_script[i:fin])
+                i = fin
+            else:
+                actual.append(c)
+                i += 1
+        elif c == ';':
+            sentencias.append(''.join(actual))
+            actual = []
+            i += 1
+        else:
+            actual.append(c)
+            i += 1
+    sentencias.append(''.join(actual))
+    return [s.strip() for s in sentencias if s.strip()]
+
+
 def ejecutar_sql(conexion, sql_file):
     """Ejecutar archivo SQL (separa por ';' y ejecuta sentencias no vacías)."""
     try:
@@ -21,7 +69,7 @@ def ejecutar_sql(conexion, sql_file):
             sql_script = file.read()
 
         # Ejecutar cada sentencia por separado
-        statements = [s.strip() for s in sql_script.split(';') if s.strip()]
+        statements = dividir_sentencias(sql_script)
         for statement in statements:
             try:
                 cursor.execute(statement)
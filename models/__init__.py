@@ -1,4 +1,4 @@
 # Este archivo hace que la carpeta models sea un paquete Python
-from .database import Database, obtener_permisos_usuario, tiene_permiso, obtener_usuario_actual
+from .database import Database, obtener_permisos_usuario, tiene_permiso, obtener_usuario_actual, obtener_pool
 
-__all__ = ['Database', 'obtener_permisos_usuario', 'tiene_permiso', 'obtener_usuario_actual']
\ No newline at end of file
+__all__ = ['Database', 'obtener_permisos_usuario', 'tiene_permiso', 'obtener_usuario_actual', 'obtener_pool']
\ No newline at end of file
@@ -0,0 +1,68 @@
+"""
+Búsqueda de visitantes sin distinguir mayúsculas ni acentos.
+
+Compara normalizar_busqueda(texto) contra busqueda_visitante(nombre,
+identificacion, empresa), la misma expresión del índice de trigramas
+idx_visitantes_busqueda_trgm, así que un LIKE '%texto%' usa el índice. Con
+pg_trgm los resultados se ordenan por relevancia (word_similarity, calificada
+con el esquema de la extensión como en el índice, por si no está en el
+search_path); si la extensión no está instalada se usa la posición de la
+coincidencia.
+"""
+import os
+
+from psycopg2.extensions import quote_ident
+
+_EXPRESION = "busqueda_visitante({a}.nombre, {a}.identificacion, {a}.empresa)"
+
+_trigramas = {}  # pid -> esquema de pg_trgm (ya citado) o None
+
+
+def esquema_trigramas(cursor):
+    """Esquema de pg_trgm listo para calificar nombres, o None si no está
+    instalada (se consulta una vez por proceso)."""
+    pid = os.getpid()
+    if pid not in _trigramas:
+        cursor.execute("""
+            SELECT n.nspname
+            FROM pg_extension e
+            JOIN pg_namespace n ON n.oid = e.extnamespace
+            WHERE e.extname = 'pg_trgm'
+        """)
+        fila = cursor.fetchone()
+        esquema = (fila['nspname'] if isinstance(fila, dict) else fila[0]) if fila else None
+        _trigramas[pid] = quote_ident(esquema, cursor) if esquema else None
+    return _trigramas[pid]
+
+
+def trigramas_disponibles(cursor):
+    """True si pg_trgm está instalada."""
+    return esquema_trigramas(cursor) is not None
+
+
+def _escapar_like(texto):
+    return texto.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+def condicion_visitantes(cursor, texto, alias='v'):
+    """Fragmentos para buscar texto en los visitantes de alias.
+
+    Devuelve (condicion, params, orden, params_orden): condicion va en el WHERE
+    y orden en el ORDER BY, de mayor a menor relevancia.
+    """
+    expresion = _EXPRESION.format(a=alias)
+    texto = texto.strip()
+    condicion = f"{expresion} LIKE '%%' || normalizar_busqueda(%s) || '%%'"
+    params = [_escapar_like(texto)]
+
+    # Coincidencia exacta de identificación primero
+    orden = f"(normalizar_busqueda({alias}.identificacion) = normalizar_busqueda(%s)) DESC, "
+    params_orden = [texto]
+    esquema = esquema_trigramas(cursor)
+    if esquema:
+        orden += f"{esquema}.word_similarity(normalizar_busqueda(%s), {expresion}) DESC, "
+    else:
+        orden += f"strpos({expresion}, normalizar_busqueda(%s)), "
+    params_orden.append(texto)
+    orden += f"{alias}.nombre"
+    return condicion, params, orden, params_orden
@@ -0,0 +1,173 @@
+"""
+Caché en memoria de permisos por rol.
+
+Los permisos dependen solo de usuarios.rol_id y de rol_permisos, que cambian
+muy poco. Se guardan como frozenset por rol (pertenencia O(1)) junto con el
+rol de cada usuario activo. Las entradas caducan tras un TTL y se invalidan
+explícitamente en todos los workers con NOTIFY sobre el canal CANAL.
+
+Cada invalidación incrementa una generación: una carga que empezó antes de
+la invalidación no se guarda (traería los datos previos al cambio).
+"""
+import threading
+import time
+
+import config as app_config
+from models import notificaciones, versiones
+
+CANAL = 'permisos_cambio'
+USUARIOS_MAX = 10000  # usuarios con rol en caché por worker
+
+_lock = threading.Lock()
+_roles = {}  # rol_id -> frozenset de 'modulo.nombre'
+_roles_expira = 0.0
+_usuarios = {}  # usuario_id -> (rol_id o None si no está activo, expira)
+_generacion = 0  # se incrementa con cada invalidación
+
+
+def _ttl():
+    return app_config.CACHE_PERMISOS_TTL
+
+
+def _conectar():
+    from models.database import Database
+    return Database().conectar()
+
+
+def _cargar_roles():
+    """Cargar los permisos de todos los roles en una consulta."""
+    conn = _conectar()
+    if not conn:
+        return None
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute("""
+                SELECT r.id,
+                       COALESCE(
+                           array_agg(p.modulo || '.' || p.nombre) FILTER (WHERE p.id IS NOT NULL),
+                           '{}'
+                       )
+                FROM roles r
+                LEFT JOIN rol_permisos rp ON rp.rol_id = r.id
+                LEFT JOIN permisos p ON rp.permiso_id = p.id
+                GROUP BY r.id
+            """)
+            return {rol_id: frozenset(permisos) for rol_id, permisos in cursor.fetchall()}
+    except Exception as e:
+        print(f"Error al cargar permisos de roles: {e}")
+        return None
+    finally:
+        conn.close()
+
+
+def _cargar_rol_usuario(usuario_id):
+    conn = _conectar()
+    if not conn:
+        return None, False
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute(
+                "SELECT rol_id FROM usuarios WHERE id = %s AND estado = 'activo'",
+                (usuario_id,)
+            )
+            fila = cursor.fetchone()
+            return (fila[0] if fila else None), True
+    except Exception as e:
+        print(f"Error al cargar rol del usuario: {e}")
+        return None, False
+    finally:
+        conn.close()
+
+
+def permisos_rol(rol_id):
+    """frozenset con los permisos del rol (vacío si no existe)."""
+    global _roles, _roles_expira
+    notificaciones.iniciar_escucha()
+    ahora = time.monotonic()
+    with _lock:
+        if ahora < _roles_expira and rol_id in _roles:
+            return _roles[rol_id]
+        generacion = _generacion
+
+    roles = _cargar_roles()
+    if roles is None:
+        # Sin base de datos: usar lo que haya aunque esté vencido
+        with _lock:
+            return _roles.get(rol_id, frozenset())
+    with _lock:
+        if generacion == _generacion:
+            _roles = roles
+            _roles_expira = time.monotonic() + _ttl()
+        return roles.get(rol_id, frozenset())
+
+
+def rol_de_usuario(usuario_id):
+    """rol_id del usuario si está activo, None en caso contrario."""
+    notificaciones.iniciar_escucha()
+    ahora = time.monotonic()
+    with _lock:
+        entrada = _usuarios.get(usuario_id)
+        if entrada and ahora < entrada[1]:
+            return entrada[0]
+        generacion = _generacion
+
+    rol_id, ok = _cargar_rol_usuario(usuario_id)
+    if ok:
+        with _lock:
+            if generacion == _generacion:
+                _guardar_usuario(usuario_id, rol_id)
+    return rol_id
+
+
+def _guardar_usuario(usuario_id, rol_id):
+    """Guardar el rol del usuario (con _lock tomado), descartando las
+    entradas vencidas si la caché llegó a USUARIOS_MAX."""
+    ahora = time.monotonic()
+    if len(_usuarios) >= USUARIOS_MAX:
+        for clave, (_, expira) in list(_usuarios.items()):
+            if expira <= ahora:
+                del _usuarios[clave]
+        if len(_usuarios) >= USUARIOS_MAX:
+            _usuarios.clear()
+    _usuarios[usuario_id] = (rol_id, ahora + _ttl())
+
+
+def permisos_usuario(usuario_id):
+    rol_id = rol_de_usuario(usuario_id)
+    if rol_id is None:
+        return frozenset()
+    return permisos_rol(rol_id)
+
+
+def invalidar_local(payload='*'):
+    """Descartar entradas de la caché de este proceso.
+
+    payload: 'rol:<id>', 'usuario:<id>' o '*' para vaciar todo.
+    """
+    global _roles_expira, _generacion
+    tipo, _, valor = str(payload).partition(':')
+    with _lock:
+        _generacion += 1
+        if tipo == 'usuario' and valor.isdigit():
+            _usuarios.pop(int(valor), None)
+        elif tipo == 'rol':
+            # Los roles se cargan juntos; forzar recarga completa en el próximo acceso
+            _roles_expira = 0.0
+        else:
+            _roles_expira = 0.0
+            _usuarios.clear()
+
+
+def invalidar(cursor, payload='*'):
+    """Invalidar en todos los workers. Llamar antes del commit de la transacción
+    que modifica roles, rol_permisos o usuarios.
+
+    También incrementa la versión 'permisos', lo que obliga a refrescar las
+    copias de permisos guardadas en las sesiones.
+    """
+    versiones.incrementar(cursor, 'permisos')
+    notificaciones.notificar(cursor, CANAL, payload)
+    invalidar_local(payload)
+
+
+notificaciones.suscribir(CANAL, invalidar_local, al_reconectar=invalidar_local)
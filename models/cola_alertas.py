@@ -0,0 +1,262 @@
+"""
+Escritura asíncrona y por lotes de alertas.
+
+encolar() deja la alerta en una cola acotada en memoria y regresa de
+inmediato; un hilo por worker la vacía con INSERT multi-fila cada
+ALERTAS_LOTE alertas o cada ALERTAS_INTERVALO_MS, lo que ocurra primero.
+
+Si la cola está llena, encolar() espera como mucho ALERTAS_ESPERA_MS
+(contrapresión) y luego escribe la alerta en un archivo de respaldo
+(ALERTAS_SPOOL, una alerta JSON por línea). Lo mismo ocurre con un lote que no
+se pudo insertar. El hilo vuelve a cargar ese archivo cuando la cola queda
+vacía, así que ninguna alerta se pierde aunque la base no responda.
+
+Si la base rechaza el lote por los datos (una clave foránea ya borrada, un
+valor fuera de rango) se reintenta alerta por alerta, cada una en su
+savepoint: las válidas se escriben y las rechazadas van a
+ALERTAS_SPOOL.rechazadas para revisarlas, sin volver a intentarse.
+"""
+import atexit
+import glob
+import json
+import os
+import queue
+import threading
+import time
+from datetime import datetime
+
+import psycopg2.extras
+
+import config as app_config
+
+_cola = queue.Queue(maxsize=app_config.ALERTAS_COLA_MAX)
+_lock_spool = threading.Lock()
+_lock_stats = threading.Lock()
+_hilo_pid = None
+_estadisticas = {'encoladas': 0, 'escritas': 0, 'derramadas': 0, 'recuperadas': 0, 'errores': 0,
+                 'rechazadas': 0}
+
+DESCRIPCION_MAX = 255  # ancho de alertas.descripcion
+
+
+def _sumar(clave, cantidad=1):
+    with _lock_stats:
+        _estadisticas[clave] += cantidad
+
+
+def encolar(descripcion, nivel='medio', usuario_id=None, visitante_id=None, fecha=None):
+    """Registrar una alerta sin esperar a la base de datos."""
+    _iniciar()
+    alerta = (str(descripcion)[:DESCRIPCION_MAX], nivel, usuario_id, visitante_id, fecha or datetime.now())
+    try:
+        _cola.put(alerta, timeout=app_config.ALERTAS_ESPERA_MS / 1000)
+        _sumar('encoladas')
+    except queue.Full:
+        _derramar([alerta])
+    return True
+
+
+def _iniciar():
+    global _hilo_pid
+    if _hilo_pid == os.getpid():
+        return
+    with _lock_spool:
+        if _hilo_pid == os.getpid():
+            return
+        _hilo_pid = os.getpid()
+    threading.Thread(target=_bucle_escritura, name='escritor-alertas', daemon=True).start()
+
+
+def _insertar(alertas):
+    """Insertar el lote y devolver las alertas que la base rechazó, como
+    (alerta, motivo). Los errores de conexión se propagan: el lote entero se
+    guarda en el respaldo y se reintenta."""
+    from models.database import Database
+    conn = Database().conectar()
+    if not conn:
+        raise RuntimeError('Sin conexión a la base de datos')
+    try:
+        with conn.cursor() as cursor:
+            try:
+                psycopg2.extras.execute_values(cursor, """
+                    INSERT INTO alertas (descripcion, nivel, usuario_id, visitante_id, fecha)
+                    VALUES %s
+                """, alertas, page_size=500)
+                conn.commit()
+                return []
+            except (psycopg2.DataError, psycopg2.IntegrityError) as e:
+                conn.rollback()
+                print(f"Lote de alertas rechazado ({e}); se reintenta alerta por alerta")
+
+            rechazadas = []
+            for alerta in alertas:
+                cursor.execute("SAVEPOINT alerta")
+                try:
+                    cursor.execute("""
+                        INSERT INTO alertas (descripcion, nivel, usuario_id, visitante_id, fecha)
+                        VALUES (%s, %s, %s, %s, %s)
+                    """, alerta)
+                    cursor.execute("RELEASE SAVEPOINT alerta")
+                except (psycopg2.DataError, psycopg2.IntegrityError) as e:
+                    cursor.execute("ROLLBACK TO SAVEPOINT alerta")
+                    rechazadas.append((alerta, str(e).strip()))
+            conn.commit()
+            return rechazadas
+    finally:
+        conn.close()
+
+
+def _escribir(alertas):
+    try:
+        rechazadas = _insertar(alertas)
+    except Exception as e:
+        print(f"Error escribiendo lote de alertas, se guarda en respaldo: {e}")
+        _sumar('errores')
+        _derramar(alertas)
+        return False
+    if rechazadas:
+        _rechazar(rechazadas)
+    _sumar('escritas', len(alertas) - len(rechazadas))
+    return True
+
+
+def _a_json(alerta, **extra):
+    return json.dumps(dict({
+        'descripcion': alerta[0], 'nivel': alerta[1], 'usuario_id': alerta[2],
+        'visitante_id': alerta[3], 'fecha': alerta[4].isoformat()
+    }, **extra)) + '\n'
+
+
+def _guardar_rechazadas(lineas, cantidad):
+    with _lock_spool:
+        with open(f"{app_config.ALERTAS_SPOOL}.rechazadas", 'a', encoding='utf-8') as archivo:
+            archivo.write(lineas)
+    _sumar('rechazadas', cantidad)
+
+
+def _rechazar(rechazadas):
+    """Apartar las alertas que la base no acepta (con el motivo)."""
+    for alerta, motivo in rechazadas:
+        print(f"Alerta rechazada por la base ({motivo}): {alerta[0]}")
+    _guardar_rechazadas(''.join(_a_json(alerta, motivo=motivo) for alerta, motivo in rechazadas),
+                        len(rechazadas))
+
+
+def _derramar(alertas):
+    """Guardar alertas en el archivo de respaldo."""
+    lineas = ''.join(_a_json(a) for a in alertas)
+    with _lock_spool:
+        with open(app_config.ALERTAS_SPOOL, 'a', encoding='utf-8') as archivo:
+            archivo.write(lineas)
+            archivo.flush()
+            os.fsync(archivo.fileno())
+    _sumar('derramadas', len(alertas))
+
+
+def _huerfano(ruta):
+    """Archivo tomado por un worker que ya no existe (murió antes de
+    borrarlo), o None."""
+    for candidato in glob.glob(glob.escape(ruta) + '.*'):
+        pid = candidato[len(ruta) + 1:]
+        if not pid.isdigit() or int(pid) == os.getpid():
+            continue
+        try:
+            os.kill(int(pid), 0)
+        except ProcessLookupError:
+            return candidato
+        except OSError:
+            continue
+    return None
+
+
+def _recuperar_spool():
+    """Reintentar las alertas del archivo de respaldo."""
+    ruta = app_config.ALERTAS_SPOOL
+    # Renombrar para que otros workers sigan escribiendo en un archivo nuevo;
+    # si quedó uno tomado de un intento anterior (de este worker o de uno que
+    # murió), procesarlo primero
+    tomado = f"{ruta}.{os.getpid()}"
+    if not os.path.exists(tomado):
+        origen = _huerfano(ruta) or ruta
+        if not os.path.exists(origen):
+            return
+        with _lock_spool:
+            try:
+                os.replace(origen, tomado)
+            except FileNotFoundError:
+                return
+
+    # Una línea ilegible (p. ej. cortada por una caída) se aparta en
+    # .rechazadas y no impide recuperar el resto ni liberar el archivo tomado
+    alertas = []
+    ilegibles = []
+    with open(tomado, encoding='utf-8', errors='replace') as archivo:
+        for numero, linea in enumerate(archivo, 1):
+            if not linea.strip():
+                continue
+            try:
+                datos = json.loads(linea)
+                alertas.append((
+                    str(datos['descripcion'])[:DESCRIPCION_MAX], datos['nivel'], datos['usuario_id'],
+                    datos['visitante_id'], datetime.fromisoformat(datos['fecha'])
+                ))
+            except (ValueError, KeyError, TypeError) as e:
+                print(f"Línea {numero} ilegible en el respaldo de alertas ({e}): {linea.strip()[:200]}")
+                ilegibles.append(linea if linea.endswith('\n') else linea + '\n')
+    if ilegibles:
+        _guardar_rechazadas(''.join(ilegibles), len(ilegibles))
+    # El archivo tomado se borra solo cuando las alertas ya están en la base
+    # o de nuevo en el respaldo (_escribir las derrama si falla): si el proceso
+    # muere antes, el próximo intento las vuelve a leer
+    if alertas and _escribir(alertas):
+        _sumar('recuperadas', len(alertas))
+    os.remove(tomado)
+
+
+def _tomar_lote(primera):
+    lote = [primera]
+    limite = time.monotonic() + app_config.ALERTAS_INTERVALO_MS / 1000
+    while len(lote) < app_config.ALERTAS_LOTE:
+        restante = limite - time.monotonic()
+        if restante <= 0:
+            break
+        try:
+            lote.append(_cola.get(timeout=restante))
+        except queue.Empty:
+            break
+    return lote
+
+
+def _bucle_escritura():
+    intervalo = app_config.ALERTAS_INTERVALO_MS / 1000
+    while True:
+        try:
+            primera = _cola.get(timeout=max(intervalo, 1.0))
+        except queue.Empty:
+            try:
+                _recuperar_spool()
+            except Exception as e:
+                print(f"Error recuperando alertas del respaldo: {e}")
+            continue
+        if not _escribir(_tomar_lote(primera)):
+            time.sleep(1)
+
+
+def vaciar():
+    """Escribir lo que quede en la cola (al terminar el proceso)."""
+    pendientes = []
+    while True:
+        try:
+            pendientes.append(_cola.get_nowait())
+        except queue.Empty:
+            break
+    if pendientes:
+        _escribir(pendientes)
+
+
+def estadisticas():
+    with _lock_stats:
+        return dict(_estadisticas, en_cola=_cola.qsize(), capacidad=_cola.maxsize)
+
+
+atexit.register(vaciar)
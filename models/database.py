@@ -1,7 +1,13 @@
 import hashlib
+import os
+import threading
 import psycopg2
 import psycopg2.extras
+from flask import g, has_app_context
+import config as app_config
 from config import get_db_config, get_database_url
+from models.pool import PoolConexiones, ConexionPool
+from models import cache_permisos
 
 
 class Database:
@@ -10,35 +16,46 @@ class Database:
         self.config = get_db_config()
         self.dsn = get_database_url()
 
-    def conectar(self):
-        """Establecer conexión con la base de datos PostgreSQL.
+    def abrir_conexion(self):
+        """Abrir una conexión física nueva con la base de datos PostgreSQL.
 
         Intenta usar DSN (DATABASE_URL) si está disponible, sino usa el diccionario
         devuelto por get_db_config(). Añade sslmode=require por defecto para
         conexiones remotas seguras. No fuerces parámetros extra que psycopg2 no
         reconoce.
         """
+        # Si hay una URL/DSN preferirla (puede venir con sslmode)
+        if self.dsn:
+            dsn = self.dsn
+            if 'sslmode=' not in dsn:
+                if '?' in dsn:
+                    dsn += '&sslmode=require'
+                else:
+                    dsn += '?sslmode=require'
+            return psycopg2.connect(dsn)
+
+        # Usar config dict
+        config = dict(self.config)
+        if 'sslmode' not in config:
+            config['sslmode'] = 'require'
+        # timeout razonable
+        config.setdefault('connect_timeout', 10)
+
+        return psycopg2.connect(**config)
+
+    def conectar(self):
+        """Obtener una conexión del pool del proceso.
+
+        Dentro de una petición Flask la conexión queda asociada a `g` y se
+        reutiliza entre las llamadas a conectar() de esa petición; se devuelve al
+        pool en teardown_appcontext. Fuera de una petición (scripts, hilos) se
+        devuelve al pool al llamar close().
+        """
         try:
-            # Si hay una URL/DSN preferirla (puede venir con sslmode)
-            if self.dsn:
-                dsn = self.dsn
-                if 'sslmode=' not in dsn:
-                    if '?' in dsn:
-                        dsn += '&sslmode=require'
-                    else:
-                        dsn += '?sslmode=require'
-                conn = psycopg2.connect(dsn)
-                return conn
-
-            # Usar config dict
-            config = dict(self.config)
-            if 'sslmode' not in config:
-                config['sslmode'] = 'require'
-            # timeout razonable
-            config.setdefault('connect_timeout', 10)
-
-            conn = psycopg2.connect(**config)
-            return conn
+            if has_app_context():
+                return _conexion_de_solicitud()
+            pool = obtener_pool()
+            return ConexionPool(pool.obtener(), pool.devolver)
         except Exception as e:
             print(f"Error al conectar a PostgreSQL: {e}")
             return None
@@ -53,87 +70,123 @@ class Database:
         """Verificar contraseña hasheada"""
         return Database.hash_contrasena(contrasena) == hash_almacenado
 
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+
+
+def obtener_pool():
+    """Pool de conexiones del proceso actual (se recrea tras un fork)."""
+    global _pool, _pool_pid
+    if _pool is not None and _pool_pid == os.getpid():
+        return _pool
+    with _pool_lock:
+        if _pool is None or _pool_pid != os.getpid():
+            _pool = PoolConexiones(
+                Database().abrir_conexion,
+                minimo=app_config.POOL_MIN_CONEXIONES,
+                maximo=app_config.POOL_MAX_CONEXIONES,
+                timeout_espera=app_config.POOL_TIMEOUT_ESPERA,
+                verificar_inactiva_seg=app_config.POOL_VERIFICAR_INACTIVA_SEG,
+            )
+            _pool_pid = os.getpid()
+    return _pool
+
+
+def _conexion_de_solicitud():
+    """Prestar la conexión de la petición actual.
+
+    Si la conexión de la petición ya está prestada (p. ej. una función auxiliar
+    que abre su propia conexión mientras el controlador tiene la suya) se toma
+    otra del pool, para que un commit o rollback de una no afecte a la otra.
+    """
+    conexiones = g.setdefault('_db_conexiones', [])
+    for entrada in conexiones:
+        if not entrada['prestada']:
+            break
+    else:
+        entrada = {'conn': obtener_pool().obtener(), 'prestada': False}
+        conexiones.append(entrada)
+
+    def al_cerrar(conn):
+        try:
+            conn.rollback()
+            if conn.autocommit:
+                conn.autocommit = False
+        except Exception:
+            pass
+        entrada['prestada'] = False
+
+    entrada['prestada'] = True
+    return ConexionPool(entrada['conn'], al_cerrar)
+
+
+def liberar_conexiones(exc=None):
+    """teardown_appcontext: devolver al pool las conexiones de la petición."""
+    conexiones = g.pop('_db_conexiones', [])
+    if not conexiones:
+        return
+    pool = obtener_pool()
+    for entrada in conexiones:
+        pool.devolver(entrada['conn'])
+
+
 def obtener_permisos_usuario(usuario_id):
     """Obtener todos los permisos de un usuario basado en su rol"""
+    return sorted(cache_permisos.permisos_usuario(usuario_id))
+
+def _cargar_usuario(usuario_id):
+    """Cargar un usuario activo con su rol; los permisos salen de la caché por rol.
+
+    Los permisos se devuelven como frozenset de 'modulo.nombre'.
+    """
     db = Database()
     conn = db.conectar()
     if not conn:
-        return []
-
+        return None
     try:
-        # usar cursor con filas tipo dict (psycopg2.DictCursor)
         with conn.cursor(cursor_factory=psycopg2.extras.DictCursor) as cursor:
             cursor.execute("""
-                SELECT p.nombre, p.modulo
+                SELECT u.*, r.nombre as rol_nombre, r.descripcion as rol_descripcion
                 FROM usuarios u
                 JOIN roles r ON u.rol_id = r.id
-                JOIN rol_permisos rp ON r.id = rp.rol_id
-                JOIN permisos p ON rp.permiso_id = p.id
                 WHERE u.id = %s AND u.estado = 'activo'
             """, (usuario_id,))
-            permisos = cursor.fetchall()
-            return [f"{p['modulo']}.{p['nombre']}" for p in permisos]
+            usuario = cursor.fetchone()
+            if usuario:
+                usuario = dict(usuario)
+                usuario['permisos'] = cache_permisos.permisos_rol(usuario['rol_id'])
+            return usuario
     except Exception as e:
-        print(f"Error al obtener permisos: {e}")
-        return []
+        print(f"Error al cargar usuario: {e}")
+        return None
     finally:
         conn.close()
 
+def usuario_activo(usuario_id):
+    """Verificar que el usuario existe y está activo (sin consultas con la caché caliente)"""
+    return cache_permisos.rol_de_usuario(usuario_id) is not None
+
 def tiene_permiso(usuario_id, permiso_requerido):
     """Verificar si un usuario tiene un permiso específico"""
-    permisos = obtener_permisos_usuario(usuario_id)
-    return permiso_requerido in permisos
+    return permiso_requerido in cache_permisos.permisos_usuario(usuario_id)
 
 def obtener_usuario_actual():
-    """Obtener información del usuario actual desde la sesión de Flask."""
+    """Obtener información del usuario actual desde la sesión de Flask.
+
+    Se carga como mucho una vez por petición y queda memorizado en `g`, de modo
+    que los decoradores, el context processor y las plantillas comparten la
+    misma consulta.
+    """
     from flask import session
     usuario_id = session.get('usuario_id')
     if not usuario_id:
         return None
-    db = Database()
-    conn = db.conectar()
-    if not conn:
-        return None
-    try:
-        with conn.cursor(cursor_factory=psycopg2.extras.DictCursor) as cursor:
-            cursor.execute("""
-                SELECT u.*, r.nombre as rol_nombre, r.descripcion as rol_descripcion
-                FROM usuarios u 
-                JOIN roles r ON u.rol_id = r.id 
-                WHERE u.id = %s AND u.estado = 'activo'
-            """, (usuario_id,))
-            usuario = cursor.fetchone()
-            if usuario:
-                usuario = dict(usuario)
-                usuario['permisos'] = obtener_permisos_usuario(usuario['id'])
-            return usuario
-    except Exception as e:
-        print(f"Error al obtener usuario actual: {e}")
-        return None
-    finally:
-        conn.close()
+    if g.get('_usuario_actual_id') != usuario_id:
+        g._usuario_actual = _cargar_usuario(usuario_id)
+        g._usuario_actual_id = usuario_id
+    return g._usuario_actual
 
 # Si necesitas buscar usuario por id manualmente:
 def obtener_usuario_por_id(usuario_id):
-    db = Database()
-    conn = db.conectar()
-    if not conn:
-        return None
-    try:
-        with conn.cursor(cursor_factory=psycopg2.extras.DictCursor) as cursor:
-            cursor.execute("""
-                SELECT u.*, r.nombre as rol_nombre, r.descripcion as rol_descripcion
-                FROM usuarios u 
-                JOIN roles r ON u.rol_id = r.id 
-                WHERE u.id = %s AND u.estado = 'activo'
-            """, (usuario_id,))
-            usuario = cursor.fetchone()
-            if usuario:
-                usuario = dict(usuario)
-                usuario['permisos'] = obtener_permisos_usuario(usuario['id'])
-            return usuario
-    except Exception as e:
-        print(f"Error al obtener usuario por id: {e}")
-        return None
-    finally:
-        conn.close()
+    return _cargar_usuario(usuario_id)
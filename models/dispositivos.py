@@ -0,0 +1,101 @@
+"""
+Dispositivos autenticados por token (kioscos de escaneo).
+
+El token solo se muestra al crearlo; en la base se guarda su SHA-256. Cada
+worker cachea en memoria los dispositivos ya validados, de modo que una
+petición de kiosco no consulta la base para autenticarse. La caché se vacía
+con las notificaciones 'dispositivos_cambio' del trigger de la tabla.
+"""
+import hashlib
+import secrets
+import threading
+import time
+from collections import namedtuple
+
+import config as app_config
+from models import notificaciones
+
+CANAL = 'dispositivos_cambio'
+
+Dispositivo = namedtuple('Dispositivo', ['id', 'nombre', 'usuario_id'])
+
+_lock = threading.Lock()
+_cache = {}  # hash del token -> (Dispositivo, expira); los tokens inválidos no se guardan
+
+
+def _hash(token):
+    return hashlib.sha256(token.encode('utf-8')).hexdigest()
+
+
+def _conectar():
+    from models.database import Database
+    return Database().conectar()
+
+
+def _consultar(token_hash):
+    conn = _conectar()
+    if not conn:
+        return None, False
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute("""
+                SELECT id, nombre, usuario_id
+                FROM dispositivos
+                WHERE token_hash = %s AND activo = TRUE
+            """, (token_hash,))
+            fila = cursor.fetchone()
+            return (Dispositivo(*fila) if fila else None), True
+    except Exception as e:
+        print(f"Error al consultar dispositivo: {e}")
+        return None, False
+    finally:
+        conn.close()
+
+
+def autenticar(token):
+    """Dispositivo activo al que pertenece el token, o None."""
+    notificaciones.iniciar_escucha()
+    token_hash = _hash(token)
+    ahora = time.monotonic()
+    with _lock:
+        entrada = _cache.get(token_hash)
+        if entrada and ahora < entrada[1]:
+            return entrada[0]
+
+    dispositivo, ok = _consultar(token_hash)
+    if ok and dispositivo is not None:
+        with _lock:
+            _cache[token_hash] = (dispositivo, time.monotonic() + app_config.CACHE_PERMISOS_TTL)
+    return dispositivo
+
+
+def crear(nombre, usuario_id):
+    """Registrar un dispositivo. Devuelve (id, token); el token no se vuelve a mostrar."""
+    token = secrets.token_urlsafe(32)
+    conn = _conectar()
+    if not conn:
+        return None, None
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute("""
+                INSERT INTO dispositivos (nombre, token_hash, usuario_id)
+                VALUES (%s, %s, %s)
+                RETURNING id
+            """, (nombre, _hash(token), usuario_id))
+            dispositivo_id = cursor.fetchone()[0]
+        conn.commit()
+        return dispositivo_id, token
+    except Exception as e:
+        print(f"Error al crear dispositivo: {e}")
+        conn.rollback()
+        return None, None
+    finally:
+        conn.close()
+
+
+def invalidar_local(payload=None):
+    with _lock:
+        _cache.clear()
+
+
+notificaciones.suscribir(CANAL, invalidar_local, al_reconectar=invalidar_local)
@@ -0,0 +1,94 @@
+"""
+Construcción de filtros SQL que aprovechan los índices.
+
+Un filtro por día como DATE(a.fecha_hora) = %s obliga a calcular DATE() en
+cada fila y no puede usar el índice de fecha_hora. Aquí los días se traducen
+a rangos semiabiertos de timestamp (columna >= inicio AND columna < fin), que
+sí usan los índices, y el resto de filtros a predicados parametrizados.
+
+Uso:
+    filtros = Filtros()
+    filtros.rango_dias('a.fecha_hora', fecha_desde, fecha_hasta)
+    filtros.igual('a.tipo', tipo)
+    filtros.si_no('a.autorizado', autorizado)
+    cursor.execute(query + filtros.sql(), params + filtros.params)
+"""
+from datetime import date, datetime, timedelta
+
+
+def a_fecha(valor):
+    """date a partir de 'YYYY-MM-DD', date o datetime; None si viene vacío.
+    Lanza ValueError si el texto no es una fecha."""
+    if not valor:
+        return None
+    if isinstance(valor, datetime):
+        return valor.date()
+    if isinstance(valor, date):
+        return valor
+    return date.fromisoformat(str(valor).strip())
+
+
+def rango_dias(desde=None, hasta=None):
+    """(inicio, fin) semiabierto que cubre los días desde..hasta inclusive."""
+    desde, hasta = a_fecha(desde), a_fecha(hasta)
+    inicio = datetime.combine(desde, datetime.min.time()) if desde else None
+    fin = datetime.combine(hasta + timedelta(days=1), datetime.min.time()) if hasta else None
+    return inicio, fin
+
+
+class Filtros:
+    """Predicados parametrizados para agregar a un WHERE."""
+
+    def __init__(self):
+        self.condiciones = []
+        self.params = []
+
+    def agregar(self, condicion, *params):
+        self.condiciones.append(condicion)
+        self.params.extend(params)
+        return self
+
+    def rango_dias(self, columna, desde=None, hasta=None):
+        """Días desde..hasta (inclusive) como columna >= inicio AND columna < fin."""
+        inicio, fin = rango_dias(desde, hasta)
+        if inicio:
+            self.agregar(f"{columna} >= %s", inicio)
+        if fin:
+            self.agregar(f"{columna} < %s", fin)
+        return self
+
+    def dia(self, columna, fecha):
+        return self.rango_dias(columna, fecha, fecha)
+
+    def hoy(self, columna):
+        """Día actual según la base (CURRENT_DATE), también como rango."""
+        return self.agregar(f"{columna} >= CURRENT_DATE AND {columna} < CURRENT_DATE + 1")
+
+    def igual(self, columna, valor):
+        """columna = valor, solo si valor no está vacío."""
+        if valor not in (None, ''):
+            self.agregar(f"{columna} = %s", valor)
+        return self
+
+    def en(self, columna, valores):
+        valores = [v for v in valores or [] if v not in (None, '')]
+        if valores:
+            self.agregar(f"{columna} = ANY(%s)", valores)
+        return self
+
+    def si_no(self, columna, valor):
+        """Filtro booleano a partir de 'si'/'no' (o True/False); vacío no filtra."""
+        if valor in ('si', True):
+            self.agregar(f"{columna} = TRUE")
+        elif valor in ('no', False):
+            self.agregar(f"{columna} = FALSE")
+        return self
+
+    def sql(self, prefijo=' AND '):
+        """Condiciones unidas con AND, precedidas de prefijo ('' si no hay ninguna)."""
+        if not self.condiciones:
+            return ''
+        return prefijo + ' AND '.join(self.condiciones)
+
+    def where(self):
+        return self.sql(' WHERE ')
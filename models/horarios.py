@@ -0,0 +1,176 @@
+"""
+Motor de horarios de acceso.
+
+Las ventanas de las tablas horarios_acceso y dias_feriados se compilan una vez
+en una tabla en memoria: por cada ámbito (general, empresa o visitante) y día
+de la semana, dos tuplas ordenadas con el inicio y el fin de cada ventana en
+minutos desde medianoche (ventanas solapadas ya fusionadas). Evaluar un escaneo
+es una búsqueda binaria sobre esas tuplas.
+
+Prioridad: visitante > empresa > general. Un ámbito con ventanas propias
+reemplaza al general en todos los días; los feriados solo cierran el horario
+general. Si no hay ventanas generales en la base se usa config.HORARIOS_ACCESO
+todos los días. La tabla se recompila cuando llega 'horarios_cambio' (triggers
+de ambas tablas), sin reiniciar.
+"""
+import threading
+from bisect import bisect_right
+
+import config as app_config
+from models import notificaciones
+
+CANAL = 'horarios_cambio'
+
+DIAS = ('Lunes', 'Martes', 'Miércoles', 'Jueves', 'Viernes', 'Sábado', 'Domingo')
+
+GENERAL = ('general', None)
+
+_lock = threading.Lock()
+_tabla = None  # ámbito -> [(inicios, fines)] * 7
+_feriados = frozenset()
+
+
+def _minutos(hora):
+    if isinstance(hora, str):
+        horas, minutos = hora.split(':')[:2]
+        return int(horas) * 60 + int(minutos)
+    return hora.hour * 60 + hora.minute
+
+
+def _compilar_dia(ventanas):
+    """Ordenar y fusionar ventanas [(inicio, fin)] en dos tuplas paralelas."""
+    fusionadas = []
+    for inicio, fin in sorted(ventanas):
+        if fusionadas and inicio <= fusionadas[-1][1]:
+            fusionadas[-1][1] = max(fusionadas[-1][1], fin)
+        else:
+            fusionadas.append([inicio, fin])
+    return tuple(v[0] for v in fusionadas), tuple(v[1] for v in fusionadas)
+
+
+def _normalizar_empresa(empresa):
+    return empresa.strip().lower() if empresa else None
+
+
+def compilar(filas, feriados=()):
+    """Construir la tabla a partir de filas (dia_semana, hora_inicio, hora_fin, visitante_id, empresa)."""
+    ventanas = {}
+    for dia, inicio, fin, visitante_id, empresa in filas:
+        if visitante_id is not None:
+            ambito = ('visitante', visitante_id)
+        elif empresa:
+            ambito = ('empresa', _normalizar_empresa(empresa))
+        else:
+            ambito = GENERAL
+        ventanas.setdefault(ambito, [[] for _ in DIAS])[dia].append((_minutos(inicio), _minutos(fin)))
+
+    if GENERAL not in ventanas:
+        defecto = (_minutos(app_config.HORARIOS_ACCESO['hora_inicio']),
+                   _minutos(app_config.HORARIOS_ACCESO['hora_fin']))
+        ventanas[GENERAL] = [[defecto] for _ in DIAS]
+
+    tabla = {ambito: [_compilar_dia(dia) for dia in dias] for ambito, dias in ventanas.items()}
+    return tabla, frozenset(feriados)
+
+
+def _cargar():
+    from models.database import Database
+    conn = Database().conectar()
+    if not conn:
+        return None
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute("""
+                SELECT dia_semana, hora_inicio, hora_fin, visitante_id, empresa
+                FROM horarios_acceso
+                WHERE activo = TRUE
+            """)
+            filas = cursor.fetchall()
+            cursor.execute("SELECT fecha FROM dias_feriados")
+            feriados = [fila[0] for fila in cursor.fetchall()]
+        return filas, feriados
+    except Exception as e:
+        print(f"Error al cargar horarios de acceso: {e}")
+        return None
+    finally:
+        conn.close()
+
+
+def recargar():
+    """Recompilar la tabla desde la base. Si falla se conserva la anterior."""
+    global _tabla, _feriados
+    datos = _cargar()
+    if datos is None:
+        with _lock:
+            if _tabla is None:
+                _tabla, _feriados = compilar([])
+        return False
+    tabla, feriados = compilar(*datos)
+    with _lock:
+        _tabla, _feriados = tabla, feriados
+    return True
+
+
+def _obtener():
+    notificaciones.iniciar_escucha()
+    if _tabla is None:
+        recargar()
+    with _lock:
+        return _tabla, _feriados
+
+
+def _ventanas(momento, visitante_id=None, empresa=None):
+    tabla, feriados = _obtener()
+    dia = momento.weekday()
+    if visitante_id is not None and ('visitante', visitante_id) in tabla:
+        return tabla[('visitante', visitante_id)][dia]
+    empresa = _normalizar_empresa(empresa)
+    if empresa and ('empresa', empresa) in tabla:
+        return tabla[('empresa', empresa)][dia]
+    if momento.date() in feriados:
+        return (), ()
+    return tabla[GENERAL][dia]
+
+
+def permitido(momento, visitante_id=None, empresa=None):
+    """True si el momento cae dentro de alguna ventana aplicable.
+
+    Las ventanas están en minutos; el fin se compara al segundo (y fracción),
+    como BETWEEN en la base: con fin 18:00, las 18:00:59 quedan fuera."""
+    inicios, fines = _ventanas(momento, visitante_id, empresa)
+    minuto = momento.hour * 60 + momento.minute
+    posicion = bisect_right(inicios, minuto) - 1
+    segundos = minuto * 60 + momento.second + momento.microsecond / 1_000_000
+    return posicion >= 0 and segundos <= fines[posicion] * 60
+
+
+def _formatear(inicios, fines):
+    if not inicios:
+        return 'Sin acceso'
+    return ', '.join(f'{i // 60:02d}:{i % 60:02d} - {f // 60:02d}:{f % 60:02d}' for i, f in zip(inicios, fines))
+
+
+def descripcion(momento, visitante_id=None, empresa=None):
+    """Texto con las ventanas que aplican en la fecha del momento."""
+    return _formatear(*_ventanas(momento, visitante_id, empresa))
+
+
+def resumen_general():
+    """Horario general agrupado por días consecutivos: [('Lunes a Viernes', '08:00 - 18:00'), ...]"""
+    tabla, _ = _obtener()
+    lineas = []
+    inicio = 0
+    for dia in range(1, len(DIAS) + 1):
+        if dia < len(DIAS) and tabla[GENERAL][dia] == tabla[GENERAL][inicio]:
+            continue
+        dias = DIAS[inicio] if dia - 1 == inicio else f'{DIAS[inicio]} a {DIAS[dia - 1]}'
+        lineas.append((dias, _formatear(*tabla[GENERAL][inicio])))
+        inicio = dia
+    return lineas
+
+
+def _al_notificar(payload=None):
+    recargar()
+
+
+notificaciones.suscribir(CANAL, _al_notificar, al_reconectar=_al_notificar)
@@ -0,0 +1,220 @@
+"""
+Índice en memoria de credenciales activas, por código.
+
+Se precarga al arrancar cada worker desde vista_credenciales_activas y se
+mantiene al día con las notificaciones 'credenciales_cambio' que emiten los
+triggers de credenciales y visitantes. Mientras no terminó la primera carga,
+un código que no está en el índice se consulta en la base (y se agrega si
+resulta válido). Ya cargado, el índice se da por completo y un código ausente
+no cuesta otra consulta: la puerta lo trata como inválido y la función de la
+base lo rechaza por su cuenta. Solo una credencial creada hace milisegundos,
+cuyo aviso aún no llegó, puede quedar denegada en ese intervalo.
+"""
+import threading
+from collections import namedtuple
+from datetime import datetime
+
+from models import notificaciones
+
+CANAL = 'credenciales_cambio'
+
+CredencialActiva = namedtuple(
+    'CredencialActiva',
+    ['credencial_id', 'codigo', 'visitante_id', 'nombre', 'empresa', 'fecha_expiracion']
+)
+
+_COLUMNAS = "c.id, c.codigo, v.id, v.nombre, v.empresa, c.fecha_expiracion"
+
+_lock = threading.Lock()
+_indice = {}  # codigo -> CredencialActiva
+_por_visitante = {}  # visitante_id -> set(codigo)
+_cargado = False
+_cargando = False
+_pendientes = set()  # eventos recibidos durante una carga completa
+_estadisticas = {'aciertos': 0, 'fallos': 0, 'consultas_respaldo': 0, 'eventos': 0}
+
+
+def _conectar():
+    from models.database import Database
+    return Database().conectar()
+
+
+def _agregar(entrada):
+    anterior = _indice.get(entrada.codigo)
+    if anterior is not None and anterior.visitante_id != entrada.visitante_id:
+        _por_visitante.get(anterior.visitante_id, set()).discard(entrada.codigo)
+    _indice[entrada.codigo] = entrada
+    _por_visitante.setdefault(entrada.visitante_id, set()).add(entrada.codigo)
+
+
+def _quitar(codigo):
+    entrada = _indice.pop(codigo, None)
+    if entrada is not None:
+        codigos = _por_visitante.get(entrada.visitante_id)
+        if codigos is not None:
+            codigos.discard(codigo)
+            if not codigos:
+                del _por_visitante[entrada.visitante_id]
+
+
+def precargar():
+    """Cargar (o recargar) todas las credenciales activas."""
+    global _cargado, _cargando, _indice, _por_visitante
+    with _lock:
+        _cargando = True
+        _pendientes.clear()
+
+    conn = _conectar()
+    if not conn:
+        with _lock:
+            _cargando = False
+        return False
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute("""
+                SELECT id, codigo, visitante_id, visitante_nombre, empresa, fecha_expiracion
+                FROM vista_credenciales_activas
+                WHERE fecha_expiracion IS NULL OR fecha_expiracion > NOW()
+            """)
+            filas = cursor.fetchall()
+    except Exception as e:
+        print(f"Error al precargar índice de credenciales: {e}")
+        with _lock:
+            _cargando = False
+        return False
+    finally:
+        conn.close()
+
+    indice = {}
+    por_visitante = {}
+    for fila in filas:
+        entrada = CredencialActiva(*fila)
+        indice[entrada.codigo] = entrada
+        por_visitante.setdefault(entrada.visitante_id, set()).add(entrada.codigo)
+
+    with _lock:
+        _indice = indice
+        _por_visitante = por_visitante
+        _cargado = True
+        _cargando = False
+        pendientes = list(_pendientes)
+        _pendientes.clear()
+
+    # Lo que cambió mientras se cargaba puede haber quedado con datos viejos
+    for payload in pendientes:
+        _aplicar_evento(payload)
+    return True
+
+
+def precargar_en_segundo_plano():
+    """Arrancar la escucha y precargar el índice sin bloquear el arranque."""
+    notificaciones.iniciar_escucha()
+    threading.Thread(target=precargar, name='precarga-credenciales', daemon=True).start()
+
+
+def _consultar(condicion, valor, conn=None):
+    """Credenciales activas que cumplen la condición. Con conn se usa esa
+    conexión (sin devolverla) y los errores se propagan al llamador."""
+    propia = conn is None
+    if propia:
+        conn = _conectar()
+        if not conn:
+            return None
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute(f"""
+                SELECT {_COLUMNAS}
+                FROM credenciales c
+                JOIN visitantes v ON c.visitante_id = v.id
+                WHERE {condicion} AND c.estado = 'activa'
+                AND (c.fecha_expiracion IS NULL OR c.fecha_expiracion > NOW())
+                AND v.estado = 'activo'
+            """, (valor,))
+            return [CredencialActiva(*fila) for fila in cursor.fetchall()]
+    except Exception as e:
+        if not propia:
+            raise
+        print(f"Error al consultar credenciales: {e}")
+        return None
+    finally:
+        if propia:
+            conn.close()
+
+
+def buscar(codigo, conn=None):
+    """Credencial activa y vigente para el código, o None.
+
+    Si no está en el índice y este aún no se cargó, se consulta la base; con
+    conn, usando la conexión que ya tiene el llamador."""
+    notificaciones.iniciar_escucha()
+    ahora = datetime.now()
+    with _lock:
+        entrada = _indice.get(codigo)
+        if entrada is not None:
+            if entrada.fecha_expiracion is None or entrada.fecha_expiracion > ahora:
+                _estadisticas['aciertos'] += 1
+                return entrada
+            _quitar(codigo)
+        _estadisticas['fallos'] += 1
+        if _cargado:
+            return None
+        _estadisticas['consultas_respaldo'] += 1
+
+    filas = _consultar("c.codigo = %s", codigo, conn)
+    if not filas:
+        return None
+    with _lock:
+        _agregar(filas[0])
+    return filas[0]
+
+
+def descartar(codigo):
+    """Quitar un código del índice local (p. ej. tras desactivarlo en una salida)."""
+    with _lock:
+        _quitar(codigo)
+
+
+def _aplicar_evento(payload):
+    tipo, _, valor = payload.partition(':')
+    if tipo == 'credencial':
+        filas = _consultar("c.codigo = %s", valor)
+        if filas is None:
+            return
+        with _lock:
+            _quitar(valor)
+            for entrada in filas:
+                _agregar(entrada)
+    elif tipo == 'visitante' and valor.isdigit():
+        visitante_id = int(valor)
+        filas = _consultar("v.id = %s", visitante_id)
+        if filas is None:
+            return
+        with _lock:
+            for codigo in list(_por_visitante.get(visitante_id, ())):
+                _quitar(codigo)
+            for entrada in filas:
+                _agregar(entrada)
+
+
+def _al_notificar(payload):
+    with _lock:
+        _estadisticas['eventos'] += 1
+        if _cargando:
+            _pendientes.add(payload)
+        if not _cargado:
+            return
+    _aplicar_evento(payload)
+
+
+def _al_reconectar():
+    # Pudieron perderse eventos mientras no había escucha
+    if _cargado:
+        precargar()
+
+
+def estadisticas():
+    with _lock:
+        return dict(_estadisticas, credenciales=len(_indice), cargado=_cargado)
+
+
+notificaciones.suscribir(CANAL, _al_notificar, al_reconectar=_al_reconectar)
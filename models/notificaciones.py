@@ -0,0 +1,110 @@
+"""
+Invalidación entre workers mediante LISTEN/NOTIFY de PostgreSQL.
+
+Cada proceso mantiene un hilo con una conexión dedicada (fuera del pool) que
+escucha los canales suscritos y despacha cada notificación a sus callbacks.
+Quien modifica datos llama a notificar() dentro de su transacción; PostgreSQL
+entrega el mensaje a todos los workers cuando se hace commit.
+"""
+import os
+import select
+import threading
+import time
+
+from psycopg2 import sql
+from psycopg2.extensions import ISOLATION_LEVEL_AUTOCOMMIT
+
+INTERVALO_POLL = 5  # segundos entre revisiones de canales nuevos
+ESPERA_RECONEXION = 5  # segundos antes de reintentar tras un error
+
+_suscripciones = {}  # canal -> [callback(payload)]
+_al_reconectar = []  # callbacks sin argumentos (se pudieron perder mensajes)
+_lock = threading.Lock()
+_hilo_pid = None
+
+
+def suscribir(canal, callback, al_reconectar=None):
+    """Registrar un callback para un canal. al_reconectar se llama cada vez que
+    la escucha se (re)establece, para que el suscriptor descarte lo que tenga
+    en memoria."""
+    with _lock:
+        _suscripciones.setdefault(canal, []).append(callback)
+        if al_reconectar:
+            _al_reconectar.append(al_reconectar)
+
+
+def notificar(cursor, canal, payload=''):
+    """Emitir una notificación dentro de la transacción del cursor."""
+    cursor.execute("SELECT pg_notify(%s, %s)", (canal, str(payload)))
+
+
+def iniciar_escucha():
+    """Arrancar el hilo de escucha de este proceso si aún no existe."""
+    global _hilo_pid
+    if _hilo_pid == os.getpid():
+        return
+    with _lock:
+        if _hilo_pid == os.getpid():
+            return
+        _hilo_pid = os.getpid()
+    hilo = threading.Thread(target=_bucle_escucha, name='escucha-notify', daemon=True)
+    hilo.start()
+
+
+def escucha_activa():
+    return _hilo_pid == os.getpid()
+
+
+def _despachar(canal, payload):
+    with _lock:
+        callbacks = list(_suscripciones.get(canal, []))
+    for callback in callbacks:
+        try:
+            callback(payload)
+        except Exception as e:
+            print(f"Error procesando notificación {canal}: {e}")
+
+
+def _escuchar_canales(conn, escuchados):
+    with _lock:
+        canales = set(_suscripciones) - escuchados
+    if not canales:
+        return
+    with conn.cursor() as cursor:
+        for canal in canales:
+            cursor.execute(sql.SQL("LISTEN {}").format(sql.Identifier(canal)))
+    escuchados.update(canales)
+
+
+def _bucle_escucha():
+    from models.database import Database
+
+    while True:
+        conn = None
+        try:
+            conn = Database().abrir_conexion()
+            conn.set_isolation_level(ISOLATION_LEVEL_AUTOCOMMIT)
+            escuchados = set()
+            _escuchar_canales(conn, escuchados)
+
+            with _lock:
+                reconexiones = list(_al_reconectar)
+            for callback in reconexiones:
+                callback()
+
+            while True:
+                if select.select([conn], [], [], INTERVALO_POLL) != ([], [], []):
+                    conn.poll()
+                    while conn.notifies:
+                        notificacion = conn.notifies.pop(0)
+                        _despachar(notificacion.channel, notificacion.payload)
+                _escuchar_canales(conn, escuchados)
+        except Exception as e:
+            print(f"Escucha de notificaciones interrumpida: {e}")
+        finally:
+            if conn is not None:
+                try:
+                    conn.close()
+                except Exception:
+                    pass
+        time.sleep(ESPERA_RECONEXION)
@@ -0,0 +1,129 @@
+"""
+Ocupación en vivo: visitantes que están dentro en este momento.
+
+La tabla ocupacion_actual la mantiene el trigger de accesos (entrada la agrega,
+salida la quita) y es la fuente compartida por todos los workers. Cada worker
+la carga al arrancar en un diccionario por visitante y la actualiza con las
+notificaciones 'ocupacion_cambio' que emite el mismo trigger, así que contar
+es O(1) y listar no toca la base.
+"""
+import json
+import threading
+from collections import namedtuple
+from datetime import datetime
+
+from models import notificaciones
+
+CANAL = 'ocupacion_cambio'
+
+Ocupante = namedtuple('Ocupante', ['visitante_id', 'nombre', 'empresa', 'fecha_entrada'])
+
+_lock = threading.Lock()
+_dentro = {}  # visitante_id -> Ocupante
+_cargado = False
+_cargando = False
+_pendientes = []  # eventos recibidos durante una carga completa
+
+
+def precargar():
+    """Cargar (o recargar) la ocupación completa."""
+    global _dentro, _cargado, _cargando
+    from models.database import Database
+    with _lock:
+        _cargando = True
+        _pendientes.clear()
+
+    conn = Database().conectar()
+    if not conn:
+        with _lock:
+            _cargando = False
+        return False
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute("""
+                SELECT o.visitante_id, v.nombre, v.empresa, o.fecha_entrada
+                FROM ocupacion_actual o
+                JOIN visitantes v ON o.visitante_id = v.id
+            """)
+            filas = cursor.fetchall()
+    except Exception as e:
+        print(f"Error al cargar la ocupación actual: {e}")
+        with _lock:
+            _cargando = False
+        return False
+    finally:
+        conn.close()
+
+    with _lock:
+        _dentro = {fila[0]: Ocupante(*fila) for fila in filas}
+        _cargado = True
+        _cargando = False
+        pendientes = list(_pendientes)
+        _pendientes.clear()
+        for evento in pendientes:
+            _aplicar(evento)
+    return True
+
+
+def precargar_en_segundo_plano():
+    notificaciones.iniciar_escucha()
+    threading.Thread(target=precargar, name='precarga-ocupacion', daemon=True).start()
+
+
+def _asegurar_carga():
+    notificaciones.iniciar_escucha()
+    if not _cargado:
+        precargar()
+
+
+def total():
+    """Cantidad de visitantes dentro."""
+    _asegurar_carga()
+    return len(_dentro)
+
+
+def listar():
+    """Visitantes dentro, ordenados por hora de entrada."""
+    _asegurar_carga()
+    with _lock:
+        ocupantes = list(_dentro.values())
+    return sorted(ocupantes, key=lambda o: o.fecha_entrada)
+
+
+def esta_dentro(visitante_id):
+    _asegurar_carga()
+    return visitante_id in _dentro
+
+
+def _aplicar(evento):
+    # Se llama con _lock tomado
+    if evento.get('tipo') == 'entrada':
+        _dentro[evento['visitante_id']] = Ocupante(
+            evento['visitante_id'], evento.get('nombre'), evento.get('empresa'),
+            evento.get('fecha_entrada')
+        )
+    elif evento.get('tipo') == 'salida':
+        _dentro.pop(evento['visitante_id'], None)
+
+
+def _al_notificar(payload):
+    if payload == 'recargar':
+        precargar()
+        return
+    evento = json.loads(payload)
+    if evento.get('fecha_entrada'):
+        evento['fecha_entrada'] = datetime.fromisoformat(evento['fecha_entrada'])
+    with _lock:
+        if _cargando:
+            _pendientes.append(evento)
+        if _cargado:
+            _aplicar(evento)
+
+
+def _al_reconectar():
+    # Pudieron perderse eventos mientras no había escucha
+    if _cargado:
+        precargar()
+
+
+notificaciones.suscribir(CANAL, _al_notificar, al_reconectar=_al_reconectar)
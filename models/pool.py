@@ -0,0 +1,227 @@
+"""
+Pool de conexiones PostgreSQL por proceso.
+
+Cada worker de gunicorn crea su propio pool la primera vez que se pide una
+conexión (las conexiones de psycopg2 no se pueden compartir entre procesos).
+Las conexiones se prestan en orden LIFO para reutilizar siempre las más
+"calientes" y se verifican antes de entregarlas.
+"""
+import os
+import threading
+import time
+from collections import deque
+
+import psycopg2
+import psycopg2.extensions
+import psycopg2.extras
+
+
+class PoolAgotadoError(Exception):
+    """No se liberó ninguna conexión dentro del tiempo de espera."""
+
+
+class PoolConexiones:
+    def __init__(self, fabrica, minimo=1, maximo=10, timeout_espera=10.0,
+                 verificar_inactiva_seg=30.0):
+        """fabrica: función sin argumentos que abre una conexión psycopg2 nueva."""
+        self._fabrica = fabrica
+        self.minimo = max(0, minimo)
+        self.maximo = max(1, maximo, self.minimo)
+        self.timeout_espera = timeout_espera
+        self.verificar_inactiva_seg = verificar_inactiva_seg
+
+        self._cond = threading.Condition()
+        self._libres = deque()  # (conexion, monotonic del último uso)
+        self._en_uso = 0
+        self._cerrado = False
+
+        # Estadísticas
+        self._creadas = 0
+        self._descartadas = 0
+        self._prestamos = 0
+        self._esperas = 0
+        self._timeouts = 0
+        self._espera_total = 0.0
+        self._espera_max = 0.0
+
+        self._precalentar()
+
+    def _precalentar(self):
+        """Abrir las conexiones mínimas. Si la base no responde se abrirán bajo demanda."""
+        for _ in range(self.minimo):
+            try:
+                conn = self._crear()
+            except Exception as e:
+                print(f"Pool: no se pudo precalentar conexión: {e}")
+                return
+            with self._cond:
+                self._libres.append((conn, time.monotonic()))
+
+    def _crear(self):
+        conn = self._fabrica()
+        with self._cond:
+            self._creadas += 1
+        return conn
+
+    def _descartar(self, conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+        with self._cond:
+            self._descartadas += 1
+
+    def _saludable(self, conn, ultimo_uso):
+        """Verificar una conexión antes de prestarla."""
+        if conn.closed:
+            return False
+        if conn.get_transaction_status() != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+            return False
+        if time.monotonic() - ultimo_uso < self.verificar_inactiva_seg:
+            return True
+        # Conexión inactiva mucho tiempo: el servidor o un proxy pudo cerrarla
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except Exception:
+            return False
+
+    def obtener(self):
+        """Prestar una conexión; bloquea hasta timeout_espera si el pool está lleno."""
+        inicio = time.monotonic()
+        limite = inicio + self.timeout_espera
+        conn = None
+        ultimo_uso = None
+        espero = False
+
+        with self._cond:
+            while True:
+                if self._cerrado:
+                    raise PoolAgotadoError('El pool de conexiones está cerrado')
+                if self._libres:
+                    conn, ultimo_uso = self._libres.pop()
+                    break
+                if self._en_uso + len(self._libres) < self.maximo:
+                    break
+                restante = limite - time.monotonic()
+                if restante <= 0:
+                    self._timeouts += 1
+                    raise PoolAgotadoError(
+                        f'Sin conexiones libres tras {self.timeout_espera}s (máximo {self.maximo})'
+                    )
+                espero = True
+                self._cond.wait(restante)
+
+            self._en_uso += 1
+            self._prestamos += 1
+            espera = time.monotonic() - inicio
+            if espero:
+                self._esperas += 1
+            self._espera_total += espera
+            self._espera_max = max(self._espera_max, espera)
+
+        try:
+            if conn is not None and not self._saludable(conn, ultimo_uso):
+                self._descartar(conn)
+                conn = None
+            if conn is None:
+                conn = self._crear()
+            return conn
+        except Exception:
+            with self._cond:
+                self._en_uso -= 1
+                self._cond.notify()
+            raise
+
+    def devolver(self, conn, descartar=False):
+        """Regresar una conexión al pool, deshaciendo cualquier transacción abierta."""
+        if not descartar and not conn.closed:
+            try:
+                conn.rollback()
+                if conn.autocommit:
+                    conn.autocommit = False
+            except Exception:
+                descartar = True
+
+        if descartar or conn.closed or self._cerrado:
+            self._descartar(conn)
+            with self._cond:
+                self._en_uso -= 1
+                self._cond.notify()
+            return
+
+        with self._cond:
+            self._en_uso -= 1
+            self._libres.append((conn, time.monotonic()))
+            self._cond.notify()
+
+    def cerrar(self):
+        with self._cond:
+            self._cerrado = True
+            libres = [conn for conn, _ in self._libres]
+            self._libres.clear()
+            self._cond.notify_all()
+        for conn in libres:
+            self._descartar(conn)
+
+    def estadisticas(self):
+        """Estado actual del pool, útil para dimensionarlo bajo carga."""
+        with self._cond:
+            return {
+                'pid': os.getpid(),
+                'minimo': self.minimo,
+                'maximo': self.maximo,
+                'en_uso': self._en_uso,
+                'libres': len(self._libres),
+                'total': self._en_uso + len(self._libres),
+                'creadas': self._creadas,
+                'descartadas': self._descartadas,
+                'prestamos': self._prestamos,
+                'esperas': self._esperas,
+                'timeouts': self._timeouts,
+                'espera_promedio_ms': round(self._espera_total * 1000 / self._prestamos, 3) if self._prestamos else 0.0,
+                'espera_max_ms': round(self._espera_max * 1000, 3),
+            }
+
+
+class ConexionPool:
+    """Envoltura de una conexión prestada por el pool.
+
+    close() no cierra el socket: deshace la transacción pendiente (igual que
+    cerrar una conexión psycopg2) y la deja disponible. El resto de atributos se
+    delegan a la conexión real (también al asignarlos, p. ej. autocommit; el
+    pool lo restablece al recuperar la conexión). Acepta cursor(dictionary=True)
+    como atajo de RealDictCursor, que es la forma en que lo usan los
+    controladores.
+    """
+
+    def __init__(self, conn, al_cerrar):
+        self._conn = conn
+        self._al_cerrar = al_cerrar
+        self._cerrada = False
+
+    def cursor(self, *args, dictionary=False, **kwargs):
+        if dictionary:
+            kwargs.setdefault('cursor_factory', psycopg2.extras.RealDictCursor)
+        return self._conn.cursor(*args, **kwargs)
+
+    @property
+    def closed(self):
+        return self._cerrada or self._conn.closed
+
+    def close(self):
+        if self._cerrada:
+            return
+        self._cerrada = True
+        self._al_cerrar(self._conn)
+
+    def __getattr__(self, nombre):
+        return getattr(self._conn, nombre)
+
+    def __setattr__(self, nombre, valor):
+        if nombre.startswith('_'):
+            object.__setattr__(self, nombre, valor)
+        else:
+            setattr(self._conn, nombre, valor)
@@ -0,0 +1,124 @@
+"""
+Consultas y formato de las exportaciones del reporte de accesos.
+
+Las usan tanto el controlador (exportación en la petición) como el
+trabajador de reportes en segundo plano (trabajador_reportes.py), que no
+carga los controladores.
+"""
+from datetime import timedelta
+
+from models.filtros import Filtros, a_fecha
+
+ENCABEZADO_CSV = ['Fecha/Hora', 'Visitante', 'Identificación', 'Empresa',
+                  'Tipo', 'Autorizado', 'Guardia']
+
+
+def filtro_periodo(columna, tipo, fecha_inicio, fecha_fin):
+    """Filtro del periodo del reporte: el día de inicio (diario) o inicio..fin (mensual)"""
+    return Filtros().rango_dias(columna, fecha_inicio, fecha_inicio if tipo == 'diario' else fecha_fin)
+
+
+def nombre_archivo(tipo, fecha_inicio, fecha_fin, extension):
+    nombre = f"reporte_accesos_{tipo}_{fecha_inicio}"
+    if tipo == 'mensual':
+        nombre += f"_{fecha_fin}"
+    return f"{nombre}.{extension}"
+
+
+def contar_accesos(cursor, tipo, fecha_inicio, fecha_fin):
+    filtros = filtro_periodo('a.fecha_hora', tipo, fecha_inicio, fecha_fin)
+    cursor.execute(f"SELECT COUNT(*) FROM accesos a {filtros.where()}", filtros.params)
+    fila = cursor.fetchone()
+    return fila['count'] if isinstance(fila, dict) else fila[0]
+
+
+def dias_periodo(tipo, fecha_inicio, fecha_fin):
+    """(desde, hasta) como date, ambos inclusive."""
+    desde = a_fecha(fecha_inicio)
+    return desde, desde if tipo == 'diario' else a_fecha(fecha_fin)
+
+
+def resumen_periodo(cursor, tipo, fecha_inicio, fecha_fin):
+    """Totales del periodo desde el resumen por hora (accesos_por_hora), sin
+    recorrer accesos."""
+    desde, hasta = dias_periodo(tipo, fecha_inicio, fecha_fin)
+    cursor.execute("""
+        SELECT 
+            COALESCE(SUM(total), 0) as total_accesos,
+            COALESCE(SUM(total) FILTER (WHERE autorizado), 0) as accesos_autorizados,
+            COALESCE(SUM(total) FILTER (WHERE NOT autorizado), 0) as accesos_denegados,
+            COALESCE(SUM(total) FILTER (WHERE tipo = 'entrada'), 0) as total_entradas,
+            COALESCE(SUM(total) FILTER (WHERE tipo = 'salida'), 0) as total_salidas
+        FROM accesos_por_hora
+        WHERE hora >= %s AND hora < %s
+    """, (desde, hasta + timedelta(days=1)))
+    return cursor.fetchone()
+
+
+def accesos_por_dia(cursor, desde, hasta):
+    """Totales por día entre desde y hasta (inclusive), del más reciente al
+    más antiguo, agrupando el resumen por hora."""
+    cursor.execute("""
+        SELECT 
+            hora::DATE as fecha,
+            SUM(total) as total,
+            COALESCE(SUM(total) FILTER (WHERE tipo = 'entrada'), 0) as entradas,
+            COALESCE(SUM(total) FILTER (WHERE tipo = 'salida'), 0) as salidas,
+            COALESCE(SUM(total) FILTER (WHERE NOT autorizado), 0) as denegados
+        FROM accesos_por_hora
+        WHERE hora >= %s AND hora < %s
+        GROUP BY 1
+        HAVING SUM(total) <> 0
+        ORDER BY 1 DESC
+    """, (desde, hasta + timedelta(days=1)))
+    return cursor.fetchall()
+
+
+def consulta_csv(tipo, fecha_inicio, fecha_fin):
+    """(query, params) con las filas de la exportación CSV."""
+    filtros = filtro_periodo('a.fecha_hora', tipo, fecha_inicio, fecha_fin)
+    return f"""
+        SELECT 
+            a.fecha_hora,
+            v.nombre as visitante,
+            v.identificacion,
+            v.empresa,
+            a.tipo,
+            CASE WHEN a.autorizado THEN 'Sí' ELSE 'No' END as autorizado,
+            u.nombre as guardia 
+        FROM accesos a 
+        LEFT JOIN visitantes v ON a.visitante_id = v.id 
+        LEFT JOIN usuarios u ON a.usuario_id = u.id 
+        {filtros.where()}
+        ORDER BY a.fecha_hora DESC
+    """, filtros.params
+
+
+def consulta_pdf(tipo, fecha_inicio, fecha_fin):
+    """(query, params) con las filas de la exportación PDF."""
+    filtros = filtro_periodo('a.fecha_hora', tipo, fecha_inicio, fecha_fin)
+    return f"""
+        SELECT 
+            a.fecha_hora,
+            v.nombre as visitante,
+            a.tipo,
+            a.autorizado,
+            u.nombre as guardia 
+        FROM accesos a 
+        LEFT JOIN visitantes v ON a.visitante_id = v.id 
+        LEFT JOIN usuarios u ON a.usuario_id = u.id 
+        {filtros.where()}
+        ORDER BY a.fecha_hora DESC
+    """, filtros.params
+
+
+def fila_csv(acceso):
+    return [
+        acceso['fecha_hora'].strftime('%Y-%m-%d %H:%M'),
+        acceso['visitante'] or 'N/A',
+        acceso['identificacion'] or 'N/A',
+        acceso['empresa'] or 'N/A',
+        acceso['tipo'].capitalize(),
+        acceso['autorizado'],
+        acceso['guardia'] or 'Sistema'
+    ]
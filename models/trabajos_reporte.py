@@ -0,0 +1,295 @@
+"""
+Trabajos de exportación de reportes (PDF/CSV) en segundo plano.
+
+La web registra el trabajo en trabajos_reporte con encolar() y avisa por
+NOTIFY en CANAL. trabajador_reportes.py lo reclama con FOR UPDATE SKIP
+LOCKED, lo ejecuta en un proceso de su pool (ejecutar) y deja el archivo en
+REPORTES_DIRECTORIO, de donde se descarga hasta que vence (REPORTES_TTL_HORAS).
+Mientras tanto el trabajo informa su avance en la columna progreso.
+
+Dos pedidos con los mismos parámetros comparten el trabajo vigente (pendiente,
+en proceso o terminado sin vencer): los distingue la columna clave, con un
+índice único parcial. Un terminado cuyo periodo llega al día en que se pidió
+no se reutiliza, porque le faltarían los accesos posteriores.
+"""
+import glob
+import hashlib
+import os
+import time
+
+import config as app_config
+from models import notificaciones, reportes
+
+CANAL = 'trabajos_reporte'
+FORMATOS = ('pdf', 'csv')
+ERROR_SIN_TRABAJADOR = 'Ningún trabajador tomó el reporte a tiempo'
+
+
+def _conectar():
+    from models.database import Database
+    return Database().conectar()
+
+
+def clave(tipo, formato, fecha_inicio, fecha_fin):
+    """Identificador de los parámetros del reporte (el diario ignora fecha_fin)."""
+    if tipo == 'diario':
+        fecha_fin = fecha_inicio
+    return hashlib.sha256(f"{tipo}|{formato}|{fecha_inicio}|{fecha_fin}".encode('utf-8')).hexdigest()
+
+
+def ruta(archivo):
+    return os.path.join(app_config.REPORTES_DIRECTORIO, archivo)
+
+
+def _borrar_archivos(archivos):
+    for archivo in archivos:
+        if not archivo:
+            continue
+        try:
+            os.remove(ruta(archivo))
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            print(f"Error al borrar reporte generado {archivo}: {e}")
+
+
+def encolar(tipo, formato, fecha_inicio, fecha_fin, usuario_id=None):
+    """id del trabajo vigente con estos parámetros, o de uno nuevo; None si falla."""
+    if tipo == 'diario':
+        fecha_fin = fecha_inicio
+    clave_trabajo = clave(tipo, formato, fecha_inicio, fecha_fin)
+    conn = _conectar()
+    if not conn:
+        return None
+    try:
+        cursor = conn.cursor()
+        # Un trabajo terminado y vencido ya no cuenta como vigente, ni uno cuyo
+        # periodo incluía su propio día (se generó con el día a medias)
+        cursor.execute("""
+            DELETE FROM trabajos_reporte
+            WHERE clave = %s AND estado = 'terminado'
+              AND (expira < NOW() OR fecha_fin >= fecha_creacion::DATE)
+            RETURNING archivo
+        """, (clave_trabajo,))
+        vencidos = [fila[0] for fila in cursor.fetchall()]
+        # Ni un pendiente que nadie tomó (trabajador detenido): se cierra
+        # como error para que este pedido cree uno nuevo
+        cursor.execute("""
+            UPDATE trabajos_reporte
+            SET estado = 'error', error = %s, fecha_fin_proceso = NOW()
+            WHERE clave = %s AND estado = 'pendiente'
+              AND fecha_creacion < NOW() - make_interval(secs => %s)
+        """, (ERROR_SIN_TRABAJADOR, clave_trabajo, app_config.REPORTES_TIMEOUT_SEG))
+
+        cursor.execute("""
+            INSERT INTO trabajos_reporte (clave, tipo, formato, fecha_inicio, fecha_fin, usuario_id)
+            VALUES (%s, %s, %s, %s, %s, %s)
+            ON CONFLICT (clave) WHERE estado IN ('pendiente', 'procesando', 'terminado')
+            DO UPDATE SET clave = EXCLUDED.clave
+            RETURNING id
+        """, (clave_trabajo, tipo, formato, fecha_inicio, fecha_fin, usuario_id))
+        trabajo_id = cursor.fetchone()[0]
+        notificaciones.notificar(cursor, CANAL, trabajo_id)
+        conn.commit()
+        cursor.close()
+        _borrar_archivos(vencidos)
+        return trabajo_id
+    except Exception as e:
+        print(f"Error al encolar reporte: {e}")
+        conn.rollback()
+        return None
+    finally:
+        conn.close()
+
+
+def obtener(trabajo_id):
+    """Trabajo como diccionario, o None si no existe (o no hay conexión)."""
+    conn = _conectar()
+    if not conn:
+        return None
+    try:
+        cursor = conn.cursor(dictionary=True)
+        cursor.execute("""
+            SELECT id, tipo, formato, fecha_inicio, fecha_fin, estado, progreso,
+                   total_filas, archivo, error, fecha_creacion, fecha_fin_proceso, expira
+            FROM trabajos_reporte
+            WHERE id = %s
+        """, (trabajo_id,))
+        trabajo = cursor.fetchone()
+        cursor.close()
+        return trabajo
+    except Exception as e:
+        print(f"Error al consultar trabajo de reporte: {e}")
+        return None
+    finally:
+        conn.close()
+
+
+# ==================== LADO DEL TRABAJADOR ====================
+
+def reclamar():
+    """Pasar a 'procesando' el pendiente más antiguo y devolver su id (o None)."""
+    conn = _conectar()
+    if not conn:
+        return None
+    try:
+        cursor = conn.cursor()
+        cursor.execute("""
+            UPDATE trabajos_reporte
+            SET estado = 'procesando', fecha_inicio_proceso = NOW(), progreso = 0
+            WHERE id = (
+                SELECT id FROM trabajos_reporte
+                WHERE estado = 'pendiente'
+                ORDER BY id
+                FOR UPDATE SKIP LOCKED
+                LIMIT 1
+            )
+            RETURNING id
+        """)
+        fila = cursor.fetchone()
+        conn.commit()
+        cursor.close()
+        return fila[0] if fila else None
+    except Exception as e:
+        print(f"Error al reclamar trabajo de reporte: {e}")
+        conn.rollback()
+        return None
+    finally:
+        conn.close()
+
+
+def _con_progreso(filas, total, avisar):
+    """Pasar las filas avisando el porcentaje cada ~2% (sin llegar a 100)."""
+    paso = max(total // 50, 1000)
+    for numero, fila in enumerate(filas, 1):
+        yield fila
+        if numero % paso == 0 and total:
+            avisar(min(numero * 100 // total, 99))
+
+
+def ejecutar(trabajo_id):
+    """Generar el archivo del trabajo (se ejecuta en un proceso del pool)."""
+    from utils.flujo import bloques_csv
+    from utils.pdf_utils import generar_pdf_reporte
+
+    conn = _conectar()
+    conn_progreso = _conectar()
+    if not conn or not conn_progreso:
+        print(f"Trabajo de reporte {trabajo_id}: sin conexión a la base de datos")
+        return
+    conn_progreso.autocommit = True
+    progreso = conn_progreso.cursor()
+    parcial = None
+    try:
+        cursor = conn.cursor(dictionary=True)
+        cursor.execute("SELECT * FROM trabajos_reporte WHERE id = %s", (trabajo_id,))
+        trabajo = cursor.fetchone()
+        tipo, formato = trabajo['tipo'], trabajo['formato']
+        fecha_inicio, fecha_fin = trabajo['fecha_inicio'], trabajo['fecha_fin']
+
+        total = reportes.contar_accesos(cursor, tipo, fecha_inicio, fecha_fin)
+        cursor.close()
+        progreso.execute("UPDATE trabajos_reporte SET total_filas = %s WHERE id = %s", (total, trabajo_id))
+
+        def avisar(porcentaje):
+            progreso.execute("UPDATE trabajos_reporte SET progreso = %s WHERE id = %s", (porcentaje, trabajo_id))
+
+        consulta = reportes.consulta_pdf if formato == 'pdf' else reportes.consulta_csv
+        query, params = consulta(tipo, fecha_inicio, fecha_fin)
+        filas = conn.cursor(name=f'trabajo_reporte_{trabajo_id}', dictionary=True)
+        filas.itersize = app_config.FLUJO_FILAS_POR_LOTE
+        filas.execute(query, params)
+        accesos = _con_progreso(filas, total, avisar)
+
+        archivo = f"{trabajo_id}_{trabajo['clave'][:16]}.{formato}"
+        parcial = ruta(archivo) + '.parcial'
+        with open(parcial, 'wb') as destino:
+            if formato == 'pdf':
+                generar_pdf_reporte(accesos, tipo, fecha_inicio, fecha_fin,
+                                    f"Reporte de Accesos - {tipo.capitalize()}",
+                                    total=total, destino=destino)
+            else:
+                for bloque in bloques_csv((reportes.fila_csv(a) for a in accesos), reportes.ENCABEZADO_CSV):
+                    destino.write(bloque)
+        filas.close()
+        os.replace(parcial, ruta(archivo))
+        parcial = None
+
+        progreso.execute("""
+            UPDATE trabajos_reporte
+            SET estado = 'terminado', progreso = 100, archivo = %s, fecha_fin_proceso = NOW(),
+                expira = NOW() + make_interval(hours => %s)
+            WHERE id = %s AND estado = 'procesando'
+        """, (archivo, app_config.REPORTES_TTL_HORAS, trabajo_id))
+        if progreso.rowcount == 0:
+            # limpiar() lo cerró por tiempo (o se borró) mientras se generaba:
+            # ninguna fila apunta al archivo, así que no se conserva
+            print(f"Trabajo de reporte {trabajo_id} ya no estaba en proceso; se descarta el archivo")
+            _borrar_archivos([archivo])
+    except Exception as e:
+        print(f"Error al generar trabajo de reporte {trabajo_id}: {e}")
+        try:
+            progreso.execute("""
+                UPDATE trabajos_reporte
+                SET estado = 'error', error = %s, fecha_fin_proceso = NOW()
+                WHERE id = %s AND estado = 'procesando'
+            """, (str(e)[:500], trabajo_id))
+        except Exception as e2:
+            print(f"Error al registrar la falla del trabajo {trabajo_id}: {e2}")
+        if parcial:
+            try:
+                os.remove(parcial)
+            except OSError:
+                pass
+    finally:
+        progreso.close()
+        conn.close()
+        conn_progreso.close()
+
+
+def limpiar():
+    """Borrar trabajos vencidos con sus archivos, cerrar como error los que
+    quedaron 'procesando' o 'pendiente' más de REPORTES_TIMEOUT_SEG y los
+    archivos parciales abandonados. Devuelve cuántos trabajos se borraron."""
+    conn = _conectar()
+    if not conn:
+        return 0
+    try:
+        cursor = conn.cursor()
+        cursor.execute("""
+            DELETE FROM trabajos_reporte
+            WHERE (estado = 'terminado' AND expira < NOW())
+               OR (estado = 'error' AND fecha_fin_proceso < NOW() - make_interval(hours => %s))
+            RETURNING archivo
+        """, (app_config.REPORTES_TTL_HORAS,))
+        vencidos = [fila[0] for fila in cursor.fetchall()]
+        cursor.execute("""
+            UPDATE trabajos_reporte
+            SET estado = 'error', error = 'Tiempo de proceso agotado', fecha_fin_proceso = NOW()
+            WHERE estado = 'procesando'
+              AND fecha_inicio_proceso < NOW() - make_interval(secs => %s)
+        """, (app_config.REPORTES_TIMEOUT_SEG,))
+        cursor.execute("""
+            UPDATE trabajos_reporte
+            SET estado = 'error', error = %s, fecha_fin_proceso = NOW()
+            WHERE estado = 'pendiente'
+              AND fecha_creacion < NOW() - make_interval(secs => %s)
+        """, (ERROR_SIN_TRABAJADOR, app_config.REPORTES_TIMEOUT_SEG))
+        conn.commit()
+        cursor.close()
+    except Exception as e:
+        print(f"Error al limpiar trabajos de reporte: {e}")
+        conn.rollback()
+        return 0
+    finally:
+        conn.close()
+
+    _borrar_archivos(vencidos)
+    limite = time.time() - app_config.REPORTES_TIMEOUT_SEG
+    for parcial in glob.glob(ruta('*.parcial')):
+        try:
+            if os.path.getmtime(parcial) < limite:
+                os.remove(parcial)
+        except OSError:
+            pass
+    return len(vencidos)
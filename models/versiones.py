@@ -0,0 +1,85 @@
+"""
+Contadores de versión baratos (tabla versiones).
+
+Cada clave identifica un conjunto de datos ('permisos', ...). Quien modifica
+esos datos llama a incrementar() dentro de su transacción; los lectores
+comparan la versión que tienen guardada con obtener(), que se sirve desde
+memoria y se refresca por NOTIFY o, como respaldo, tras VERSIONES_TTL.
+Una carga durante la que llegó un aviso no se guarda (como en
+cache_permisos): podría ser anterior al cambio avisado.
+"""
+import threading
+import time
+
+import config as app_config
+from models import notificaciones
+
+CANAL = 'versiones_cambio'
+
+_lock = threading.Lock()
+_valores = {}
+_vencidas = set()  # claves avisadas por NOTIFY desde la última carga
+_expira = 0.0
+_generacion = 0  # se incrementa con cada aviso
+
+
+def _cargar():
+    from models.database import Database
+    conn = Database().conectar()
+    if not conn:
+        return None
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT clave, valor FROM versiones")
+            return dict(cursor.fetchall())
+    except Exception as e:
+        print(f"Error al cargar versiones: {e}")
+        return None
+    finally:
+        conn.close()
+
+
+def obtener(clave):
+    """Versión actual de la clave, o None si no se pudo consultar."""
+    global _valores, _expira
+    notificaciones.iniciar_escucha()
+    with _lock:
+        if time.monotonic() < _expira and clave not in _vencidas:
+            return _valores.get(clave, 0)
+        generacion = _generacion
+
+    valores = _cargar()
+    if valores is None:
+        return None
+    with _lock:
+        if generacion == _generacion:
+            _valores = valores
+            _vencidas.clear()
+            _expira = time.monotonic() + app_config.VERSIONES_TTL
+        return valores.get(clave, 0)
+
+
+def invalidar_local(payload=None):
+    """Marcar vencida la clave avisada; sin clave (reconexión), todas."""
+    global _expira, _generacion
+    with _lock:
+        _generacion += 1
+        if payload:
+            _vencidas.add(payload)
+        else:
+            _expira = 0.0
+
+
+def incrementar(cursor, clave):
+    """Incrementar la versión de la clave dentro de la transacción del cursor."""
+    cursor.execute("""
+        INSERT INTO versiones (clave, valor, fecha_actualizacion)
+        VALUES (%s, 1, NOW())
+        ON CONFLICT (clave) DO UPDATE
+        SET valor = versiones.valor + 1, fecha_actualizacion = NOW()
+    """, (clave,))
+    notificaciones.notificar(cursor, CANAL, clave)
+    invalidar_local(clave)
+
+
+notificaciones.suscribir(CANAL, invalidar_local, al_reconectar=invalidar_local)
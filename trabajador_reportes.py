@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Trabajador de reportes en segundo plano.
+
+Toma los trabajos pendientes de trabajos_reporte (ver models/trabajos_reporte.py)
+y los genera en un pool de REPORTES_PROCESOS procesos, para que los PDF y CSV
+grandes no ocupen un worker de gunicorn ni choquen con el timeout del proxy.
+Despierta con NOTIFY en el canal 'trabajos_reporte' (y revisa la tabla cada
+pocos segundos por si se perdió un aviso) y borra periódicamente los archivos
+vencidos.
+
+La web solo encola trabajos con REPORTES_EN_SEGUNDO_PLANO=true (por omisión
+los genera dentro de la petición). Los archivos se guardan en
+REPORTES_DIRECTORIO, que debe ser el mismo disco que ve la aplicación web
+para poder descargarlos.
+
+Uso (desde la raíz del proyecto):
+    python trabajador_reportes.py
+    python trabajador_reportes.py --procesos 4
+"""
+import argparse
+import multiprocessing
+import os
+import select
+import time
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+import config as app_config
+from models import trabajos_reporte
+from models.database import Database
+
+ESPERA_SEG = 5  # revisión de la tabla aunque no lleguen avisos
+LIMPIEZA_SEG = 300
+
+
+def _escuchar():
+    """Conexión propia (fuera del pool) en LISTEN sobre el canal de trabajos."""
+    conn = Database().abrir_conexion()
+    conn.autocommit = True
+    with conn.cursor() as cursor:
+        cursor.execute(f"LISTEN {trabajos_reporte.CANAL}")
+    return conn
+
+
+def _esperar_aviso(escucha, segundos):
+    """Esperar un NOTIFY hasta segundos. Devuelve la conexión de escucha (se
+    reabre si se cayó; None si no se pudo)."""
+    try:
+        if escucha is None:
+            escucha = _escuchar()
+        if select.select([escucha], [], [], segundos)[0]:
+            escucha.poll()
+            escucha.notifies.clear()
+        return escucha
+    except Exception as e:
+        print(f"Error en la escucha de trabajos de reporte: {e}")
+        if escucha is not None:
+            try:
+                escucha.close()
+            except Exception:
+                pass
+        time.sleep(segundos)
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Trabajador de reportes en segundo plano')
+    parser.add_argument('--procesos', type=int, default=app_config.REPORTES_PROCESOS)
+    args = parser.parse_args()
+
+    os.makedirs(app_config.REPORTES_DIRECTORIO, exist_ok=True)
+    print(f"Trabajador de reportes: {args.procesos} procesos, archivos en {app_config.REPORTES_DIRECTORIO}")
+
+    # spawn: los procesos hijos no heredan las conexiones abiertas de este
+    contexto = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=args.procesos, mp_context=contexto) as pool:
+        en_curso = set()
+        escucha = None
+        proxima_limpieza = 0.0
+        while True:
+            if time.monotonic() >= proxima_limpieza:
+                borrados = trabajos_reporte.limpiar()
+                if borrados:
+                    print(f"Reportes vencidos borrados: {borrados}")
+                proxima_limpieza = time.monotonic() + LIMPIEZA_SEG
+
+            while len(en_curso) < args.procesos:
+                trabajo_id = trabajos_reporte.reclamar()
+                if trabajo_id is None:
+                    break
+                en_curso.add(pool.submit(trabajos_reporte.ejecutar, trabajo_id))
+
+            if len(en_curso) >= args.procesos:
+                # Pool lleno: esperar a que termine alguno antes de reclamar más
+                _, en_curso = wait(en_curso, timeout=ESPERA_SEG, return_when=FIRST_COMPLETED)
+            else:
+                escucha = _esperar_aviso(escucha, ESPERA_SEG)
+                en_curso = {futuro for futuro in en_curso if not futuro.done()}
+
+
+if __name__ == '__main__':
+    main()
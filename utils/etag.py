@@ -0,0 +1,115 @@
+"""
+Peticiones GET condicionales (ETag / 304 Not Modified) para listados.
+
+La ETag de una página se arma con las versiones de los datos que muestra
+(tabla versiones, que incrementan los triggers de cada tabla), el usuario de
+la sesión y la URL pedida. Las versiones se leen de memoria (models/versiones),
+así que si el navegador repite la ETag en If-None-Match se responde 304 sin
+consultar la base ni renderizar la plantilla.
+
+Las inserciones en accesos y alertas no incrementan versiones para no
+serializar la puerta en una sola fila; para esas tablas se lee de lo ya
+confirmado el id máximo y cuántas filas hay entre los últimos VENTANA_IDS
+ids (dos lecturas sobre la clave primaria). El conteo cubre el lote que
+confirma tarde con ids menores que el máximo ya visto; el último valor de la
+secuencia no sirve porque nextval no es transaccional.
+
+Uso (debajo de los decoradores de autenticación):
+    @login_required
+    @permiso_requerido(VER_USUARIOS)
+    @condicional('usuarios', 'roles')
+    def listar_usuarios(): ...
+"""
+import hashlib
+from datetime import date
+from functools import wraps
+
+from flask import request, session, make_response, get_flashed_messages
+
+from models import versiones
+from models.database import Database
+
+# La barra de navegación muestra el nombre y el rol del usuario y depende de
+# sus permisos, así que toda página depende también de estas versiones
+_CLAVES_COMUNES = ('permisos', 'usuarios', 'roles')
+
+# Ids recientes que se cuentan: debe cubrir los que pueden estar asignados en
+# transacciones aún sin confirmar (varios lotes de torniquete de 1000 eventos)
+VENTANA_IDS = 10000
+
+
+def _marcas(tablas):
+    """[max(id), filas recientes] de cada tabla, leído de lo ya confirmado con
+    la conexión de la petición (antes de las consultas de la página)."""
+    conn = Database().conectar()
+    if not conn:
+        return None
+    try:
+        cursor = conn.cursor()
+        cursor.execute("SELECT " + ", ".join(
+            f"(SELECT max(id) FROM {tabla}), "
+            f"(SELECT count(*) FROM {tabla} WHERE id > (SELECT max(id) FROM {tabla}) - {VENTANA_IDS})"
+            for tabla in tablas
+        ))
+        fila = cursor.fetchone()
+        cursor.close()
+        return list(fila)
+    except Exception as e:
+        print(f"Error al leer el último id para ETag: {e}")
+        return None
+    finally:
+        conn.close()
+
+
+def calcular_etag(claves, tablas=(), diario=False):
+    """ETag de la página actual, o None si no se pudo leer alguna versión."""
+    partes = [request.full_path, session.get('usuario_id')]
+    for clave in _CLAVES_COMUNES + tuple(c for c in claves if c not in _CLAVES_COMUNES):
+        valor = versiones.obtener(clave)
+        if valor is None:
+            return None
+        partes.append(f"{clave}={valor}")
+    if tablas:
+        marcas = _marcas(tablas)
+        if marcas is None:
+            return None
+        partes.extend(marcas)
+    if diario:
+        # Páginas con datos "de hoy" o "últimos días" cambian al cambiar la fecha
+        partes.append(date.today().isoformat())
+    return hashlib.sha1(repr(partes).encode('utf-8')).hexdigest()
+
+
+def condicional(*claves, tablas=(), diario=False):
+    """Decorador: responder 304 si la ETag enviada por el navegador sigue vigente.
+
+    claves: versiones de las que depende la página. tablas: tablas de inserción
+    frecuente cuyas filas nuevas también cuentan. diario: la página cambia
+    además de un día para otro.
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            # Con mensajes flash pendientes la página no es cacheable
+            if request.method != 'GET' or session.get('_flashes'):
+                return f(*args, **kwargs)
+
+            etag = calcular_etag(claves, tablas, diario)
+            if etag is None:
+                return f(*args, **kwargs)
+
+            if request.if_none_match.contains_weak(etag):
+                respuesta = make_response('', 304)
+            else:
+                respuesta = make_response(f(*args, **kwargs))
+                # No se etiquetan redirecciones ni páginas que muestran mensajes
+                # flash (p. ej. el listado vacío tras un error de conexión)
+                if (respuesta.status_code != 200 or session.get('_flashes')
+                        or get_flashed_messages()):
+                    return respuesta
+            respuesta.set_etag(etag, weak=True)
+            respuesta.headers['Cache-Control'] = 'private, no-cache'
+            respuesta.vary.add('Cookie')
+            return respuesta
+        return decorated_function
+    return decorator
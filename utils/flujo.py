@@ -0,0 +1,121 @@
+"""
+Respuestas HTML en flujo para listados largos.
+
+En lugar de fetchall() + render_template(), que materializan todas las filas y
+todo el HTML antes de enviar el primer byte, las filas se leen de un cursor
+con nombre (del lado del servidor, por lotes de FLUJO_FILAS_POR_LOTE) y la
+plantilla se genera por partes con stream_with_context. La memoria del worker
+queda acotada por el lote y no por el rango consultado.
+
+Uso:
+    filas = filas_en_flujo(conn, query, params, 'historial_accesos')
+    return render_en_flujo('acceso/listar.html', accesos=filas, ...)
+
+La conexión queda abierta mientras se envía la respuesta; filas_en_flujo la
+cierra al terminar de recorrer el cursor. csv_en_flujo hace lo mismo para
+exportaciones CSV, con compresión gzip opcional, y archivo_en_flujo para
+descargar un archivo temporal ya generado (PDF).
+"""
+import csv
+import io
+import zlib
+
+from flask import Response, current_app, stream_with_context
+
+import config as app_config
+
+# Fragmentos de plantilla que se juntan antes de cada envío al cliente
+FRAGMENTOS_POR_ENVIO = 100
+
+# Filas de CSV que se juntan antes de cada envío al cliente
+FILAS_CSV_POR_ENVIO = 500
+
+
+def filas_en_flujo(conn, query, params, nombre):
+    """Ejecutar query en un cursor con nombre y devolver un generador de filas
+    (diccionarios). Los errores de la consulta se lanzan aquí; los que ocurran
+    durante el recorrido cortan el listado y se registran."""
+    cursor = conn.cursor(name=nombre, dictionary=True)
+    cursor.itersize = app_config.FLUJO_FILAS_POR_LOTE
+    cursor.execute(query, params)
+
+    def generar():
+        try:
+            yield from cursor
+        except Exception as e:
+            print(f"Error al leer filas de {nombre}: {e}")
+        finally:
+            cursor.close()
+            conn.close()
+    return generar()
+
+
+def render_en_flujo(plantilla, **contexto):
+    """Como render_template, pero enviando el HTML a medida que se genera."""
+    app = current_app._get_current_object()
+    app.update_template_context(contexto)
+    flujo = app.jinja_env.get_template(plantilla).stream(contexto)
+    flujo.enable_buffering(FRAGMENTOS_POR_ENVIO)
+    return Response(stream_with_context(flujo), mimetype='text/html')
+
+
+def bloques_csv(filas, encabezados, comprimir=False):
+    """CSV (UTF-8 con BOM, para Excel) de filas (listas), en bloques de bytes
+    de FILAS_CSV_POR_ENVIO filas. Con comprimir los bloques van en gzip."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    compresor = zlib.compressobj(6, zlib.DEFLATED, 31) if comprimir else None
+
+    def vaciar():
+        datos = buffer.getvalue().encode('utf-8')
+        buffer.seek(0)
+        buffer.truncate()
+        return compresor.compress(datos) if compresor else datos
+
+    buffer.write('\ufeff')
+    writer.writerow(encabezados)
+    for numero, fila in enumerate(filas, 1):
+        writer.writerow(fila)
+        if numero % FILAS_CSV_POR_ENVIO == 0:
+            datos = vaciar()
+            if datos:
+                yield datos
+    datos = vaciar()
+    if compresor:
+        datos += compresor.flush()
+    if datos:
+        yield datos
+
+
+def csv_en_flujo(filas, encabezados, nombre_archivo, comprimir=False):
+    """Respuesta CSV escrita a medida que llegan las filas (listas). Con
+    comprimir se envía con Content-Encoding: gzip."""
+    respuesta = Response(stream_with_context(bloques_csv(filas, encabezados, comprimir)),
+                         mimetype='text/csv')
+    respuesta.headers['Content-Disposition'] = f'attachment; filename="{nombre_archivo}"'
+    if comprimir:
+        respuesta.headers['Content-Encoding'] = 'gzip'
+        respuesta.vary.add('Accept-Encoding')
+    return respuesta
+
+
+def archivo_en_flujo(archivo, nombre_archivo, mimetype, tamano_bloque=64 * 1024):
+    """Descargar un archivo temporal ya escrito (p. ej. un SpooledTemporaryFile)
+    por bloques, cerrándolo al terminar."""
+    largo = archivo.tell()
+    archivo.seek(0)
+
+    def generar():
+        try:
+            while True:
+                bloque = archivo.read(tamano_bloque)
+                if not bloque:
+                    break
+                yield bloque
+        finally:
+            archivo.close()
+
+    respuesta = Response(generar(), mimetype=mimetype)
+    respuesta.headers['Content-Disposition'] = f'attachment; filename="{nombre_archivo}"'
+    respuesta.content_length = largo
+    return respuesta
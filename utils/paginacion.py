@@ -0,0 +1,59 @@
+"""Paginación por cursor (keyset) sobre (fecha, id).
+
+En lugar de OFFSET, cada página se pide a partir de la última fila vista:
+WHERE (fecha, id) < (%s, %s) ORDER BY fecha DESC, id DESC LIMIT n. Con un
+índice sobre (fecha DESC, id DESC) el costo no depende de cuántas filas haya
+antes, y el cursor viaja en la URL como 'fecha_iso,id'.
+"""
+from datetime import datetime
+
+
+def codificar_cursor(fecha, id_):
+    return f"{fecha.isoformat()},{id_}"
+
+
+def decodificar_cursor(texto):
+    """(fecha, id) a partir del cursor de la URL, o None si no es válido."""
+    if not texto:
+        return None
+    fecha, _, id_ = texto.rpartition(',')
+    try:
+        return datetime.fromisoformat(fecha), int(id_)
+    except ValueError:
+        return None
+
+
+def condicion_keyset(columna_fecha, columna_id, despues=None, antes=None):
+    """Fragmento WHERE, parámetros y ORDER BY para la página pedida.
+
+    despues: cursor de la última fila de la página actual (página siguiente,
+    filas más antiguas). antes: cursor de la primera fila (página anterior).
+    """
+    if antes:
+        return (f" AND ({columna_fecha}, {columna_id}) > (%s, %s)", list(antes),
+                f" ORDER BY {columna_fecha} ASC, {columna_id} ASC")
+    orden = f" ORDER BY {columna_fecha} DESC, {columna_id} DESC"
+    if despues:
+        return f" AND ({columna_fecha}, {columna_id}) < (%s, %s)", list(despues), orden
+    return "", [], orden
+
+
+def armar_pagina(filas, por_pagina, despues=None, antes=None, columna_fecha='fecha_hora', columna_id='id'):
+    """Recortar filas (pedidas con LIMIT por_pagina + 1) y calcular los cursores.
+
+    Devuelve (filas_en_orden_descendente, cursor_anterior, cursor_siguiente);
+    un cursor es None si no hay página en esa dirección.
+    """
+    hay_mas = len(filas) > por_pagina
+    filas = list(filas[:por_pagina])
+    if antes:
+        filas.reverse()
+    if not filas:
+        return filas, None, None
+
+    primera, ultima = filas[0], filas[-1]
+    cursor_anterior = codificar_cursor(primera[columna_fecha], primera[columna_id])
+    cursor_siguiente = codificar_cursor(ultima[columna_fecha], ultima[columna_id])
+    if antes:
+        return filas, (cursor_anterior if hay_mas else None), cursor_siguiente
+    return filas, (cursor_anterior if despues else None), (cursor_siguiente if hay_mas else None)
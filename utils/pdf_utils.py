@@ -1,92 +1,140 @@
 from reportlab.lib.pagesizes import letter, A4
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
+from reportlab.platypus import SimpleDocTemplate, Table, LongTable, TableStyle, Paragraph, Spacer
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.lib import colors
 from reportlab.lib.units import inch
-from reportlab.pdfbase import pdfmetrics
-from reportlab.pdfbase.ttfonts import TTFont
+from reportlab.pdfgen import canvas as pdf_canvas
 from io import BytesIO
 from datetime import datetime
+from itertools import islice
 
-def generar_pdf_reporte(accesos, tipo_reporte, fecha_inicio, fecha_fin, titulo="Reporte de Accesos"):
-    """Generar PDF del reporte de accesos"""
-    
-    # Crear buffer para el PDF
-    buffer = BytesIO()
-    
-    # Crear documento
-    doc = SimpleDocTemplate(buffer, pagesize=A4, topMargin=30)
-    
-    # Lista de elementos del PDF
-    elements = []
-    
-    # Estilos
-    styles = getSampleStyleSheet()
-    title_style = ParagraphStyle(
-        'CustomTitle',
-        parent=styles['Heading1'],
-        fontSize=16,
-        spaceAfter=30,
-        alignment=1  # Centrado
-    )
-    
-    # Título
-    title = Paragraph(titulo, title_style)
-    elements.append(title)
-    
-    # Información del reporte
+# Estilos compartidos: se arman una vez por proceso y no en cada reporte.
+# Solo se usan las fuentes base (Helvetica), que no hace falta registrar
+ESTILOS = getSampleStyleSheet()
+
+ESTILO_TITULO_REPORTE = ParagraphStyle(
+    'CustomTitle',
+    parent=ESTILOS['Heading1'],
+    fontSize=16,
+    spaceAfter=30,
+    alignment=1  # Centrado
+)
+
+ENCABEZADO_ACCESOS = ['Fecha/Hora', 'Visitante', 'Tipo', 'Autorizado', 'Guardia']
+ANCHOS_ACCESOS = [1.5*inch, 2*inch, 0.8*inch, 0.8*inch, 1.5*inch]
+ESTILO_TABLA_ACCESOS = TableStyle([
+    ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
+    ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+    ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+    ('FONTSIZE', (0, 0), (-1, 0), 10),
+    ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+    ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
+    ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
+    ('FONTSIZE', (0, 1), (-1, -1), 8),
+    ('GRID', (0, 0), (-1, -1), 1, colors.black)
+])
+
+# Márgenes del reporte de accesos (los de SimpleDocTemplate con topMargin=30)
+MARGEN = inch
+MARGEN_SUPERIOR = 30
+
+_alturas_accesos = None  # (alto del encabezado, alto de una fila), medido una vez
+
+
+def _alturas_tabla_accesos():
+    """Alto del encabezado y de cada fila de la tabla de accesos. Las celdas
+    son texto de una línea, así que todas las filas miden lo mismo."""
+    global _alturas_accesos
+    if _alturas_accesos is None:
+        muestra = Table([ENCABEZADO_ACCESOS, ['2000-01-01 00:00', 'X', 'Entrada', 'Sí', 'X']],
+                        colWidths=ANCHOS_ACCESOS)
+        muestra.setStyle(ESTILO_TABLA_ACCESOS)
+        muestra.wrap(A4[0], A4[1])
+        _alturas_accesos = (muestra._rowHeights[0], muestra._rowHeights[1])
+    return _alturas_accesos
+
+
+def _fila_acceso(acceso):
+    return [
+        acceso['fecha_hora'].strftime('%Y-%m-%d %H:%M'),
+        acceso.get('visitante') or 'N/A',
+        acceso['tipo'].capitalize(),
+        'Sí' if acceso['autorizado'] else 'No',
+        acceso.get('guardia') or 'Sistema'
+    ]
+
+
+def _dibujar(canvas, flowable, x, y, ancho):
+    """Dibujar flowable con su borde superior en y; devuelve la y de su borde inferior."""
+    _, alto = flowable.wrapOn(canvas, ancho, y)
+    flowable.drawOn(canvas, x, y - alto)
+    return y - alto
+
+
+def generar_pdf_reporte(accesos, tipo_reporte, fecha_inicio, fecha_fin, titulo="Reporte de Accesos",
+                        total=None, destino=None):
+    """Generar PDF del reporte de accesos
+
+    accesos puede ser una lista o un iterable de filas (p. ej. un cursor del
+    servidor); en ese caso total debe indicar cuántas son. Las filas se
+    reparten en una LongTable por página, con su propio encabezado, en lugar
+    de una sola tabla que reportlab tendría que partir una y otra vez.
+
+    Con destino (un archivo abierto en modo binario) el PDF se escribe ahí y
+    no se devuelve nada; sin destino se devuelven los bytes.
+    """
+    if total is None:
+        total = len(accesos)
+    
+    salida = destino if destino is not None else BytesIO()
+    ancho_pagina, alto_pagina = A4
+    ancho_util = ancho_pagina - 2 * MARGEN
+    c = pdf_canvas.Canvas(salida, pagesize=A4, pageCompression=1)
+    c.setTitle(titulo)
+    
+    # Título e información del reporte (solo en la primera página)
+    y = alto_pagina - MARGEN_SUPERIOR
+    y = _dibujar(c, Paragraph(titulo, ESTILO_TITULO_REPORTE), MARGEN, y, ancho_util)
+    y -= ESTILO_TITULO_REPORTE.spaceAfter
     info_text = f"""
     <b>Tipo de Reporte:</b> {tipo_reporte.capitalize()}<br/>
     <b>Período:</b> {fecha_inicio} {f' al {fecha_fin}' if tipo_reporte == 'mensual' else ''}<br/>
     <b>Generado el:</b> {datetime.now().strftime('%Y-%m-%d %H:%M')}<br/>
-    <b>Total de registros:</b> {len(accesos)}
+    <b>Total de registros:</b> {total}
     """
-    
-    info_paragraph = Paragraph(info_text, styles['Normal'])
-    elements.append(info_paragraph)
-    elements.append(Spacer(1, 20))
-    
-    # Tabla de datos
-    if accesos:
-        # Encabezados de la tabla
-        data = [['Fecha/Hora', 'Visitante', 'Tipo', 'Autorizado', 'Guardia']]
-        
-        # Datos
-        for acceso in accesos:
-            fecha_str = acceso['fecha_hora'].strftime('%Y-%m-%d %H:%M')
-            visitante = acceso.get('visitante', 'N/A')
-            tipo = acceso['tipo'].capitalize()
-            autorizado = 'Sí' if acceso['autorizado'] else 'No'
-            guardia = acceso.get('guardia', 'Sistema')
-            
-            data.append([fecha_str, visitante, tipo, autorizado, guardia])
-        
-        # Crear tabla
-        table = Table(data, colWidths=[1.5*inch, 2*inch, 0.8*inch, 0.8*inch, 1.5*inch])
-        table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-            ('FONTSIZE', (0, 0), (-1, 0), 10),
-            ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-            ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-            ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
-            ('FONTSIZE', (0, 1), (-1, -1), 8),
-            ('GRID', (0, 0), (-1, -1), 1, colors.black)
-        ]))
-        
-        elements.append(table)
-    else:
-        no_data = Paragraph("<b>No hay registros para el período seleccionado</b>", styles['Normal'])
-        elements.append(no_data)
+    y = _dibujar(c, Paragraph(info_text, ESTILOS['Normal']), MARGEN, y, ancho_util)
+    y -= 20
+    
+    alto_encabezado, alto_fila = _alturas_tabla_accesos()
+    filas = (_fila_acceso(acceso) for acceso in accesos)
+    hay_filas = False
+    while True:
+        # Tantas filas como quepan en lo que queda de la página
+        cabe = max(int((y - MARGEN - alto_encabezado) // alto_fila), 1)
+        pagina = list(islice(filas, cabe))
+        if not pagina:
+            break
+        hay_filas = True
+        tabla = LongTable([ENCABEZADO_ACCESOS] + pagina, colWidths=ANCHOS_ACCESOS, repeatRows=1)
+        tabla.setStyle(ESTILO_TABLA_ACCESOS)
+        _dibujar(c, tabla, MARGEN, y, ancho_util)
+        c.showPage()
+        y = alto_pagina - MARGEN_SUPERIOR
+    
+    if not hay_filas:
+        no_data = Paragraph("<b>No hay registros para el período seleccionado</b>", ESTILOS['Normal'])
+        _dibujar(c, no_data, MARGEN, y, ancho_util)
+        c.showPage()
     
     # Generar PDF
-    doc.build(elements)
+    c.save()
+    if destino is not None:
+        return None
     
     # Obtener contenido del buffer
-    pdf = buffer.getvalue()
-    buffer.close()
+    pdf = salida.getvalue()
+    salida.close()
     
     return pdf
 
@@ -97,7 +145,7 @@ def generar_pdf_credencial(visitante, codigo):
     doc = SimpleDocTemplate(buffer, pagesize=(300, 400), topMargin=20)
     elements = []
     
-    styles = getSampleStyleSheet()
+    styles = ESTILOS
     title_style = ParagraphStyle(
         'CredencialTitle',
         parent=styles['Heading1'],
@@ -156,7 +204,7 @@ def generar_pdf_estadisticas(estadisticas, accesos_7_dias, visitantes_frecuentes
     doc = SimpleDocTemplate(buffer, pagesize=A4, topMargin=30)
     elements = []
     
-    styles = getSampleStyleSheet()
+    styles = ESTILOS
     title_style = ParagraphStyle(
         'TitleStyle',
         parent=styles['Heading1'],